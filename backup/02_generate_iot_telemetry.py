@@ -13,14 +13,26 @@
 from __future__ import annotations
 
 import math
+import os
 import random
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timedelta, time, date
-from typing import List, Tuple, Optional
+from pathlib import Path
+from time import perf_counter
+from typing import Iterator, List, Tuple, Optional
 
+import numpy as np
 import pandas as pd
 from sqlalchemy import create_engine, text
 
+# shared array-bind writer / sinks live next to the live simulator
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "generator"))
+from telemetry_sinks import make_sinks  # noqa: E402
+from telemetry_writer import TELEMETRY_COLUMNS, LastStateWriter  # noqa: E402
+
 # =============================================================================
 # CONFIG
 # =============================================================================
@@ -30,6 +42,25 @@ CONNECT_ARGS = {"user": "raw_layer", "password": "Raw#123", "dsn": "localhost:15
 
 RANDOM_SEED = 42
 
+# Plan generation: worker processes (None = all cores, 1 = in-process).
+# Every batch of plans draws from its own seed [RANDOM_SEED, first plan index]:
+# the output does not depend on the number of workers, but it does depend on
+# PLANS_PER_BATCH (other batch boundaries = other streams).
+GENERATION_WORKERS = None
+PLANS_PER_BATCH = 64              # plans per work unit (and per numpy kernel call)
+BATCHES_IN_FLIGHT_PER_WORKER = 2  # bounds finished-but-unwritten batches
+
+# "numpy" = vectorized kernel (fleet_kernel), "scalar" = per-step reference loop
+TRIP_KERNEL = "numpy"
+
+# Offline check, no DB: both kernels on a synthetic fleet week ->
+# distribution table (mean / quantiles / KS distance) + speedup
+KERNEL_CHECK_MODE = False
+KERNEL_CHECK_CARS = 300
+
+# Rows per columnar chunk handed to the writer
+CHUNK_ROWS = 5000
+
 DAYS_FORWARD = 7
 ANCHOR_NOW_PLUS_MIN = 5
 
@@ -46,6 +77,7 @@ P_ONE_TRIP = 0.50
 P_TWO_TRIPS = 0.15
 TRIP_DURATION_MIN_MIN = 12
 TRIP_DURATION_MIN_MAX = 75
+REFUEL_STOP_MIN = 8  # low fuel after a trip -> REFUEL row this many minutes after ENGINE_STOP
 
 # "Rental duration" concept kept فقط للتخطيط, لكن بدون Rentals table
 RENTAL_DURATION_OPTIONS = [1, 2, 3, 4]
@@ -58,6 +90,17 @@ RT_KEEP_LAST_N_ROWS_PER_CAR = 300
 
 RESET_BEFORE_RUN = True   # only clears IoT tables now (NOT RENTALS)
 
+# "array" = executemany writer (telemetry_writer.py), "to_sql" = old pandas path (for comparison)
+TELEMETRY_WRITER = "array"
+# APPEND_VALUES direct-path inserts into IOT_TELEMETRY: the whole batch goes in as
+# one insert (CHUNK_ROWS is ignored) followed by a commit, once per PLANS_PER_BATCH
+IOT_TELEMETRY_DIRECT_PATH = False
+
+# Telemetry sinks (telemetry_sinks.py), several = fan-out:
+# "oracle" | "parquet" (partitioned by date) | "arrow" | "ndjson" | "null"
+TELEMETRY_SINKS = ("oracle",)
+SINK_DIR = "output"
+
 CATEGORY_SPEED_PROFILE = {
     "ECONOMY":  {"city": (18, 55), "mixed": (25, 80), "highway": (75, 110)},
     "SUV":      {"city": (18, 60), "mixed": (30, 90), "highway": (85, 130)},
@@ -86,6 +129,10 @@ ENGINE = create_engine(ORACLE_URL, connect_args=CONNECT_ARGS, pool_pre_ping=True
 def set_seed():
     random.seed(RANDOM_SEED)
 
+def plan_seed(index: int) -> str:
+    # str seeds are hashed (sha512) by random.seed: stable across runs and processes
+    return f"{RANDOM_SEED}/plan/{index}"
+
 def now_anchor() -> datetime:
     dt = datetime.now() + timedelta(minutes=ANCHOR_NOW_PLUS_MIN)
     if dt.hour >= DAY_END_HOUR or dt.hour < DAY_START_HOUR:
@@ -334,11 +381,49 @@ def build_week_activity_plans(anchor: datetime, cars: pd.DataFrame) -> List[Acti
 # =============================================================================
 # TELEMETRY GENERATION (RENTAL_ID=NULL)
 # =============================================================================
+# Plans are generated in batches of PLANS_PER_BATCH: one columnar block per
+# batch (rows plan by plan, each plan in EVENT_TS order), handed to the
+# writer as fixed-size chunks of CHUNK_ROWS (direct path: one chunk, one
+# commit per batch). Memory is bounded by the batch, not by the simulated
+# window or the fleet size.
+#
+# TRIP_KERNEL = "numpy": fleet_kernel, whole batch as arrays
+# TRIP_KERNEL = "scalar": reference loop below, one step at a time
+
+ROW_COLUMNS = (
+    "EVENT_TS", "LATITUDE", "LONGITUDE", "SPEED_KMH", "ACCELERATION_MS2",
+    "BRAKE_PRESSURE_BAR", "FUEL_LEVEL_PCT", "BATTERY_VOLTAGE", "ENGINE_TEMP_C",
+    "ODOMETER_KM", "EVENT_TYPE",
+)
+
+@dataclass
+class PlanJob:
+    index: int
+    plan: ActivityPlan
+    city: str
+    anchor: datetime
+    forced: bool  # add the immediate trip right after the anchor
+
+def marker_row(ts: datetime, lat: float, lon: float, fuel: float, odo: float,
+               battery: float, engine_temp: float, event: str) -> dict:
+    """
+    One stationary row (engine start / stop, refuel, activity markers).
+    """
+    return {
+        "EVENT_TS": np.array([ts], dtype="datetime64[us]"),
+        "LATITUDE": np.array([lat]),
+        "LONGITUDE": np.array([lon]),
+        "SPEED_KMH": np.zeros(1),
+        "ACCELERATION_MS2": np.zeros(1),
+        "BRAKE_PRESSURE_BAR": np.zeros(1),
+        "FUEL_LEVEL_PCT": np.array([float(fuel)]),
+        "BATTERY_VOLTAGE": np.array([float(battery)]),
+        "ENGINE_TEMP_C": np.array([float(engine_temp)]),
+        "ODOMETER_KM": np.array([float(odo)]),
+        "EVENT_TYPE": np.array([event], dtype=object),
+    }
 
 def generate_trip_telemetry(
-    device_id: int,
-    car_id: int,
-    rental_id: Optional[int],
     category: str,
     city: str,
     start_dt: datetime,
@@ -347,39 +432,28 @@ def generate_trip_telemetry(
     start_lon: float,
     start_odo: float,
     start_fuel: float,
-) -> Tuple[List[dict], float, float, float, float]:
-
+) -> Tuple[List[Tuple[dict, int]], float, float, float, float, datetime]:
+    """
+    Scalar reference kernel, one step at a time.
+    One trip -> ([(columns, n), ...] in time order, odo, fuel, lat, lon, last ts).
+    """
     trip_type = pick_trip_type()
-    steps = max(1, int((duration_min * 60) / IOT_INTERVAL_SECONDS))
+    steps = trip_steps(duration_min)
+    city_lat, city_lon = get_city_center(city)
 
-    rows: List[dict] = []
-    ts = start_dt
     lat, lon = start_lat, start_lon
     odo = start_odo
     fuel = start_fuel
     eng_temp = None
     prev_speed = None
 
-    rows.append({
-        "DEVICE_ID": device_id,
-        "CAR_ID": car_id,
-        "RENTAL_ID": rental_id,  # NULL
-        "EVENT_TS": ts,
-        "LATITUDE": lat,
-        "LONGITUDE": lon,
-        "SPEED_KMH": 0.0,
-        "ACCELERATION_MS2": 0.0,
-        "BRAKE_PRESSURE_BAR": 0.0,
-        "FUEL_LEVEL_PCT": float(fuel),
-        "BATTERY_VOLTAGE": float(simulate_battery_voltage(True)),
-        "ENGINE_TEMP_C": float(simulate_engine_temp(eng_temp, 0.0, True)),
-        "ODOMETER_KM": float(odo),
-        "EVENT_TYPE": "ENGINE_START",
-    })
+    parts = [(marker_row(
+        start_dt, lat, lon, fuel, odo,
+        simulate_battery_voltage(True), simulate_engine_temp(eng_temp, 0.0, True), "ENGINE_START",
+    ), 1)]
 
+    lats, lons, speeds, accs, brakes, fuels, batteries, temps, odos, events = ([] for _ in range(10))
     for _ in range(1, steps + 1):
-        ts = ts + timedelta(seconds=IOT_INTERVAL_SECONDS)
-
         target_speed = sample_speed_kmh(category, trip_type)
         if prev_speed is None:
             speed = target_speed * random.uniform(0.6, 0.9)
@@ -393,7 +467,6 @@ def generate_trip_telemetry(
         dlat = (dist_km / 111.0) * math.cos(bearing)
         dlon = (dist_km / (111.0 * max(0.2, math.cos(math.radians(lat))))) * math.sin(bearing)
 
-        city_lat, city_lon = get_city_center(city)
         drift_lat = (city_lat - lat) * 0.02
         drift_lon = (city_lon - lon) * 0.02
 
@@ -410,105 +483,71 @@ def generate_trip_telemetry(
         eng_temp = simulate_engine_temp(eng_temp, speed, True)
         bpress = brake_pressure_bar(acc)
 
-        rows.append({
-            "DEVICE_ID": device_id,
-            "CAR_ID": car_id,
-            "RENTAL_ID": rental_id,
-            "EVENT_TS": ts,
-            "LATITUDE": new_lat,
-            "LONGITUDE": new_lon,
-            "SPEED_KMH": float(speed),
-            "ACCELERATION_MS2": float(acc),
-            "BRAKE_PRESSURE_BAR": float(bpress),
-            "FUEL_LEVEL_PCT": float(fuel),
-            "BATTERY_VOLTAGE": float(simulate_battery_voltage(True)),
-            "ENGINE_TEMP_C": float(eng_temp),
-            "ODOMETER_KM": float(odo),
-            "EVENT_TYPE": "DRIVING" if speed >= 5 else "IDLE",
-        })
+        lats.append(new_lat)
+        lons.append(new_lon)
+        speeds.append(speed)
+        accs.append(acc)
+        brakes.append(bpress)
+        fuels.append(fuel)
+        batteries.append(simulate_battery_voltage(True))
+        temps.append(eng_temp)
+        odos.append(odo)
+        events.append("DRIVING" if speed >= 5 else "IDLE")
 
         lat, lon = new_lat, new_lon
 
-    ts = ts + timedelta(seconds=IOT_INTERVAL_SECONDS)
-    rows.append({
-        "DEVICE_ID": device_id,
-        "CAR_ID": car_id,
-        "RENTAL_ID": rental_id,
-        "EVENT_TS": ts,
-        "LATITUDE": lat,
-        "LONGITUDE": lon,
-        "SPEED_KMH": 0.0,
-        "ACCELERATION_MS2": 0.0,
-        "BRAKE_PRESSURE_BAR": 0.0,
-        "FUEL_LEVEL_PCT": float(fuel),
-        "BATTERY_VOLTAGE": float(simulate_battery_voltage(False)),
-        "ENGINE_TEMP_C": float(simulate_engine_temp(eng_temp, 0.0, False)),
-        "ODOMETER_KM": float(odo),
-        "EVENT_TYPE": "ENGINE_STOP",
-    })
+    step = np.timedelta64(IOT_INTERVAL_SECONDS, "s")
+    t0 = np.datetime64(start_dt, "us")
+    parts.append(({
+        "EVENT_TS": t0 + step * np.arange(1, steps + 1),
+        "LATITUDE": np.array(lats),
+        "LONGITUDE": np.array(lons),
+        "SPEED_KMH": np.array(speeds),
+        "ACCELERATION_MS2": np.array(accs),
+        "BRAKE_PRESSURE_BAR": np.array(brakes),
+        "FUEL_LEVEL_PCT": np.array(fuels),
+        "BATTERY_VOLTAGE": np.array(batteries),
+        "ENGINE_TEMP_C": np.array(temps),
+        "ODOMETER_KM": np.array(odos),
+        "EVENT_TYPE": np.array(events, dtype=object),
+    }, steps))
+
+    ts = start_dt + timedelta(seconds=IOT_INTERVAL_SECONDS * (steps + 1))
+    parts.append((marker_row(
+        ts, lat, lon, fuel, odo,
+        simulate_battery_voltage(False), simulate_engine_temp(eng_temp, 0.0, False), "ENGINE_STOP",
+    ), 1))
 
     if fuel < 12.0 and CATEGORY_FUEL_CONS.get(category.upper(), 0.0) > 0:
-        ts = ts + timedelta(minutes=8)
+        ts = ts + timedelta(minutes=REFUEL_STOP_MIN)
         fuel = 100.0
-        rows.append({
-            "DEVICE_ID": device_id,
-            "CAR_ID": car_id,
-            "RENTAL_ID": rental_id,
-            "EVENT_TS": ts,
-            "LATITUDE": lat,
-            "LONGITUDE": lon,
-            "SPEED_KMH": 0.0,
-            "ACCELERATION_MS2": 0.0,
-            "BRAKE_PRESSURE_BAR": 0.0,
-            "FUEL_LEVEL_PCT": float(fuel),
-            "BATTERY_VOLTAGE": float(simulate_battery_voltage(False)),
-            "ENGINE_TEMP_C": float(simulate_engine_temp(eng_temp, 0.0, False)),
-            "ODOMETER_KM": float(odo),
-            "EVENT_TYPE": "REFUEL",
-        })
-
-    return rows, odo, fuel, lat, lon
-
-def generate_activity_telemetry(plan: ActivityPlan, city: str) -> Tuple[List[dict], float]:
-    rows: List[dict] = []
-
-    device_id = plan.device_id
-    car_id = plan.car_id
-    category = plan.category
-    start = plan.start_at
-    end = plan.end_at
-
-    lat, lon = get_city_center(city)
-    odo = float(plan.start_odo)
-    fuel = 100.0
-
-    # Marker: ACTIVITY_START (not a rental)
-    rows.append({
-        "DEVICE_ID": device_id,
-        "CAR_ID": car_id,
-        "RENTAL_ID": None,
-        "EVENT_TS": start,
-        "LATITUDE": lat,
-        "LONGITUDE": lon,
-        "SPEED_KMH": 0.0,
-        "ACCELERATION_MS2": 0.0,
-        "BRAKE_PRESSURE_BAR": 0.0,
-        "FUEL_LEVEL_PCT": float(fuel),
-        "BATTERY_VOLTAGE": float(simulate_battery_voltage(False)),
-        "ENGINE_TEMP_C": 25.0,
-        "ODOMETER_KM": float(odo),
-        "EVENT_TYPE": "ACTIVITY_START",
-    })
-
-    cur_day = start.date()
-    last_day = end.date()
+        parts.append((marker_row(
+            ts, lat, lon, fuel, odo,
+            simulate_battery_voltage(False), simulate_engine_temp(eng_temp, 0.0, False), "REFUEL",
+        ), 1))
+
+    return parts, odo, fuel, lat, lon, ts
+
+def schedule_trips(plan: ActivityPlan, forced_at: Optional[datetime] = None) -> List[Tuple[datetime, int]]:
+    """
+    (start, duration_min) of every trip of the plan, in time order.
+    Trips of one day are drawn then sorted by start; a trip never starts
+    before the previous one (incl. a possible refuel stop) is over.
+    forced_at (the immediate trip after the anchor) comes first.
+    """
+    slots: List[Tuple[datetime, int, datetime]] = []
+    if forced_at is not None:
+        slots.append((forced_at, random.randint(10, 15), plan.end_at))
+
+    cur_day = plan.start_at.date()
+    last_day = plan.end_at.date()
 
     while cur_day <= last_day:
         day_start = datetime.combine(cur_day, time(DAY_START_HOUR, 0))
         day_end = datetime.combine(cur_day, time(DAY_END_HOUR, 0))
 
-        win_start = max(day_start, start)
-        win_end = min(day_end, end)
+        win_start = max(day_start, plan.start_at)
+        win_end = min(day_end, plan.end_at)
 
         if win_start < win_end:
             r = random.random()
@@ -519,6 +558,7 @@ def generate_activity_telemetry(plan: ActivityPlan, city: str) -> Tuple[List[dic
             else:
                 trips_today = 2
 
+            day_slots = []
             for _ in range(trips_today):
                 if (win_end - win_start).total_seconds() < 30 * 60:
                     continue
@@ -527,108 +567,563 @@ def generate_activity_telemetry(plan: ActivityPlan, city: str) -> Tuple[List[dic
                     minutes=random.randint(0, int((win_end - win_start).total_seconds() // 60) - 20)
                 )
                 dur = random.randint(TRIP_DURATION_MIN_MIN, TRIP_DURATION_MIN_MAX)
-
-                if t0 + timedelta(minutes=dur) > win_end:
-                    dur = max(10, int((win_end - t0).total_seconds() // 60) - 2)
-                if dur < 10:
-                    continue
-
-                trip_rows, odo, fuel, lat, lon = generate_trip_telemetry(
-                    device_id=device_id,
-                    car_id=car_id,
-                    rental_id=None,
-                    category=category,
-                    city=city,
-                    start_dt=t0,
-                    duration_min=dur,
-                    start_lat=lat,
-                    start_lon=lon,
-                    start_odo=odo,
-                    start_fuel=fuel,
-                )
-                rows.extend(trip_rows)
+                day_slots.append((t0, dur, win_end))
+            slots.extend(sorted(day_slots, key=lambda s: s[0]))
 
         cur_day += timedelta(days=1)
 
-    rows.append({
-        "DEVICE_ID": device_id,
-        "CAR_ID": car_id,
-        "RENTAL_ID": None,
-        "EVENT_TS": end,
-        "LATITUDE": lat,
-        "LONGITUDE": lon,
-        "SPEED_KMH": 0.0,
-        "ACCELERATION_MS2": 0.0,
-        "BRAKE_PRESSURE_BAR": 0.0,
-        "FUEL_LEVEL_PCT": float(fuel),
-        "BATTERY_VOLTAGE": float(simulate_battery_voltage(False)),
-        "ENGINE_TEMP_C": 25.0,
-        "ODOMETER_KM": float(odo),
-        "EVENT_TYPE": "ACTIVITY_END",
-    })
+    trips: List[Tuple[datetime, int]] = []
+    busy_until = plan.start_at
+    for t0, dur, win_end in slots:
+        # one car, one trip at a time
+        t0 = max(t0, busy_until + timedelta(seconds=IOT_INTERVAL_SECONDS))
+        if t0 >= win_end:
+            continue
+        if t0 + timedelta(minutes=dur) > win_end:
+            dur = max(10, int((win_end - t0).total_seconds() // 60) - 2)
+        if dur < 10:
+            continue
+        trips.append((t0, dur))
+        busy_until = t0 + timedelta(seconds=IOT_INTERVAL_SECONDS * (trip_steps(dur) + 1),
+                                    minutes=REFUEL_STOP_MIN)
+    return trips
+
+def trip_steps(duration_min: int) -> int:
+    return max(1, int((duration_min * 60) / IOT_INTERVAL_SECONDS))
+
+def scalar_plan_rows(job: PlanJob) -> Tuple[dict, int]:
+    """
+    Reference path: one plan, trip by trip, step by step.
+    """
+    random.seed(plan_seed(job.index))
+    plan = job.plan
+    forced_at = job.anchor + timedelta(minutes=2) if job.forced else None
+
+    lat, lon = get_city_center(job.city)
+    odo = float(plan.start_odo)
+    fuel = 100.0
 
-    return rows, odo
-
-def ensure_immediate_activity(car_id: int, device_id: int, category: str, city: str, anchor: datetime, start_odo: float) -> List[dict]:
-    lat, lon = get_city_center(city)
-    t0 = anchor + timedelta(minutes=2)
-    dur = random.randint(10, 15)
-
-    rows, *_ = generate_trip_telemetry(
-        device_id=device_id,
-        car_id=car_id,
-        rental_id=None,
-        category=category,
-        city=city,
-        start_dt=t0,
-        duration_min=dur,
-        start_lat=lat,
-        start_lon=lon,
-        start_odo=float(start_odo),
-        start_fuel=100.0,
-    )
-    return rows
+    # Marker: ACTIVITY_START (not a rental)
+    parts = [marker_row(plan.start_at, lat, lon, fuel, odo, simulate_battery_voltage(False), 25.0, "ACTIVITY_START")]
+    last_ts = plan.end_at
+    for t0, dur in schedule_trips(plan, forced_at):
+        trip, odo, fuel, lat, lon, ts = generate_trip_telemetry(
+            category=plan.category,
+            city=job.city,
+            start_dt=t0,
+            duration_min=dur,
+            start_lat=lat,
+            start_lon=lon,
+            start_odo=odo,
+            start_fuel=fuel,
+        )
+        parts.extend(cols for cols, _ in trip)
+        last_ts = max(last_ts, ts)
+    parts.append(marker_row(last_ts, lat, lon, fuel, odo, simulate_battery_voltage(False), 25.0, "ACTIVITY_END"))
+
+    cols = {c: np.concatenate([p[c] for p in parts]) for c in ROW_COLUMNS}
+    n = len(cols["EVENT_TS"])
+    cols["DEVICE_ID"] = np.full(n, plan.device_id, dtype=np.int64)
+    cols["CAR_ID"] = np.full(n, plan.car_id, dtype=np.int64)
+    return cols, n
 
 # =============================================================================
-# WRITE
+# VECTORIZED FLEET KERNEL
+# =============================================================================
+# Same model as the scalar loop, for a whole batch of plans at once. Driving
+# rows of all trips are laid out flat (plan by plan, trip by trip):
+# - schedule: days x trip slots per plan as arrays (µs timestamps)
+# - speed, engine temp, position offset from the city center are all
+#   x_k = c_k * x_{k-1} + d_k, restarting at each trip (speed, temp) or
+#   plan (position) -> closed form per block, P = cumprod(c),
+#   x = P * cumsum(d / P) (linear_recurrence)
+# - lon step uses the previous lat, odometer = cumsum of haversine,
+#   fuel = trip start - cumsum(consumption), refuel decided per trip slot
+# - markers (ACTIVITY / ENGINE / REFUEL) scattered in by row index
+# Check against the scalar loop: KERNEL_CHECK_MODE = True.
+
+RECURRENCE_BLOCK = 256  # 0.65 ** 256 ~ 1e-48: 1 / cumprod(c) stays far from overflow
+
+US_MIN = 60_000_000
+US_DAY = 24 * 60 * US_MIN
+_NEVER = np.iinfo(np.int64).max // 4  # unused slot start, sorts last without overflowing
+
+_TRIP_TYPES = ("city", "mixed", "highway")
+_CATEGORIES = tuple(CATEGORY_SPEED_PROFILE)
+_SPEED_MIN = np.array([[CATEGORY_SPEED_PROFILE[c][t][0] for t in _TRIP_TYPES] for c in _CATEGORIES], dtype=float)
+_SPEED_MAX = np.array([[CATEGORY_SPEED_PROFILE[c][t][1] for t in _TRIP_TYPES] for c in _CATEGORIES], dtype=float)
+_BRAKE_LO = np.array([0.0, 10.0, 35.0])   # by deceleration class (see brake_pressure_bar)
+_BRAKE_HI = np.array([4.0, 35.0, 80.0])
+_DRIVE_EVENTS = np.array(["IDLE", "DRIVING"], dtype=object)
+
+def linear_recurrence(c, d: np.ndarray, restart: np.ndarray) -> np.ndarray:
+    """
+    x[k] = d[k] where restart[k], else c[k] * x[k-1] + d[k] (x[-1] = 0).
+    c: scalar or array in (0, 1]. Rows are solved in blocks of
+    RECURRENCE_BLOCK at once; only the carry between blocks is a loop.
+    """
+    n = len(d)
+    bs = RECURRENCE_BLOCK
+    n_blocks = -(-n // bs)
+    if n == 0:
+        return np.zeros(0)
+
+    cc = np.ones(n_blocks * bs)
+    cc[:n] = c
+    cc[:n][restart] = 1.0
+    dd = np.zeros(n_blocks * bs)
+    dd[:n] = d
+    st = np.zeros(n_blocks * bs, dtype=bool)
+    st[:n] = restart
+    cc, dd, st = (v.reshape(n_blocks, bs) for v in (cc, dd, st))
+
+    p = np.cumprod(cc, axis=1)
+    g = np.cumsum(dd / p, axis=1)
+    # last restart at or before each row (-1 = none in this block yet)
+    last = np.maximum.accumulate(np.where(st, np.arange(bs), -1), axis=1)
+    open_rows = last < 0                      # still fed by the previous block
+    # sum up to the row before that restart (c = 1 there, so p is unchanged)
+    g_before = (g - dd / p).ravel()[(np.arange(n_blocks) * bs)[:, None] + np.maximum(last, 0)]
+    g_before[open_rows] = 0.0
+    x = p * (g - g_before)
+
+    carries = np.empty(n_blocks)
+    carry = 0.0
+    gains = np.where(open_rows[:, -1], p[:, -1], 0.0).tolist()
+    for i, tail in enumerate(x[:, -1].tolist()):
+        carries[i] = carry
+        carry = tail + gains[i] * carry
+    x += np.where(open_rows, p * carries[:, None], 0.0)
+    return x.ravel()[:n]
+
+def _us(values) -> np.ndarray:
+    return np.array(values, dtype="datetime64[us]").astype(np.int64)
+
+def fleet_schedule(rng: np.random.Generator, jobs: List[PlanJob]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Same rules as schedule_trips for every plan at once
+    -> (plan of trip, start µs, driving steps), plan by plan in time order.
+    """
+    dt_us = IOT_INTERVAL_SECONDS * 1_000_000
+    start = _us([j.plan.start_at for j in jobs])
+    end = _us([j.plan.end_at for j in jobs])
+    n_plans = len(jobs)
+
+    # --- day windows (plans x days) ---
+    day0 = start - start % US_DAY
+    n_days = (end - end % US_DAY - day0) // US_DAY + 1
+    d = np.arange(int(n_days.max()))
+    day_start = day0[:, None] + d * US_DAY
+    win_start = np.maximum(day_start + DAY_START_HOUR * 60 * US_MIN, start[:, None])
+    win_end = np.minimum(day_start + DAY_END_HOUR * 60 * US_MIN, end[:, None])
+    span_min = (win_end - win_start) // US_MIN
+
+    r = rng.random(win_start.shape)
+    trips_today = (r >= P_NO_TRIP).astype(int) + (r >= P_NO_TRIP + P_ONE_TRIP)
+    open_day = (d < n_days[:, None]) & (win_start < win_end) & (span_min >= 30)
+
+    # --- two slots per day, sorted by start ---
+    shape = win_start.shape + (2,)
+    active = open_day[..., None] & (np.arange(2) < trips_today[..., None])
+    offset = rng.integers(0, np.maximum(span_min - 20, 0)[..., None] + 1, shape)
+    t0 = np.where(active, win_start[..., None] + offset * US_MIN, _NEVER)
+    dur = rng.integers(TRIP_DURATION_MIN_MIN, TRIP_DURATION_MIN_MAX + 1, shape)
+    order = np.argsort(t0, axis=-1, kind="stable")
+    t0, dur, active = (np.take_along_axis(v, order, axis=-1).reshape(n_plans, -1) for v in (t0, dur, active))
+    slot_end = np.repeat(win_end, 2, axis=1)
+
+    # forced immediate trip first
+    forced = np.array([j.forced for j in jobs])
+    anchor = _us([j.anchor for j in jobs]) + 2 * US_MIN
+    t0 = np.column_stack([np.where(forced, anchor, 0), t0])
+    dur = np.column_stack([rng.integers(10, 16, n_plans), dur])
+    active = np.column_stack([forced, active])
+    slot_end = np.column_stack([end, slot_end])
+
+    # --- one trip at a time (sequential over slots, vectorized over plans) ---
+    ok = np.zeros_like(active)
+    starts = np.zeros_like(t0)
+    steps = np.zeros_like(dur)
+    busy = start.copy()
+    for k in range(t0.shape[1]):
+        t = np.maximum(t0[:, k], busy + dt_us)
+        w_end = slot_end[:, k]
+        dk = np.where(t + dur[:, k] * US_MIN > w_end, np.maximum(10, (w_end - t) // US_MIN - 2), dur[:, k])
+        ok[:, k] = active[:, k] & (t < w_end) & (dk >= 10)
+        starts[:, k] = t
+        steps[:, k] = np.maximum(1, dk * 60 // IOT_INTERVAL_SECONDS)
+        busy = np.where(ok[:, k], t + (steps[:, k] + 1) * dt_us + REFUEL_STOP_MIN * US_MIN, busy)
+
+    plan_of, _ = ok.nonzero()
+    return plan_of, starts[ok], steps[ok]
+
+def fleet_kernel(rng: np.random.Generator, jobs: List[PlanJob]) -> Tuple[dict, int, np.ndarray]:
+    """
+    Batch of plans -> (columns, n, rows per plan); rows plan by plan, in time order.
+    """
+    dt = IOT_INTERVAL_SECONDS
+    n_plans = len(jobs)
+    plan_of, t0, steps = fleet_schedule(rng, jobs)
+    n_trips = len(steps)
+
+    # per plan
+    cat = np.array([_CATEGORIES.index(j.plan.category.upper()) if j.plan.category.upper() in _CATEGORIES else 0
+                    for j in jobs])
+    center = np.array([get_city_center(j.city) for j in jobs], dtype=float).reshape(n_plans, 2)
+    odo0 = np.array([float(j.plan.start_odo) for j in jobs])
+    cons = np.array([CATEGORY_FUEL_CONS.get(_CATEGORIES[c], 0.0) for c in cat])
+    tank = np.array([CATEGORY_TANK_SIZE.get(_CATEGORIES[c], 0) for c in cat], dtype=float)
+    burn_rate = np.where((cons > 0) & (tank > 0), cons / np.maximum(tank, 1), 0.0)  # % of tank per km
+
+    n_plan_trips = np.bincount(plan_of, minlength=n_plans)
+    first_trip = np.cumsum(n_plan_trips) - n_plan_trips
+
+    # --- driving rows, flat ---
+    n_drive = int(steps.sum())
+    begins = np.cumsum(steps) - steps
+    ends = begins + steps
+    trip = np.repeat(np.arange(n_trips), steps)
+    k = np.arange(n_drive) - begins[trip]
+    trip_start = k == 0
+    plan = plan_of[trip]
+    plan_start = trip_start & (trip == first_trip[plan])
+
+    # speed: first step = target * U(0.6, 0.9), then smoothed towards the target
+    kind = np.searchsorted([0.55, 0.85], rng.random(n_trips), side="right")
+    trip_cat = cat[plan_of]
+    target = rng.uniform(_SPEED_MIN[trip_cat, kind][trip], _SPEED_MAX[trip_cat, kind][trip])
+    a = rng.uniform(0.15, 0.35, n_drive)
+    d = a * target
+    d[trip_start] = target[trip_start] * rng.uniform(0.6, 0.9, n_trips)
+    speed = linear_recurrence(1 - a, d, trip_start)
+    # convex mix of targets in [vmin, vmax]: the scalar clamp to [0, 160] never binds
+    np.clip(speed, 0.0, 160.0, out=speed)
+
+    acc = np.diff(speed, prepend=0.0) / 3.6 / dt
+    acc[trip_start] = 0.0
+
+    # engine temp: relaxes towards 92 / 75, previous value starts at 45 each trip
+    b = rng.uniform(0.08, 0.12, n_drive)
+    d = b * np.where(speed > 30, 92.0, 75.0) + rng.uniform(-0.8, 0.8, n_drive)
+    d[trip_start] += 45.0 * (1 - b[trip_start])
+    temp = linear_recurrence(1 - b, d, trip_start)
+
+    decel = (acc < -1.0).astype(np.intp) + (acc < -2.5)
+    brake = rng.uniform(_BRAKE_LO[decel], _BRAKE_HI[decel])
+    battery = rng.uniform(13.5, 14.4, n_drive)
+    bearing = rng.uniform(0, 2 * math.pi, n_drive)
+    dist = speed * dt / 3600.0
+
+    # position: offset from the city center, 2% pulled back per step;
+    # a trip starts where the previous one of the plan stopped
+    city_lat, city_lon = center[plan, 0], center[plan, 1]
+    lat = city_lat + linear_recurrence(0.98, dist / 111.0 * np.cos(bearing), plan_start)
+    prev_lat = np.concatenate(([0.0], lat[:-1]))
+    prev_lat[plan_start] = city_lat[plan_start]
+    cos_prev = np.cos(np.radians(prev_lat))
+    dlon = dist / (111.0 * np.maximum(0.2, cos_prev)) * np.sin(bearing)
+    lon = city_lon + linear_recurrence(0.98, dlon, plan_start)
+    prev_lon = np.concatenate(([0.0], lon[:-1]))
+    prev_lon[plan_start] = city_lon[plan_start]
+
+    # odometer: per-step distance, cumulated per plan; steps are < 1 km, so the
+    # equirectangular form matches haversine_km to ~1e-6 and skips 4 trig passes
+    hop = 6371.0 * np.radians(np.hypot(lat - prev_lat, (lon - prev_lon) * cos_prev))
+    km = np.cumsum(hop)
+    km_before = km - hop
+    odo = odo0[plan] + km - km_before[begins[first_trip[plan]]] if n_drive else np.zeros(0)
+
+    # fuel: consumption within a trip, refuel decided trip by trip
+    used = dist * burn_rate[plan]
+    used_cum = np.cumsum(used)
+    used_before = used_cum - used
+    trip_used = used_cum[ends - 1] - used_before[begins] if n_trips else np.zeros(0)
+    rank = np.arange(n_trips) - first_trip[plan_of]
+    max_trips = int(n_plan_trips.max()) if n_trips else 0
+    slot_used = np.zeros((n_plans, max_trips))
+    slot_used[plan_of, rank] = trip_used
+    fuel_start_slot = np.zeros((n_plans, max_trips))
+    refuel_slot = np.zeros((n_plans, max_trips), dtype=bool)
+    f = np.full(n_plans, 100.0)
+    for s in range(max_trips):
+        has = s < n_plan_trips
+        fuel_start_slot[:, s] = f
+        f_end = np.maximum(0.0, f - slot_used[:, s])
+        refuel_slot[:, s] = has & (f_end < 12.0) & (cons > 0)
+        f = np.where(has, np.where(refuel_slot[:, s], 100.0, f_end), f)
+    fuel_start = fuel_start_slot[plan_of, rank]
+    refuel = refuel_slot[plan_of, rank]
+    fuel = np.maximum(0.0, fuel_start[trip] - (used_cum - used_before[begins][trip]))
+
+    # per trip ends, per plan ends
+    last = ends - 1
+    has_trips = n_plan_trips > 0
+    plan_last = np.where(has_trips, ends[np.minimum(first_trip + n_plan_trips, n_trips) - 1] - 1, 0) \
+        if n_trips else np.zeros(n_plans, dtype=np.int64)
+    lat_end_plan = np.where(has_trips, lat[plan_last] if n_drive else 0.0, center[:, 0])
+    lon_end_plan = np.where(has_trips, lon[plan_last] if n_drive else 0.0, center[:, 1])
+    odo_end_plan = np.where(has_trips, odo[plan_last] if n_drive else 0.0, odo0)
+
+    # --- row layout: ACTIVITY_START, [ENGINE_START, driving..., ENGINE_STOP, REFUEL?]*, ACTIVITY_END ---
+    trip_rows = steps + 2 + refuel
+    plan_rows = 2 + np.bincount(plan_of, weights=trip_rows, minlength=n_plans).astype(np.int64)
+    plan_row0 = np.cumsum(plan_rows) - plan_rows
+    before = np.cumsum(trip_rows) - trip_rows
+    trip_row0 = plan_row0[plan_of] + 1 + before - before[first_trip[plan_of]] if n_trips else before
+    n = int(plan_rows.sum())
+
+    drive_at = trip_row0[trip] + 1 + k
+    stop_at = trip_row0 + steps + 1
+    refuel_at = (stop_at + 1)[refuel]
+    act_start = plan_row0
+    act_end = plan_row0 + plan_rows - 1
+    n_refuel = int(refuel.sum())
+
+    step_us = dt * 1_000_000
+    stop_ts = t0 + (steps + 1) * step_us
+    trip_last_ts = stop_ts + refuel * (REFUEL_STOP_MIN * US_MIN)
+    end_ts = _us([j.plan.end_at for j in jobs])
+    if n_trips:
+        end_ts = np.maximum(end_ts, np.where(has_trips, trip_last_ts[first_trip + n_plan_trips - 1], 0))
+
+    ts = np.empty(n, dtype=np.int64)
+    ts[act_start] = _us([j.plan.start_at for j in jobs])
+    ts[act_end] = end_ts
+    ts[trip_row0] = t0
+    ts[drive_at] = t0[trip] + (k + 1) * step_us
+    ts[stop_at] = stop_ts
+    ts[refuel_at] = stop_ts[refuel] + REFUEL_STOP_MIN * US_MIN
+
+    ev = np.empty(n, dtype=object)
+    ev[act_start] = "ACTIVITY_START"
+    ev[act_end] = "ACTIVITY_END"
+    ev[trip_row0] = "ENGINE_START"
+    ev[drive_at] = _DRIVE_EVENTS[(speed >= 5).astype(np.intp)]
+    ev[stop_at] = "ENGINE_STOP"
+    ev[refuel_at] = "REFUEL"
+
+    cols = {"EVENT_TS": ts.astype("datetime64[us]"), "EVENT_TYPE": ev}
+    for name, drive, trip_first, trip_end, plan_first, plan_end in (
+        ("LATITUDE", lat, prev_lat[begins], lat[last], center[:, 0], lat_end_plan),
+        ("LONGITUDE", lon, prev_lon[begins], lon[last], center[:, 1], lon_end_plan),
+        ("ODOMETER_KM", odo, odo[begins] - hop[begins], odo[last], odo0, odo_end_plan),
+        ("FUEL_LEVEL_PCT", fuel, fuel_start, fuel[last], np.full(n_plans, 100.0), f),
+    ):
+        col = np.empty(n)
+        col[act_start] = plan_first
+        col[act_end] = plan_end
+        col[trip_row0] = trip_first
+        col[drive_at] = drive
+        col[stop_at] = trip_end
+        col[refuel_at] = trip_end[refuel]
+        cols[name] = col
+    cols["FUEL_LEVEL_PCT"][refuel_at] = 100.0
+
+    for name, drive in (("SPEED_KMH", speed), ("ACCELERATION_MS2", acc), ("BRAKE_PRESSURE_BAR", brake)):
+        col = np.zeros(n)
+        col[drive_at] = drive
+        cols[name] = col
+
+    bat = np.empty(n)
+    bat[act_start] = rng.uniform(12.2, 12.9, n_plans)
+    bat[act_end] = rng.uniform(12.2, 12.9, n_plans)
+    bat[trip_row0] = rng.uniform(13.5, 14.4, n_trips)
+    bat[drive_at] = battery
+    bat[stop_at] = rng.uniform(12.2, 12.9, n_trips)
+    bat[refuel_at] = rng.uniform(12.2, 12.9, n_refuel)
+    cols["BATTERY_VOLTAGE"] = bat
+
+    end_temp = temp[last]
+    tmp = np.empty(n)
+    tmp[act_start] = 25.0
+    tmp[act_end] = 25.0
+    tmp[trip_row0] = 45.0 + 30.0 * rng.uniform(0.08, 0.12, n_trips) + rng.uniform(-0.8, 0.8, n_trips)
+    tmp[drive_at] = temp
+    tmp[stop_at] = np.maximum(25.0, end_temp - rng.uniform(0.2, 0.6, n_trips))
+    tmp[refuel_at] = np.maximum(25.0, end_temp[refuel] - rng.uniform(0.2, 0.6, n_refuel))
+    cols["ENGINE_TEMP_C"] = tmp
+
+    cols["DEVICE_ID"] = np.repeat(np.array([j.plan.device_id for j in jobs], dtype=np.int64), plan_rows)
+    cols["CAR_ID"] = np.repeat(np.array([j.plan.car_id for j in jobs], dtype=np.int64), plan_rows)
+    return cols, n, plan_rows
+
+# =============================================================================
+# PLAN BATCHES (PARALLEL)
 # =============================================================================
 
-def write_telemetry_rows(conn, rows: List[dict]):
-    if not rows:
+@dataclass
+class PlanBatch:
+    first: int                       # index of the first plan
+    plans: int
+    rows: int
+    chunks: List[Tuple[dict, int]]   # IOT_TELEMETRY, CHUNK_ROWS each (direct path: one)
+    rt: Tuple[dict, int]             # RT_IOT_FEED: last N rows of each plan
+
+def generate_batch(jobs: List[PlanJob], kernel: str = TRIP_KERNEL) -> PlanBatch:
+    """
+    Worker entry point. The numpy kernel draws from one stream per batch
+    (RANDOM_SEED + first plan index): batches are fixed, so the output
+    still does not depend on the number of workers.
+    """
+    if kernel == "numpy":
+        cols, n, plan_rows = fleet_kernel(np.random.default_rng([RANDOM_SEED, jobs[0].index]), jobs)
+    else:
+        blocks = [scalar_plan_rows(job) for job in jobs]
+        cols = {c: np.concatenate([b[c] for b, _ in blocks]) for c in blocks[0][0]}
+        plan_rows = np.array([m for _, m in blocks], dtype=np.int64)
+        n = int(plan_rows.sum())
+
+    cols["RENTAL_ID"] = None
+    cols["CREATED_AT"] = cols["EVENT_TS"]
+
+    def take(idx) -> dict:
+        return {c: (v[idx] if isinstance(v, np.ndarray) else v) for c, v in cols.items()}
+
+    # direct path: one APPEND_VALUES insert + commit per batch, not per chunk
+    step = max(n, 1) if IOT_TELEMETRY_DIRECT_PATH else CHUNK_ROWS
+    chunks = [(take(slice(s, s + step)), min(step, n - s)) for s in range(0, n, step)]
+
+    rt = ({}, 0)
+    if FILL_RT_IOT_FEED:
+        # a plan is one car: its last N rows
+        rows_left = np.repeat(np.cumsum(plan_rows), plan_rows) - np.arange(n)
+        keep = rows_left <= RT_KEEP_LAST_N_ROWS_PER_CAR
+        rt = (take(keep), int(keep.sum()))
+
+    return PlanBatch(jobs[0].index, len(jobs), n, chunks, rt)
+
+def iter_plan_batches(jobs: List[PlanJob], workers: int) -> Iterator[PlanBatch]:
+    """
+    Batches in plan order (plans are sorted by start_at), whatever finishes
+    first; at most workers * BATCHES_IN_FLIGHT_PER_WORKER pending at once.
+    """
+    batches = [jobs[i:i + PLANS_PER_BATCH] for i in range(0, len(jobs), PLANS_PER_BATCH)]
+    if workers <= 1:
+        for batch in batches:
+            yield generate_batch(batch)
         return
-    df = pd.DataFrame(rows)
-    df.sort_values(["EVENT_TS", "CAR_ID", "DEVICE_ID"], inplace=True)
-    df["CREATED_AT"] = df["EVENT_TS"]
 
-    df_db = df[[
-        "DEVICE_ID","CAR_ID","RENTAL_ID","EVENT_TS","LATITUDE","LONGITUDE",
-        "SPEED_KMH","ACCELERATION_MS2","BRAKE_PRESSURE_BAR","FUEL_LEVEL_PCT",
-        "BATTERY_VOLTAGE","ENGINE_TEMP_C","ODOMETER_KM","EVENT_TYPE","CREATED_AT"
-    ]].copy()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        todo = iter(batches)
+        for batch in todo:
+            pending.append(pool.submit(generate_batch, batch))
+            if len(pending) >= workers * BATCHES_IN_FLIGHT_PER_WORKER:
+                break
+        while pending:
+            result = pending.popleft().result()
+            batch = next(todo, None)
+            if batch is not None:
+                pending.append(pool.submit(generate_batch, batch))
+            yield result
 
-    df_db.to_sql("IOT_TELEMETRY", conn, if_exists="append", index=False, chunksize=5000)
+# =============================================================================
+# WRITE
+# =============================================================================
 
-    if FILL_RT_IOT_FEED:
-        rt_rows = []
-        for car_id, g in df.groupby("CAR_ID"):
-            g = g.sort_values("EVENT_TS").tail(RT_KEEP_LAST_N_ROWS_PER_CAR)
-            rt_rows.append(g)
-        rt = pd.concat(rt_rows, ignore_index=True)
+def make_writers():
+    history = make_sinks(TELEMETRY_SINKS, "IOT_TELEMETRY", TELEMETRY_COLUMNS, writer=TELEMETRY_WRITER,
+                         direct_path=IOT_TELEMETRY_DIRECT_PATH, out_dir=SINK_DIR)
+    rt = make_sinks(TELEMETRY_SINKS, "RT_IOT_FEED", TELEMETRY_COLUMNS, writer=TELEMETRY_WRITER,
+                    out_dir=SINK_DIR)
+    # RT_CAR_LAST_STATE (/live, VW_KPI_LIVE_CAR_STATUS) follows the RT feed in Oracle
+    last_state = LastStateWriter() if FILL_RT_IOT_FEED and "oracle" in TELEMETRY_SINKS else None
+    return history, rt, last_state
+
+def write_batch(conn, batch: PlanBatch, history_writer, rt_writer, last_state_writer=None):
+    for chunk, n in batch.chunks:
+        history_writer.write(conn, chunk, n)
+    rt, rt_n = batch.rt
+    if rt_n:
+        rt_writer.write(conn, rt, rt_n)
+        if last_state_writer is not None:
+            # plan rows are in EVENT_TS order: the last one per car wins the MERGE
+            last_state_writer.write(conn, {**rt, "RECEIVED_AT": datetime.now()}, rt_n)
+    # direct-path: the table can't be written again before a commit (ORA-12838);
+    # the batch is a single chunk, so this is one commit per batch
+    if IOT_TELEMETRY_DIRECT_PATH:
+        conn.commit()
+
+# =============================================================================
+# KERNEL CHECK (no DB)
+# =============================================================================
+
+CHECK_COLUMNS = ("SPEED_KMH", "ACCELERATION_MS2", "BRAKE_PRESSURE_BAR", "FUEL_LEVEL_PCT",
+                 "BATTERY_VOLTAGE", "ENGINE_TEMP_C", "LATITUDE", "LONGITUDE", "ODOMETER_KM")
 
-        rt_db = rt[[
-            "DEVICE_ID","CAR_ID","RENTAL_ID","EVENT_TS","LATITUDE","LONGITUDE",
-            "SPEED_KMH","ACCELERATION_MS2","BRAKE_PRESSURE_BAR","FUEL_LEVEL_PCT",
-            "BATTERY_VOLTAGE","ENGINE_TEMP_C","ODOMETER_KM","EVENT_TYPE","CREATED_AT"
-        ]].copy()
+def synthetic_fleet(n_cars: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    cities = list(CITY_COORDS)
+    categories = list(CATEGORY_SPEED_PROFILE)
+    branches = pd.DataFrame({
+        "BRANCH_ID": np.arange(1, len(cities) + 1),
+        "BRANCH_NAME": [f"BRANCH {c}" for c in cities],
+        "CITY": cities,
+    })
+    ids = np.arange(1, n_cars + 1)
+    cars = pd.DataFrame({
+        "CAR_ID": ids,
+        "BRANCH_ID": ids % len(cities) + 1,
+        "DEVICE_ID": ids + 100_000,
+        "ODOMETER_KM": 20_000.0 + (ids * 7919) % 60_000,
+        "CATEGORY_NAME": [categories[i % len(categories)] for i in ids],
+    })
+    return branches, cars
 
-        rt_db.insert(0, "TELEMETRY_ID", None)
-        rt_db.to_sql("RT_IOT_FEED", conn, if_exists="append", index=False, chunksize=5000)
+def ks_distance(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Two-sample Kolmogorov-Smirnov statistic (max CDF gap).
+    """
+    a, b = np.sort(a), np.sort(b)
+    grid = np.concatenate([a, b])
+    return float(np.max(np.abs(np.searchsorted(a, grid, side="right") / len(a)
+                               - np.searchsorted(b, grid, side="right") / len(b))))
+
+def check_trip_kernels(n_cars: int = KERNEL_CHECK_CARS):
+    """
+    Same plans, scalar loop vs vectorized kernel (timing includes batching).
+    """
+    random.seed(RANDOM_SEED)
+    anchor = datetime.combine(date.today() + timedelta(days=1), time(9, 0))
+    branches, cars = synthetic_fleet(n_cars)
+    plans = build_week_activity_plans(anchor, cars)
+    city = dict(zip(branches["BRANCH_ID"], branches["CITY"]))
+    jobs = [PlanJob(i, p, city[p.branch_id], anchor, i == 0) for i, p in enumerate(plans)]
+
+    results = {}
+    for kernel in ("scalar", "numpy"):
+        t0 = perf_counter()
+        parts = {c: [] for c in CHECK_COLUMNS + ("EVENT_TYPE",)}
+        rows = 0
+        for i in range(0, len(jobs), PLANS_PER_BATCH):
+            batch = generate_batch(jobs[i:i + PLANS_PER_BATCH], kernel)
+            rows += batch.rows
+            for chunk, _ in batch.chunks:
+                for c in parts:
+                    parts[c].append(chunk[c])
+        elapsed = perf_counter() - t0
+        results[kernel] = (elapsed, rows, {c: np.concatenate(v) for c, v in parts.items()})
+        print(f"⏱️ {kernel:6s}: {rows:,} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s)")
+
+    (t_s, _, ref), (t_v, _, vec) = results["scalar"], results["numpy"]
+    print(f"🚀 speedup: {t_s / t_v:.1f}x")
+    print(f"{'column':20s} {'mean s/v':>21s} {'p5 s/v':>21s} {'p95 s/v':>21s} {'KS':>6s}")
+    for c in CHECK_COLUMNS:
+        a, b = ref[c].astype(float), vec[c].astype(float)
+        qa, qb = np.percentile(a, (5, 95)), np.percentile(b, (5, 95))
+        print(f"{c:20s} {a.mean():10.3f}/{b.mean():<10.3f} {qa[0]:10.3f}/{qb[0]:<10.3f} "
+              f"{qa[1]:10.3f}/{qb[1]:<10.3f} {ks_distance(a, b):6.3f}")
+    for e in ("DRIVING", "IDLE", "REFUEL"):
+        print(f"{e:20s} share {np.mean(ref['EVENT_TYPE'] == e):.4f} / {np.mean(vec['EVENT_TYPE'] == e):.4f}")
 
 # =============================================================================
 # MAIN
 # =============================================================================
 
 def main():
+    if KERNEL_CHECK_MODE:
+        check_trip_kernels()
+        return
+
     set_seed()
     reset_before_run()
 
@@ -643,39 +1138,44 @@ def main():
     plans = build_week_activity_plans(anchor, cars)
     print(f"🧾 Activity plans generated: {len(plans)}")
 
+    branch_city = dict(zip(branches["BRANCH_ID"].astype(int), branches["CITY"].astype(str)))
+    jobs: List[PlanJob] = []
+    forced_done = False
+    for i, plan in enumerate(plans):
+        # ensure some immediate activity right after run (only once)
+        forced = not forced_done and plan.start_at == anchor
+        forced_done = forced_done or forced
+        jobs.append(PlanJob(i, plan, branch_city[plan.branch_id], anchor, forced))
+
+    workers = GENERATION_WORKERS or os.cpu_count() or 1
+    print(f"⚙️ Generation workers: {workers}")
+
     total_rows = 0
+    history_writer, rt_writer, last_state_writer = make_writers()
 
-    with ENGINE.begin() as conn:
+    with ENGINE.connect() as conn:
         if not RESET_BEFORE_RUN and FILL_RT_IOT_FEED:
             conn.execute(text("DELETE FROM RT_IOT_FEED"))
 
-        forced_done = False
-
-        for plan in plans:
-            branch_city = str(branches.loc[branches["BRANCH_ID"] == plan.branch_id, "CITY"].iloc[0])
+        # single writer: batches arrive in plan (start_at) order
+        for batch in iter_plan_batches(jobs, workers):
+            write_batch(conn, batch, history_writer, rt_writer, last_state_writer)
+            total_rows += batch.rows
+            print(f"✅ plans {batch.first + 1}-{batch.first + batch.plans}/{len(plans)} | tele={batch.rows:,} rows")
 
-            tele_rows, _final_odo = generate_activity_telemetry(plan, branch_city)
+        conn.commit()
 
-            # ensure some immediate activity right after run (only once)
-            if not forced_done and plan.start_at == anchor:
-                tele_rows.extend(ensure_immediate_activity(
-                    car_id=plan.car_id,
-                    device_id=plan.device_id,
-                    category=plan.category,
-                    city=branch_city,
-                    anchor=anchor,
-                    start_odo=plan.start_odo,
-                ))
-                forced_done = True
-
-            write_telemetry_rows(conn, tele_rows)
-            total_rows += len(tele_rows)
-
-            print(f"✅ CAR_ID={plan.car_id} | BRANCH={plan.branch_id} | tele={len(tele_rows)} rows")
+    history_writer.close()
+    rt_writer.close()
+    if last_state_writer is not None:
+        last_state_writer.close()
 
     print("=============================================================")
     print("🎉 Done. IoT telemetry generated (NO RENTALS created).")
     print(f"📈 Telemetry rows inserted: {total_rows:,}")
+    print(f"✍️ IOT_TELEMETRY writer: {history_writer.stats.summary()}")
+    if FILL_RT_IOT_FEED:
+        print(f"✍️ RT_IOT_FEED writer:   {rt_writer.stats.summary()}")
     print(f"🗓️ Window: {anchor} -> {sim_end}")
     print("=============================================================")
 
@@ -5,6 +5,7 @@
 #
 # RESPONSIBILITIES:
 # - Replay IOT_TELEMETRY as live stream into RT_IOT_FEED
+#   (+ RT_CAR_LAST_STATE, read by /live and VW_KPI_LIVE_CAR_STATUS)
 # - CREATE rentals on ENGINE_START
 # - CLOSE rentals on ENGINE_STOP
 # - Update CARS status + odometer
@@ -13,15 +14,31 @@
 # IMPORTANT:
 # - IOT_TELEMETRY.RENTAL_ID is IGNORED
 # - RENTALS are derived ONLY from live events
+#
+# READ PATH:
+# - explicit columns, raw cursor (arraysize / prefetchrows),
+#   keyset pages of BATCH_MAX_ROWS inside each window
+# - window N+1 is fetched on a background thread while
+#   window N is processed (telemetry_reader.py)
+# - REPLAY_MODE = "adaptive": paced on event time, empty
+#   stretches skipped via an EVENT_TS index probe, due windows
+#   merged (<= BATCH_MAX_ROWS) when the replay falls behind
 # ============================================================
 
 import time
 import random
+import sys
 from datetime import datetime, timedelta
+from pathlib import Path
 
 import pandas as pd
 from sqlalchemy import create_engine, text
 
+# shared reader / array-bind writer live next to the live simulator
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "generator"))
+from telemetry_reader import AdaptiveWindowPrefetcher, WindowPrefetcher, WindowReader  # noqa: E402
+from telemetry_writer import RT_FEED_COLUMNS, LastStateWriter, TelemetryWriter  # noqa: E402
+
 # ============================================================
 # CONFIG
 # ============================================================
@@ -34,7 +51,19 @@ ORACLE_DSN  = "localhost:1521/XEPDB1"
 
 INTERVAL_SEC = 15
 SPEEDUP = 1.0
-BATCH_MAX_ROWS = 20000
+BATCH_MAX_ROWS = 20000      # keyset page size, and max rows per merged batch
+
+REPLAY_MODE = "adaptive"    # "adaptive" | "fixed" (one query + sleep per INTERVAL_SEC)
+SKIP_EMPTY = True           # adaptive: jump over stretches without telemetry
+IDLE_POLL_SEC = 5.0         # adaptive: re-probe for new rows once the source is drained
+
+FETCH_ARRAYSIZE = 5000      # rows per fetch round-trip
+FETCH_PREFETCHROWS = 5001   # rows returned with the execute itself
+PREFETCH_WINDOWS = 1        # windows read ahead of the one being processed
+
+# TELEMETRY_ID is carried over (RT_IOT_FEED keeps the source id)
+REPLAY_COLUMNS = (("TELEMETRY_ID", "int"),) + RT_FEED_COLUMNS[:-1]
+RT_COLUMNS = (("TELEMETRY_ID", "int"),) + RT_FEED_COLUMNS
 
 PRICING_DAY = {
     "ECONOMY": 320,
@@ -224,69 +253,84 @@ def stream_realtime_data():
     with engine.connect() as conn:
         cursor = conn.execute(text("SELECT MIN(EVENT_TS) FROM IOT_TELEMETRY")).scalar()
 
-    while True:
-        window_end = cursor + timedelta(seconds=INTERVAL_SEC)
-
-        df = pd.read_sql(text("""
-            SELECT *
-            FROM IOT_TELEMETRY
-            WHERE EVENT_TS >= :s AND EVENT_TS < :e
-            ORDER BY EVENT_TS
-        """), engine, params={"s": cursor, "e": window_end})
-
-        if not df.empty:
-            df.columns = [c.upper() for c in df.columns]
-            df["RECEIVED_AT"] = datetime.now()
-
-            with engine.begin() as conn:
-                for _, r in df.iterrows():
-                    car_id = int(r["CAR_ID"])
-                    event = r["EVENT_TYPE"]
-                    ts = r["EVENT_TS"]
-                    odo = float(r["ODOMETER_KM"])
-
-                    meta = car_meta.get(car_id)
-                    if not meta:
-                        continue
-
-                    active = get_active_rental(conn, car_id)
-
-                    # CREATE RENTAL
-                    if event == "ENGINE_START" and not active:
-                        create_rental(
-                            conn,
-                            car_id=car_id,
-                            branch_id=meta["BRANCH_ID"],
-                            customer_id=random.choice(customers),
-                            manager_id=supervisor_id,
-                            start_ts=ts,
-                            start_odo=odo,
-                            category=meta["CATEGORY_NAME"],
-                        )
-
-                    # CLOSE RENTAL
-                    if event == "ENGINE_STOP" and active:
-                        close_rental(
-                            conn,
-                            rental_id=active[0],
-                            car_id=car_id,
-                            end_ts=ts,
-                            end_odo=odo,
-                        )
-
-                df.to_sql(
-                    "RT_IOT_FEED",
-                    conn,
-                    schema=SCHEMA,
-                    if_exists="append",
-                    index=False,
-                    chunksize=2000,
-                )
-
-            print(f"✅ Streamed {len(df)} rows [{cursor} → {window_end}]")
-
-        cursor = window_end
-        time.sleep(max(0.1, INTERVAL_SEC / SPEEDUP))
+    reader = WindowReader(
+        engine, "IOT_TELEMETRY", REPLAY_COLUMNS, schema=SCHEMA,
+        page_rows=BATCH_MAX_ROWS, arraysize=FETCH_ARRAYSIZE, prefetchrows=FETCH_PREFETCHROWS,
+    )
+    rt_writer = TelemetryWriter("RT_IOT_FEED", RT_COLUMNS, schema=SCHEMA, batch_rows=BATCH_MAX_ROWS)
+    last_state_writer = LastStateWriter(schema=SCHEMA)
+    step = timedelta(seconds=INTERVAL_SEC)
+    adaptive = REPLAY_MODE == "adaptive"
+    if adaptive:
+        # pacing happens on the reader thread (event time), no sleep here
+        windows = AdaptiveWindowPrefetcher(
+            reader, cursor, step, speedup=SPEEDUP, max_rows=BATCH_MAX_ROWS,
+            skip_empty=SKIP_EMPTY, idle_poll_sec=IDLE_POLL_SEC, depth=PREFETCH_WINDOWS,
+        )
+    else:
+        windows = WindowPrefetcher(reader, cursor, step, depth=PREFETCH_WINDOWS)
+
+    # fixed mode paces on a schedule: processing time is not added on top of the interval
+    next_at = time.perf_counter()
+    try:
+        for window_start, window_end, batch, n in windows:
+            if n:
+                batch["RECEIVED_AT"] = datetime.now()
+                events = batch["EVENT_TYPE"]
+                lifecycle = (events == "ENGINE_START") | (events == "ENGINE_STOP")
+
+                with engine.begin() as conn:
+                    # only START / STOP rows can open or close a rental
+                    for i in lifecycle.nonzero()[0].tolist():
+                        car_id = int(batch["CAR_ID"][i])
+                        event = events[i]
+                        ts = batch["EVENT_TS"][i].item()
+                        odo = float(batch["ODOMETER_KM"][i])
+
+                        meta = car_meta.get(car_id)
+                        if not meta:
+                            continue
+
+                        active = get_active_rental(conn, car_id)
+
+                        # CREATE RENTAL
+                        if event == "ENGINE_START" and not active:
+                            create_rental(
+                                conn,
+                                car_id=car_id,
+                                branch_id=meta["BRANCH_ID"],
+                                customer_id=random.choice(customers),
+                                manager_id=supervisor_id,
+                                start_ts=ts,
+                                start_odo=odo,
+                                category=meta["CATEGORY_NAME"],
+                            )
+
+                        # CLOSE RENTAL
+                        if event == "ENGINE_STOP" and active:
+                            close_rental(
+                                conn,
+                                rental_id=active[0],
+                                car_id=car_id,
+                                end_ts=ts,
+                                end_odo=odo,
+                            )
+
+                    rt_writer.write(conn, batch, n)
+                    # same transaction; rows are in EVENT_TS order, so the last one per car wins
+                    last_state_writer.write(conn, batch, n)
+
+                print(f"✅ Streamed {n} rows [{window_start} → {window_end}]")
+
+            if not adaptive:
+                next_at += INTERVAL_SEC / SPEEDUP
+                time.sleep(max(0.0, next_at - time.perf_counter()))
+    finally:
+        windows.close()
+        rt_writer.close()
+        last_state_writer.close()
+        print(f"📖 read: {reader.stats.summary()}")
+        print(f"📝 RT_IOT_FEED: {rt_writer.stats.summary()}")
 
 
 # ============================================================
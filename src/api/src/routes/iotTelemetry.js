@@ -1,5 +1,5 @@
 // src/api/src/routes/iotTelemetry.js
-// ✅ FULL FILE — SILVER compatible (RT_IOT_FEED + CARS join + branch scoping)
+// ✅ FULL FILE — SILVER compatible (RT_CAR_LAST_STATE + CARS join + branch scoping)
 
 const express = require("express");
 const router = express.Router();
@@ -10,7 +10,8 @@ const { isSupervisor, requireBranch } = require("../access");
 
 /**
  * GET /api/v1/iot-telemetry/live
- * - Reads from RT_IOT_FEED (live buffer)
+ * - Reads from RT_CAR_LAST_STATE (one row per car, kept by the simulator)
+ *   -> cost follows fleet size, not RT_IOT_FEED history
  * - Joins CARS to expose MAKE/MODEL/PLATE
  * - SCOPED: Managers only see their branch
  */
@@ -33,7 +34,7 @@ router.get("/live", authMiddleware, async (req, res) => {
         rt.LATITUDE,
         rt.LONGITUDE,
         rt.RECEIVED_AT
-      FROM RT_IOT_FEED rt
+      FROM RT_CAR_LAST_STATE rt
       JOIN CARS c ON rt.CAR_ID = c.CAR_ID
     `;
 
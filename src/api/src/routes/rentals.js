@@ -154,6 +154,9 @@ function buildReport(telemetry, options = {}) {
   };
 }
 
+// first RT row of a rental vs START_AT: one tick + transport delay
+const RT_START_SLACK_MS = 2 * 60 * 1000;
+
 /* ===============================
    GET /api/v1/rentals/:id/report
 ================================ */
@@ -193,6 +196,8 @@ router.get("/:id/report", authMiddleware, async (req, res) => {
     if (!row) return res.status(404).json({ message: "Rental not found" });
 
     // 2) telemetry: prefer RT_IOT_FEED by RENTAL_ID, fallback to IOT_TELEMETRY by window
+    //    when RT is empty or no longer reaches back to START_AT (RT retention
+    //    keeps only the last N rows per car, so long rentals lose their start)
     let telemetry = [];
 
     const rtR = await conn.execute(
@@ -220,7 +225,11 @@ router.get("/:id/report", authMiddleware, async (req, res) => {
 
     telemetry = rtR.rows || [];
 
-    if (!telemetry.length) {
+    const rtFirst = telemetry.length ? new Date(telemetry[0].RECEIVED_AT).getTime() : null;
+    const rtCoversStart =
+      rtFirst !== null && rtFirst <= new Date(row.START_AT).getTime() + RT_START_SLACK_MS;
+
+    if (!rtCoversStart) {
       const histR = await conn.execute(
         `
         SELECT
@@ -249,7 +258,8 @@ router.get("/:id/report", authMiddleware, async (req, res) => {
         },
         { outFormat: oracledb.OUT_FORMAT_OBJECT }
       );
-      telemetry = histR.rows || [];
+      // no history (e.g. WRITE_HISTORY_IOT_TELEMETRY off): a partial RT report beats none
+      if (histR.rows?.length) telemetry = histR.rows;
     }
 
     const { metrics, routePoints } = buildReport(telemetry);
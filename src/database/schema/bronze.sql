@@ -307,7 +307,7 @@ CREATE TABLE RT_IOT_FEED (
 );
 
 CREATE INDEX IDX_RT_RECEIVED ON RT_IOT_FEED(RECEIVED_AT);
-CREATE INDEX IDX_RT_CAR_ID   ON RT_IOT_FEED(CAR_ID);
+CREATE INDEX IDX_RT_CAR_ID   ON RT_IOT_FEED(CAR_ID, RECEIVED_AT);
 
 COMMENT ON TABLE IOT_TELEMETRY IS 'Historical Data generated for analysis';
 COMMENT ON TABLE RT_IOT_FEED IS 'Real-Time Buffer for Live Monitoring Page';
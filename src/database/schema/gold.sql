@@ -749,7 +749,7 @@ LEFT JOIN DIM_DATE d ON d.DATE_KEY = td.DATE_KEY
 LEFT JOIN DIM_BRANCH b ON b.BRANCH_ID = td.BRANCH_ID
 LEFT JOIN DIM_CAR c ON c.CAR_ID = td.CAR_ID;
 
--- KPI: Live car status (reads SILVER RT feed)
+-- KPI: Live car status (reads SILVER latest-state table, one PK row per car)
 CREATE OR REPLACE VIEW VW_KPI_LIVE_CAR_STATUS AS
 SELECT
   c.CAR_ID,
@@ -760,15 +760,11 @@ SELECT
   b.CITY AS BRANCH_CITY,
   c.DEVICE_ID,
   CASE
-    WHEN EXISTS (
-      SELECT 1
-      FROM SILVER_LAYER.RT_IOT_FEED rt
-      WHERE rt.CAR_ID = c.CAR_ID
-        AND rt.RECEIVED_AT > SYSTIMESTAMP - INTERVAL '2' MINUTE
-    ) THEN 1 ELSE 0
+    WHEN ls.RECEIVED_AT > SYSTIMESTAMP - INTERVAL '2' MINUTE THEN 1 ELSE 0
   END AS IS_SENDING_TELEMETRY
 FROM DIM_CAR c
-LEFT JOIN DIM_BRANCH b ON b.BRANCH_ID = c.BRANCH_ID;
+LEFT JOIN DIM_BRANCH b ON b.BRANCH_ID = c.BRANCH_ID
+LEFT JOIN SILVER_LAYER.RT_CAR_LAST_STATE ls ON ls.CAR_ID = c.CAR_ID;
 
 COMMIT;
 PROMPT [GOLD] Views created
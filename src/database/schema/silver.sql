@@ -70,6 +70,7 @@ BEGIN
     FROM user_tables
     WHERE table_name IN (
       'RT_IOT_FEED',
+      'RT_CAR_LAST_STATE',
       'IOT_TELEMETRY',
       'IOT_ALERTS',
       'RENTALS',
@@ -369,11 +370,31 @@ CREATE TABLE RT_IOT_FEED (
 );
 
 CREATE INDEX IDX_RT_RECEIVED ON RT_IOT_FEED(RECEIVED_AT);
-CREATE INDEX IDX_RT_CAR_ID   ON RT_IOT_FEED(CAR_ID);
+CREATE INDEX IDX_RT_CAR_ID   ON RT_IOT_FEED(CAR_ID, RECEIVED_AT);
 
 COMMENT ON TABLE IOT_TELEMETRY IS 'Historical Data generated for analysis';
 COMMENT ON TABLE RT_IOT_FEED IS 'Real-Time Buffer for Live Monitoring Page';
 
+-- 10b) RT_CAR_LAST_STATE (one row per car, MERGEd by the simulator every tick)
+-- Index-organized on CAR_ID: live map / "is sending" reads are a PK scan of the fleet
+CREATE TABLE RT_CAR_LAST_STATE (
+  CAR_ID          NUMBER NOT NULL,
+  DEVICE_ID       NUMBER,
+  RENTAL_ID       NUMBER,
+  EVENT_TS        TIMESTAMP,
+  LATITUDE        NUMBER(10, 7),
+  LONGITUDE       NUMBER(10, 7),
+  SPEED_KMH       NUMBER(6, 2),
+  FUEL_LEVEL_PCT  NUMBER(5, 2),
+  ENGINE_TEMP_C   NUMBER(5, 2),
+  ODOMETER_KM     NUMBER(10, 0),
+  EVENT_TYPE      VARCHAR2(50),
+  RECEIVED_AT     TIMESTAMP,
+  CONSTRAINT PK_RT_CAR_LAST_STATE PRIMARY KEY (CAR_ID)
+) ORGANIZATION INDEX;
+
+COMMENT ON TABLE RT_CAR_LAST_STATE IS 'Latest telemetry per car (live map, sending status)';
+
 -- 11) IOT_ALERTS (compatible with simulator + GOLD)
 CREATE TABLE IOT_ALERTS (
   ALERT_ID     NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
@@ -27,6 +27,7 @@ SEED_JSON_PATH = "seed_data.json"
 # IMPORTANT: delete children first, parents last
 WIPE_ORDER = [
     "RT_IOT_FEED",
+    "RT_CAR_LAST_STATE",
     "IOT_TELEMETRY",
     "RENTALS",
     "IOT_ALERTS",
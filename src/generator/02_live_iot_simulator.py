@@ -19,16 +19,35 @@
 
 from __future__ import annotations
 
-import math
-import random
+import multiprocessing as mp
+import threading
 import time
-from dataclasses import dataclass
+from collections import defaultdict
 from datetime import datetime, timedelta
+from pathlib import Path
 from typing import Optional
 
+try:
+    import resource  # peak RSS (Unix only)
+except ImportError:
+    resource = None
+
+import numpy as np
 import pandas as pd
 from sqlalchemy import create_engine, text
 
+from alert_rules import AlertRuleEngine
+from city_assets import load_city_assets
+from device_protocol import FrameEmitter
+from fleet_engine import EV_ENGINE_START, EV_ENGINE_STOP, EVENT_TYPES, CarStreams, FleetState, synthetic_cars
+from rt_retention import RetentionThread, RtFeedRetention
+from sim_metrics import MetricsHTTPServer, StageMetrics, watch_round_trips
+from telemetry_sinks import make_sinks
+from telemetry_spool import SpoolDrainer, TelemetrySpool
+from telemetry_writer import RT_FEED_COLUMNS, TELEMETRY_COLUMNS, LastStateWriter, serialize_rows
+from tick_pipeline import TickQueue, WriterStage
+from tick_scheduler import TickScheduler
+
 # ==============================
 # CONFIG
 # ==============================
@@ -41,11 +60,91 @@ CONNECT_ARGS = {"user": "silver_layer", "password": "Silver#123", "dsn": "localh
 TICK_SEC = 15
 SPEEDUP = 1.0  # 2.0 = twice faster, etc.
 
+# When a tick overruns its slot (tick_scheduler.py):
+# "skip" = jump to next deadline | "burst" = catch up back to back | "stretch" = shift the schedule
+SCHEDULE_POLICY = "skip"
+SCHEDULE_BURST_MAX = 10
+
 RESET_ON_START = True
 
+RANDOM_SEED = 42
+
+# Rentals opened / closed outside the simulator (API, UI) are picked up by
+# RentalStateCache.reconcile(). ORA_ROWSCN has no index: each reconcile is a
+# full scan of CARS + RENTALS, so it runs at most every RENTAL_RECONCILE_SEC
+# (0 = every tick). The simulator's own DML updates the cache directly.
+RENTAL_RECONCILE_SEC = 60
+
+# City boundaries compiled by city_assets.py (python city_assets.py) from cache/*.json:
+# cars start inside their city polygon and bounce off its edge. Missing file / None =
+# cars drift back to the CITY_COORDS center point.
+CITY_ASSETS = "city_assets.bin"
+
+# Multi-process mode: 1 = single process, K > 1 = one worker process per shard
+SHARDS = 1
+SHARD_BY = "branch"  # "branch" (whole branches per shard) | "hash" (CAR_ID % SHARDS)
+
 # If True, we also insert rows into IOT_TELEMETRY (history)
 WRITE_HISTORY_IOT_TELEMETRY = False
 
+# RT_CAR_LAST_STATE: latest row per car, one array MERGE per tick (live map reads
+# one PK row per car instead of scanning RT_IOT_FEED). Needs the "oracle" sink.
+WRITE_LAST_STATE = True
+
+# "array" = executemany writer (telemetry_writer.py), "to_sql" = old pandas path (for comparison)
+TELEMETRY_WRITER = "array"
+
+# Ingestion load test: "db" = write Oracle directly | "udp" / "tcp" = send binary device
+# frames (device_protocol.py) to 04_iot_gateway.py, which micro-batches them into RT_IOT_FEED.
+# Emit mode only generates telemetry (no rentals / alerts / spool in the simulator).
+TELEMETRY_TRANSPORT = "db"
+GATEWAY_HOST = "127.0.0.1"
+GATEWAY_UDP_PORT = 5514
+GATEWAY_TCP_PORT = 5515
+EMIT_FRAMES_PER_DATAGRAM = 512  # 80-byte frames -> ~40 KB datagrams (localhost)
+
+# Telemetry sinks (telemetry_sinks.py), several = fan-out:
+# "oracle" (RT_IOT_FEED / IOT_TELEMETRY) | "parquet" | "arrow" | "ndjson" | "null"
+TELEMETRY_SINKS = ("oracle",)
+SINK_DIR = "output"  # file sinks write under SINK_DIR/<TABLE>...
+
+# Headless benchmark: synthetic fleet, no database, null sink (see run_benchmark)
+BENCH_MODE = False
+BENCH_FLEET_SIZES = (1_000, 10_000, 100_000)  # e.g. add 1_000_000
+BENCH_TICKS = 20
+BENCH_CUSTOMERS = 1_000
+BENCH_SINKS = ("null",)  # e.g. ("parquet",) to dump a synthetic dataset at disk speed
+
+# Generate / persist pipeline (tick_pipeline.py): fleet ticks go through a bounded
+# queue to a writer thread, so a slow commit does not delay the next tick.
+PIPELINE = True
+PIPELINE_QUEUE_MAX = 8
+PIPELINE_POLICY = "block"  # "block" | "coalesce" (merge into latest per car) | "drop_oldest"
+# (drop_oldest is lossy: rentals opened/closed in a dropped tick are missed)
+
+# Local write-ahead spool (telemetry_spool.py): ticks survive DB outages and are
+# replayed in bulk once Oracle is back. None = off (a DB error stops the simulator)
+SPOOL_DIR = "spool"
+SPOOL_FSYNC = True
+SPOOL_DRAIN_MAX_ROWS = 200_000
+
+# RT_IOT_FEED retention (rt_retention.py), background thread, None = rule off
+# 300 rows ~ 75 min at 15s: rental reports of longer rentals fall back to
+# IOT_TELEMETRY (WRITE_HISTORY_IOT_TELEMETRY), or only show the last N rows
+RT_KEEP_LAST_N_ROWS_PER_CAR = 300
+RT_MAX_AGE_MIN = 24 * 60
+RT_RETENTION_INTERVAL_SEC = 60
+RT_RETENTION_BATCH_ROWS = 10_000
+
+# Hot-path metrics (sim_metrics.py): time per stage, SQL round-trips and bound rows per tick.
+# Prometheus text + JSON p50/p95/p99 summary, rewritten every METRICS_EVERY_TICKS ticks
+# (one pair per shard: <name>-shard<k>.<ext>). None = off
+METRICS_PROM_FILE = "metrics/simulator.prom"
+METRICS_JSON_FILE = "metrics/simulator_summary.json"
+METRICS_HTTP_PORT = None  # e.g. 9108 -> http://127.0.0.1:9108/metrics and /summary (port + shard id)
+METRICS_WINDOW_TICKS = 1000
+METRICS_EVERY_TICKS = 1
+
 # If True, delete simulator rentals at start (safe strategy below)
 RESET_RENTALS_CREATED_BY_SIM = True
 
@@ -57,32 +156,6 @@ UI_CURRENCY = "MAD"         # ✅ what you want to show in UI formatting (option
 
 SIM_TAG_MANAGER_ID = -9999  # ✅ use manager id as marker for simulator rows (safe for demo)
 
-# basic driving activity probabilities (per car per tick)
-P_START_ENGINE_IF_OFF = 0.03
-P_STOP_ENGINE_IF_ON = 0.02
-P_GO_IDLE_IF_ON = 0.10
-P_GO_DRIVING_IF_ON = 0.70
-# remaining = STOPPED
-
-# speed profiles by category
-CATEGORY_SPEED_PROFILE = {
-    "ECONOMY":  {"city": (18, 55), "mixed": (25, 80), "highway": (75, 110)},
-    "SUV":      {"city": (18, 60), "mixed": (30, 90), "highway": (85, 130)},
-    "LUXURY":   {"city": (18, 60), "mixed": (35, 105), "highway": (95, 145)},
-    "VAN":      {"city": (15, 50), "mixed": (25, 80), "highway": (75, 120)},
-    "ELECTRIC": {"city": (18, 55), "mixed": (25, 80), "highway": (75, 120)},
-}
-CATEGORY_FUEL_CONS = {"ECONOMY": 6.2, "SUV": 8.7, "LUXURY": 9.8, "VAN": 9.3, "ELECTRIC": 0.0}
-CATEGORY_TANK_SIZE = {"ECONOMY": 45,  "SUV": 60,  "LUXURY": 65,  "VAN": 75,  "ELECTRIC": 0}
-
-CITY_COORDS = {
-    "CASABLANCA": (33.5731, -7.5898),
-    "RABAT":      (34.0209, -6.8416),
-    "MARRAKECH":  (31.6295, -7.9811),
-    "TANGER":     (35.7595, -5.8340),
-    "AGADIR":     (30.4278, -9.5981),
-}
-
 PRICING_DAY = {
     "ECONOMY": 320,
     "SUV": 520,
@@ -92,12 +165,35 @@ PRICING_DAY = {
 }
 
 # Alerts
+# Cooldown = time-based dedup per (car, alert type): no new alert within this many
+# seconds of the last one, whatever its STATUS (closing an alert through the API
+# does not re-arm the rule early; warm-up at start follows the same rule)
 ALERT_COOLDOWN_SEC = 180
+# Declarative rules (alert_rules.py): "when" = (column, op, value) | {"all"/"any": [...]} | {"not": ...},
+# optional "for_ticks" = condition must hold N consecutive ticks. desc placeholders = batch columns.
 ALERT_RULES = {
-    "OVER_SPEED":  {"severity": "HIGH",   "speed_kmh": 120},
-    "OVERHEAT":    {"severity": "HIGH",   "engine_temp_c": 110},
-    "LOW_FUEL":    {"severity": "MEDIUM", "fuel_pct": 12},
-    "HARSH_BRAKE": {"severity": "MEDIUM", "brake_bar": 65},
+    "OVER_SPEED": {
+        "severity": "HIGH", "when": ("SPEED_KMH", ">=", 120),
+        "title": "Overspeed detected", "desc": "Speed {SPEED_KMH:.0f} km/h exceeds 120 km/h",
+    },
+    "OVERHEAT": {
+        "severity": "HIGH", "when": ("ENGINE_TEMP_C", ">=", 110),
+        "title": "Engine overheating", "desc": "Engine temp {ENGINE_TEMP_C:.0f}°C exceeds 110°C",
+    },
+    "LOW_FUEL": {
+        "severity": "MEDIUM", "when": ("FUEL_LEVEL_PCT", "<=", 12),
+        "title": "Low fuel", "desc": "Fuel {FUEL_LEVEL_PCT:.0f}% below 12%",
+    },
+    "HARSH_BRAKE": {
+        "severity": "MEDIUM", "when": ("BRAKE_PRESSURE_BAR", ">=", 65),
+        "title": "Harsh braking", "desc": "Brake {BRAKE_PRESSURE_BAR:.0f} bar exceeds 65 bar",
+    },
+    # e.g. duration + compound rule:
+    # "SUSTAINED_OVER_SPEED": {
+    #     "severity": "HIGH", "for_ticks": 3,
+    #     "when": {"all": [("SPEED_KMH", ">", 120), ("EVENT_TYPE", "==", "DRIVING")]},
+    #     "title": "Sustained overspeed", "desc": "Speed {SPEED_KMH:.0f} km/h for 3 ticks",
+    # },
 }
 
 engine = create_engine(ORACLE_URL, connect_args=CONNECT_ARGS, pool_pre_ping=True)
@@ -113,73 +209,6 @@ def to_upper_cols(df: pd.DataFrame) -> pd.DataFrame:
     df.columns = [c.upper().strip() for c in df.columns]
     return df
 
-def haversine_km(lat1, lon1, lat2, lon2) -> float:
-    R = 6371.0
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = (math.sin(dlat/2)**2 +
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2)
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    return R * c
-
-def pick_trip_type() -> str:
-    r = random.random()
-    if r < 0.55: return "city"
-    if r < 0.85: return "mixed"
-    return "highway"
-
-def sample_speed_kmh(category: str, trip_type: str) -> float:
-    prof = CATEGORY_SPEED_PROFILE.get(category.upper(), CATEGORY_SPEED_PROFILE["ECONOMY"])
-    vmin, vmax = prof[trip_type]
-    return random.uniform(vmin, vmax)
-
-def compute_acc_ms2(prev_speed_kmh: Optional[float], speed_kmh: float, dt_s: int) -> float:
-    if prev_speed_kmh is None: return 0.0
-    v1 = prev_speed_kmh / 3.6
-    v2 = speed_kmh / 3.6
-    return (v2 - v1) / dt_s
-
-def brake_pressure_bar(acc_ms2: float) -> float:
-    if acc_ms2 < -2.5: return random.uniform(35, 80)
-    if acc_ms2 < -1.0: return random.uniform(10, 35)
-    return random.uniform(0, 4)
-
-def simulate_battery_voltage(engine_on: bool) -> float:
-    return random.uniform(13.5, 14.4) if engine_on else random.uniform(12.2, 12.9)
-
-def simulate_engine_temp(prev: Optional[float], speed_kmh: float, engine_on: bool) -> float:
-    if not engine_on:
-        if prev is None: return 25.0
-        return max(25.0, prev - random.uniform(0.2, 0.6))
-    if prev is None:
-        prev = 45.0
-    target = 92.0 if speed_kmh > 30 else 75.0
-    prev = prev + (target - prev) * random.uniform(0.08, 0.12)
-    return prev + random.uniform(-0.8, 0.8)
-
-def update_fuel_pct(fuel_pct: float, category: str, speed_kmh: float, dt_s: int) -> float:
-    cat = category.upper()
-    cons = CATEGORY_FUEL_CONS.get(cat, 0.0)
-    tank = CATEGORY_TANK_SIZE.get(cat, 0)
-    if cons <= 0 or tank <= 0:
-        return fuel_pct
-    dist_km = speed_kmh * dt_s / 3600.0
-    cons_l = cons * dist_km / 100.0
-    cons_pct = (cons_l / tank) * 100.0
-    return max(0.0, fuel_pct - cons_pct)
-
-def city_center(city: str):
-    return CITY_COORDS.get((city or "CASABLANCA").upper(), CITY_COORDS["CASABLANCA"])
-
-def safe_num(v):
-    if v is None:
-        return None
-    try:
-        f = float(v)
-        return f if f == f else None
-    except Exception:
-        return None
-
 # ==============================
 # DB SETUP / LOAD SEEDS
 # ==============================
@@ -190,12 +219,39 @@ def alter_schema(conn):
     except Exception:
         pass
 
+def ensure_rt_car_index(conn):
+    """
+    Older schemas (bronze.sql) index RT_IOT_FEED on CAR_ID only; last-N
+    retention needs (CAR_ID, RECEIVED_AT) to read a car's N newest rows
+    without sorting all of them.
+    """
+    cols = [r[0] for r in conn.execute(text("""
+        SELECT COLUMN_NAME
+          FROM ALL_IND_COLUMNS
+         WHERE INDEX_OWNER = SYS_CONTEXT('USERENV', 'CURRENT_SCHEMA')
+           AND INDEX_NAME = 'IDX_RT_CAR_ID'
+         ORDER BY COLUMN_POSITION
+    """)).fetchall()]
+    if cols == ["CAR_ID", "RECEIVED_AT"]:
+        return
+    try:
+        if cols:
+            conn.execute(text("DROP INDEX IDX_RT_CAR_ID"))
+        conn.execute(text("CREATE INDEX IDX_RT_CAR_ID   ON RT_IOT_FEED(CAR_ID, RECEIVED_AT)"))
+        print("🔧 IDX_RT_CAR_ID rebuilt on RT_IOT_FEED(CAR_ID, RECEIVED_AT)")
+    except Exception as e:
+        print(f"⚠️ IDX_RT_CAR_ID is on {cols or 'nothing'}, not (CAR_ID, RECEIVED_AT): "
+              f"last-N retention will sort every row of each car ({e})")
+
 def ensure_rt_table_exists(conn):
     try:
         conn.execute(text("SELECT 1 FROM RT_IOT_FEED WHERE 1=0"))
-        return
+        exists = True
     except Exception:
-        pass
+        exists = False
+    if exists:
+        ensure_rt_car_index(conn)
+        return
 
     conn.execute(text("""
         CREATE TABLE RT_IOT_FEED (
@@ -219,7 +275,32 @@ def ensure_rt_table_exists(conn):
         )
     """))
     conn.execute(text("CREATE INDEX IDX_RT_RECEIVED ON RT_IOT_FEED(RECEIVED_AT)"))
-    conn.execute(text("CREATE INDEX IDX_RT_CAR_ID   ON RT_IOT_FEED(CAR_ID)"))
+    conn.execute(text("CREATE INDEX IDX_RT_CAR_ID   ON RT_IOT_FEED(CAR_ID, RECEIVED_AT)"))
+
+def ensure_last_state_table_exists(conn):
+    try:
+        conn.execute(text("SELECT 1 FROM RT_CAR_LAST_STATE WHERE 1=0"))
+        return
+    except Exception:
+        pass
+
+    conn.execute(text("""
+        CREATE TABLE RT_CAR_LAST_STATE (
+          CAR_ID          NUMBER NOT NULL,
+          DEVICE_ID       NUMBER,
+          RENTAL_ID       NUMBER,
+          EVENT_TS        TIMESTAMP,
+          LATITUDE        NUMBER(10, 7),
+          LONGITUDE       NUMBER(10, 7),
+          SPEED_KMH       NUMBER(6, 2),
+          FUEL_LEVEL_PCT  NUMBER(5, 2),
+          ENGINE_TEMP_C   NUMBER(5, 2),
+          ODOMETER_KM     NUMBER(10, 0),
+          EVENT_TYPE      VARCHAR2(50),
+          RECEIVED_AT     TIMESTAMP,
+          CONSTRAINT PK_RT_CAR_LAST_STATE PRIMARY KEY (CAR_ID)
+        ) ORGANIZATION INDEX
+    """))
 
 def ensure_iot_alerts_table_exists(conn):
     try:
@@ -281,11 +362,19 @@ def load_cars(conn) -> pd.DataFrame:
 
 def reset_tables(conn):
     conn.execute(text("DELETE FROM RT_IOT_FEED"))
+    if WRITE_LAST_STATE:
+        conn.execute(text("DELETE FROM RT_CAR_LAST_STATE"))
     conn.execute(text("DELETE FROM IOT_ALERTS"))
     if WRITE_HISTORY_IOT_TELEMETRY:
         conn.execute(text("DELETE FROM IOT_TELEMETRY"))
 
     if RESET_RENTALS_CREATED_BY_SIM:
+        # history rows pointing at simulator rentals first (FK_IOT_TELE_RENTAL has no cascade)
+        conn.execute(text(f"""
+            DELETE FROM {SCHEMA}.IOT_TELEMETRY
+             WHERE RENTAL_ID IN (SELECT RENTAL_ID FROM {SCHEMA}.RENTALS WHERE CURRENCY = :cur)
+        """), {"cur": SIM_MARK_CURRENCY})
+
         # free cars for simulator rentals
         conn.execute(text(f"""
             UPDATE {SCHEMA}.CARS
@@ -304,19 +393,143 @@ def reset_tables(conn):
         """), {"cur": SIM_MARK_CURRENCY})
 
 # ==============================
-# RENTAL HELPERS
+# RENTAL STATE CACHE
 # ==============================
-def get_active_rental(conn, car_id: int) -> Optional[int]:
-    row = conn.execute(text(f"""
-        SELECT RENTAL_ID
-        FROM {SCHEMA}.RENTALS
-        WHERE CAR_ID=:cid
-          AND STATUS IN ('ACTIVE','IN_PROGRESS')
-        ORDER BY RENTAL_ID DESC
-        FETCH FIRST 1 ROWS ONLY
-    """), {"cid": car_id}).fetchone()
-    return int(row[0]) if row else None
 
+ACTIVE_RENTAL_STATUSES = ("ACTIVE", "IN_PROGRESS")
+
+class RentalStateCache:
+    """
+    In-memory view of car_id -> active rental and car_id -> CARS.STATUS.
+
+    Loaded once at startup, kept current by the tick batch flush,
+    and reconciled every RENTAL_RECONCILE_SEC with a single delta query on
+    ORA_ROWSCN (catches rentals opened/closed manually through the API).
+
+    Trade-off: ORA_ROWSCN cannot use an index, so a reconcile scans both
+    tables and its cost grows with RENTALS. Between two reconciles a manual
+    change is not seen yet (a car rented through the API may still look
+    AVAILABLE to the simulator for up to RENTAL_RECONCILE_SEC).
+    """
+
+    def __init__(self):
+        self.active: dict[int, tuple[int, str]] = {}  # car_id -> (rental_id, status)
+        self.car_status: dict[int, str] = {}
+        self.scn = 0
+        self.reconciled_at = float("-inf")  # monotonic clock of the last load / reconcile
+
+        # active RENTAL_ID per fleet position (0 = none), see bind_fleet()
+        self.fleet_pos: dict[int, int] = {}
+        self.fleet_rental = np.zeros(0, dtype=np.int64)
+
+    def bind_fleet(self, car_ids: np.ndarray):
+        """
+        Keep an array of active RENTAL_IDs aligned with the fleet arrays, so
+        the telemetry RENTAL_ID column is a copy, not a per-car lookup.
+        """
+        self.fleet_pos = {int(c): i for i, c in enumerate(car_ids)}
+        self.fleet_rental = np.zeros(len(car_ids), dtype=np.int64)
+        for cid, (rid, _) in self.active.items():
+            if cid in self.fleet_pos:
+                self.fleet_rental[self.fleet_pos[cid]] = rid
+
+    def _set_active(self, car_id: int, entry: Optional[tuple[int, str]]):
+        if entry is None:
+            self.active.pop(car_id, None)
+        else:
+            self.active[car_id] = entry
+        pos = self.fleet_pos.get(car_id)
+        if pos is not None:
+            self.fleet_rental[pos] = entry[0] if entry else 0
+
+    def rental_column(self) -> np.ndarray:
+        """
+        RENTAL_ID per fleet position (NaN = no active rental).
+        """
+        return np.where(self.fleet_rental > 0, self.fleet_rental, np.nan)
+
+    def load(self, conn):
+        self.active.clear()
+        self.car_status.clear()
+        self.scn = 0
+        self.fleet_rental[:] = 0
+        self.reconciled_at = time.monotonic()
+        self._apply(conn.execute(text(f"""
+            SELECT 'C' AS SRC, NULL AS RENTAL_ID, CAR_ID, STATUS, ORA_ROWSCN AS SCN
+              FROM {SCHEMA}.CARS
+            UNION ALL
+            SELECT 'R', RENTAL_ID, CAR_ID, STATUS, ORA_ROWSCN
+              FROM {SCHEMA}.RENTALS
+             WHERE STATUS IN ('ACTIVE','IN_PROGRESS')
+        """)).fetchall())
+
+    def reconcile_due(self, every_sec: float = RENTAL_RECONCILE_SEC) -> bool:
+        return time.monotonic() - self.reconciled_at >= every_sec
+
+    def reconcile(self, conn) -> int:
+        """
+        One round-trip: CARS / RENTALS rows changed since the last watermark.
+        ORA_ROWSCN is block-level, so a few unchanged rows may come back too
+        (applying them again is harmless). Full scan of both tables, see
+        RENTAL_RECONCILE_SEC.
+        """
+        self.reconciled_at = time.monotonic()
+        rows = conn.execute(text(f"""
+            SELECT 'C' AS SRC, NULL AS RENTAL_ID, CAR_ID, STATUS, ORA_ROWSCN AS SCN
+              FROM {SCHEMA}.CARS
+             WHERE ORA_ROWSCN >= :scn
+            UNION ALL
+            SELECT 'R', RENTAL_ID, CAR_ID, STATUS, ORA_ROWSCN
+              FROM {SCHEMA}.RENTALS
+             WHERE ORA_ROWSCN >= :scn
+        """), {"scn": self.scn}).fetchall()
+        self._apply(rows)
+        return len(rows)
+
+    def _apply(self, rows):
+        rentals = []
+        for src, rid, cid, status, scn in rows:
+            self.scn = max(self.scn, int(scn or 0))
+            status = str(status or "").upper().strip()
+            if src == "C":
+                self.car_status[int(cid)] = status
+            else:
+                rentals.append((int(rid), int(cid), status))
+
+        # latest RENTAL_ID wins (same rule as the old per-car SELECT)
+        for rid, cid, status in sorted(rentals):
+            cur = self.active.get(cid)
+            if status in ACTIVE_RENTAL_STATUSES:
+                if cur is None or rid >= cur[0]:
+                    self._set_active(cid, (rid, status))
+            elif cur is not None and cur[0] == rid:
+                self._set_active(cid, None)
+
+    def active_rental(self, car_id: int) -> Optional[int]:
+        cur = self.active.get(car_id)
+        return cur[0] if cur else None
+
+    def is_available(self, car_id: int) -> bool:
+        """
+        Car can start a rental only if:
+        - car status is AVAILABLE
+        - and no ACTIVE/IN_PROGRESS rental exists
+        """
+        return self.car_status.get(car_id) == "AVAILABLE" and car_id not in self.active
+
+    def on_created(self, car_id: int, rental_id: int):
+        self._set_active(car_id, (rental_id, "ACTIVE"))
+        self.car_status[car_id] = "RENTED"
+
+    def on_closed(self, car_id: int, rental_id: int):
+        cur = self.active.get(car_id)
+        if cur is not None and cur[0] == rental_id:
+            self._set_active(car_id, None)
+        self.car_status[car_id] = "AVAILABLE"
+
+# ==============================
+# RENTAL HELPERS
+# ==============================
 def category_price_range_mad(category: str) -> tuple[float, float]:
     """
     Non-random ranges by category:
@@ -343,40 +556,37 @@ def clamp_price_day_mad(category: str, day_price: float) -> float:
     lo, hi = category_price_range_mad(category)
     return float(clamp(float(day_price), lo, hi))
 
-def is_car_available_for_rental(conn, car_id: int) -> bool:
-    """
-    Car can start a rental only if:
-    - car status is AVAILABLE
-    - and no ACTIVE/IN_PROGRESS rental exists
-    """
-    r = conn.execute(text(f"""
-        SELECT STATUS
-        FROM {SCHEMA}.CARS
-        WHERE CAR_ID=:cid
-    """), {"cid": car_id}).fetchone()
-
-    if not r:
-        return False
-
-    car_status = str(r[0] or "").upper().strip()
-    if car_status != "AVAILABLE":
-        return False
-
-    return get_active_rental(conn, car_id) is None
-
-def create_rental(conn, *, car_id: int, branch_id: int, customer_id: int, manager_id: int,
-                  start_ts: datetime, start_odo: float, category: str) -> int:
+def rental_binds(*, car_id: int, branch_id: int, customer_id: int, manager_id: int,
+                 start_ts: datetime, start_odo: float, category: str) -> dict:
     base_day = PRICING_DAY.get((category or "").upper(), 300)
     day_price = clamp_price_day_mad(category, base_day)
 
-    due_at = start_ts + timedelta(days=2)
-    total_amount = float(day_price * 2)
+    return {
+        "cid": car_id,
+        "cust": customer_id,
+        "bid": branch_id,
+        "mid": int(manager_id),      # ✅ real manager (FK ok)
+        "start_at": start_ts,
+        "due_at": start_ts + timedelta(days=2),
+        "odo": float(start_odo),
+        "amt": float(day_price * 2),
+        "cur": SIM_MARK_CURRENCY,    # ✅ SIM marker
+    }
+
+def create_rentals(conn, binds: list[dict], created_at_sql: str = "SYSTIMESTAMP") -> list[int]:
+    """
+    Array INSERT with RETURNING RENTAL_ID (one round-trip for the whole list).
+    created_at_sql: ":start_at" for backfills (virtual clock).
+    """
+    if not binds:
+        return []
 
     raw = conn.connection
     cur = raw.cursor()
-    out_id = cur.var(int)
+    out_id = cur.var(int, arraysize=len(binds))
+    cur.setinputsizes(out_id=out_id)
 
-    cur.execute(f"""
+    cur.executemany(f"""
         INSERT INTO {SCHEMA}.RENTALS (
           CAR_ID, CUSTOMER_ID, BRANCH_ID, MANAGER_ID,
           START_AT, DUE_AT, STATUS,
@@ -386,64 +596,101 @@ def create_rental(conn, *, car_id: int, branch_id: int, customer_id: int, manage
           :cid, :cust, :bid, :mid,
           :start_at, :due_at, 'ACTIVE',
           :odo, :amt, :cur,
-          SYSTIMESTAMP
+          {created_at_sql}
         )
         RETURNING RENTAL_ID INTO :out_id
-    """, {
-        "cid": car_id,
-        "cust": customer_id,
-        "bid": branch_id,
-        "mid": int(manager_id),      # ✅ real manager (FK ok)
-        "start_at": start_ts,
-        "due_at": due_at,
-        "odo": float(start_odo),
-        "amt": total_amount,
-        "cur": SIM_MARK_CURRENCY,    # ✅ SIM marker
-        "out_id": out_id,
-    })
+    """, binds)
 
-    rid = out_id.getvalue()
-    rid = int(rid[0]) if isinstance(rid, list) else int(rid)
+    ids = []
+    for i in range(len(binds)):
+        rid = out_id.getvalue(i)
+        ids.append(int(rid[0]) if isinstance(rid, list) else int(rid))
     cur.close()
+    return ids
 
-    conn.execute(text(f"UPDATE {SCHEMA}.CARS SET STATUS='RENTED' WHERE CAR_ID=:cid"), {"cid": car_id})
-    return rid
-
-
-def close_rental(conn, *, rental_id: int, car_id: int, end_ts: datetime, end_odo: float):
+def close_rentals(conn, binds: list[dict]):
+    if not binds:
+        return
     conn.execute(text(f"""
         UPDATE {SCHEMA}.RENTALS
            SET STATUS='CLOSED',
                RETURN_AT=:ret,
                END_ODOMETER=:odo
          WHERE RENTAL_ID=:rid
-    """), {"rid": rental_id, "ret": end_ts, "odo": end_odo})
+    """), binds)
 
+def update_cars(conn, binds: list[dict]):
+    if not binds:
+        return
     conn.execute(text(f"""
         UPDATE {SCHEMA}.CARS
-           SET STATUS='AVAILABLE',
+           SET STATUS=:status,
                ODOMETER_KM=:odo
          WHERE CAR_ID=:cid
-    """), {"cid": car_id, "odo": end_odo})
+    """), binds)
+
+def plan_rentals(batch: "TickBatch", rentals: RentalStateCache, fleet: FleetState, cols: dict,
+                 event_ts: datetime, customers: np.ndarray, manager_id: int, rng: CarStreams):
+    """
+    Only cars with an ENGINE_START / ENGINE_STOP in this tick batch are visited.
+    Events and odometer come from the batch (the fleet may already be ticks ahead).
+    """
+    events = cols["EVENT_TYPE"]
+    odometer = cols["ODOMETER_KM"]
+    u_customer = rng.random(len(fleet))  # one draw per car (per-car streams)
+
+    for i in np.flatnonzero(events == EVENT_TYPES[EV_ENGINE_START]):
+        car_id = int(fleet.car_id[i])
+
+        # CREATE (only if car is truly free: AVAILABLE + no active rental)
+        if rentals.is_available(car_id):
+            batch.create_rental(
+                car_id=car_id,
+                branch_id=int(fleet.branch_id[i]),
+                customer_id=int(customers[int(u_customer[i] * len(customers))]),
+                manager_id=manager_id,
+                start_ts=event_ts,
+                start_odo=float(odometer[i]),
+                category=fleet.category(i),
+            )
+
+    for i in np.flatnonzero(events == EVENT_TYPES[EV_ENGINE_STOP]):
+        car_id = int(fleet.car_id[i])
+
+        # CLOSE
+        active_rental = rentals.active_rental(car_id)
+        if active_rental:
+            batch.close_rental(
+                rental_id=active_rental,
+                car_id=car_id,
+                end_ts=event_ts,
+                end_odo=float(odometer[i]),
+            )
 
 # ==============================
 # ALERT HELPERS
 # ==============================
 
-def should_insert_alert(conn, car_id: int, alert_type: str, event_ts: datetime) -> bool:
-    since = event_ts - timedelta(seconds=ALERT_COOLDOWN_SEC)
-    row = conn.execute(text(f"""
-        SELECT COUNT(*)
+def load_alert_cooldown(conn, now: datetime) -> dict[tuple[int, str], datetime]:
+    """
+    Last alert per (car_id, alert_type) still inside the cooldown window, any
+    STATUS (same as the in-memory cooldown, which never sees API closes):
+    read once at startup, then the rule engine keeps the state in memory.
+    """
+    rows = conn.execute(text(f"""
+        SELECT CAR_ID, ALERT_TYPE, MAX(EVENT_TS)
           FROM {SCHEMA}.IOT_ALERTS
-         WHERE CAR_ID = :carId
-           AND ALERT_TYPE = :atype
-           AND EVENT_TS >= :since
-           AND STATUS = 'OPEN'
-    """), {"carId": car_id, "atype": alert_type, "since": since}).fetchone()
-    return int(row[0] or 0) == 0
-
-def insert_alert(conn, *, car_id: int, branch_id: int, rental_id: Optional[int],
-                 alert_type: str, severity: str, title: str, desc: str, event_ts: datetime):
+         WHERE EVENT_TS >= :since
+         GROUP BY CAR_ID, ALERT_TYPE
+    """), {"since": now - timedelta(seconds=ALERT_COOLDOWN_SEC)}).fetchall()
+    return {(int(cid), str(atype)): ts for cid, atype, ts in rows}
+
+def make_alert_engine() -> AlertRuleEngine:
+    return AlertRuleEngine(ALERT_RULES, ALERT_COOLDOWN_SEC, columns=[c for c, _ in RT_FEED_COLUMNS])
+
+def insert_alerts(conn, binds: list[dict]):
+    if not binds:
+        return
     conn.execute(text(f"""
         INSERT INTO {SCHEMA}.IOT_ALERTS (
           CAR_ID, BRANCH_ID, RENTAL_ID,
@@ -454,270 +701,624 @@ def insert_alert(conn, *, car_id: int, branch_id: int, rental_id: Optional[int],
           :atype, :sev, :title, :desc,
           'OPEN', :eventTs, SYSTIMESTAMP
         )
-    """), {
-        "carId": car_id,
-        "branchId": branch_id,
-        "rentalId": rental_id,
-        "atype": alert_type,
-        "sev": severity,
-        "title": title,
-        "desc": desc,
-        "eventTs": event_ts,
-    })
-
-def detect_alerts(conn, *, car_id: int, branch_id: int, rental_id: Optional[int],
-                  speed: Optional[float], temp: Optional[float], fuel: Optional[float], brake: Optional[float],
-                  event_ts: datetime):
-    # OVER SPEED
-    thr = ALERT_RULES["OVER_SPEED"]["speed_kmh"]
-    if speed is not None and speed >= thr:
-        atype = "OVER_SPEED"
-        if should_insert_alert(conn, car_id, atype, event_ts):
-            insert_alert(conn, car_id=car_id, branch_id=branch_id, rental_id=rental_id,
-                         alert_type=atype, severity=ALERT_RULES["OVER_SPEED"]["severity"],
-                         title="Overspeed detected",
-                         desc=f"Speed {speed:.0f} km/h exceeds {thr} km/h",
-                         event_ts=event_ts)
-
-    # OVERHEAT
-    thr = ALERT_RULES["OVERHEAT"]["engine_temp_c"]
-    if temp is not None and temp >= thr:
-        atype = "OVERHEAT"
-        if should_insert_alert(conn, car_id, atype, event_ts):
-            insert_alert(conn, car_id=car_id, branch_id=branch_id, rental_id=rental_id,
-                         alert_type=atype, severity=ALERT_RULES["OVERHEAT"]["severity"],
-                         title="Engine overheating",
-                         desc=f"Engine temp {temp:.0f}°C exceeds {thr}°C",
-                         event_ts=event_ts)
-
-    # LOW FUEL
-    thr = ALERT_RULES["LOW_FUEL"]["fuel_pct"]
-    if fuel is not None and fuel <= thr:
-        atype = "LOW_FUEL"
-        if should_insert_alert(conn, car_id, atype, event_ts):
-            insert_alert(conn, car_id=car_id, branch_id=branch_id, rental_id=rental_id,
-                         alert_type=atype, severity=ALERT_RULES["LOW_FUEL"]["severity"],
-                         title="Low fuel",
-                         desc=f"Fuel {fuel:.0f}% below {thr}%",
-                         event_ts=event_ts)
-
-    # HARSH BRAKE
-    thr = ALERT_RULES["HARSH_BRAKE"]["brake_bar"]
-    if brake is not None and brake >= thr:
-        atype = "HARSH_BRAKE"
-        if should_insert_alert(conn, car_id, atype, event_ts):
-            insert_alert(conn, car_id=car_id, branch_id=branch_id, rental_id=rental_id,
-                         alert_type=atype, severity=ALERT_RULES["HARSH_BRAKE"]["severity"],
-                         title="Harsh braking",
-                         desc=f"Brake {brake:.0f} bar exceeds {thr} bar",
-                         event_ts=event_ts)
+    """), binds)
+
+def detect_alerts(batch: "TickBatch", alert_rules: AlertRuleEngine, cols: dict,
+                  branch_ids: np.ndarray, event_ts: datetime, commit: bool = True):
+    """
+    All rules are evaluated as masks over the whole tick (duration + cooldown
+    included); only firing rows reach Python, as one batch of alerts.
+    commit=False: caller runs alert_rules.commit() once the alerts are committed.
+    """
+    car_ids = cols["CAR_ID"]
+    rental_ids = cols["RENTAL_ID"]
+    for rule, rows in alert_rules.evaluate(cols, event_ts, commit=commit):
+        for i in rows:
+            rid = rental_ids[i]
+            batch.add_alert(car_id=int(car_ids[i]), branch_id=int(branch_ids[i]),
+                            rental_id=None if rid != rid else int(rid),
+                            alert_type=rule.name, severity=rule.severity,
+                            title=rule.title, desc=rule.describe(cols, i), event_ts=event_ts)
 
 # ==============================
-# SIM STATE
+# TICK BATCH (array DML)
 # ==============================
 
-@dataclass
-class CarState:
-    car_id: int
-    branch_id: int
-    city: str
-    device_id: int
-    category: str
-
-    engine_on: bool
-    trip_type: str
-
-    lat: float
-    lng: float
-
-    speed_kmh: float
-    prev_speed_kmh: Optional[float]
-
-    fuel_pct: float
-    engine_temp_c: float
-    odometer_km: float
-
-def init_state_from_cars(cars_df: pd.DataFrame) -> dict[int, CarState]:
-    states: dict[int, CarState] = {}
-
-    for _, r in cars_df.iterrows():
-        car_id = int(r["CAR_ID"])
-        branch_id = int(r["BRANCH_ID"])
-        city = str(r["CITY"] or "CASABLANCA")
-        device_id = int(r["DEVICE_ID"])
-        category = str(r["CATEGORY_NAME"] or "ECONOMY")
-
-        lat0, lng0 = city_center(city)
-
-        states[car_id] = CarState(
-            car_id=car_id,
-            branch_id=branch_id,
-            city=city,
-            device_id=device_id,
-            category=category,
-            engine_on=False,
-            trip_type=pick_trip_type(),
-            lat=lat0 + random.uniform(-0.02, 0.02),
-            lng=lng0 + random.uniform(-0.02, 0.02),
-            speed_kmh=0.0,
-            prev_speed_kmh=None,
-            fuel_pct=100.0,
-            engine_temp_c=25.0,
-            odometer_km=float(r["ODOMETER_KM"] or 0.0),
-        )
+class TickBatch:
+    """
+    Side effects of one tick, flushed as a constant number of array-bound
+    statements:
+      flush_rentals: INSERT RENTALS ... RETURNING RENTAL_ID,
+                     UPDATE RENTALS (closes), UPDATE CARS (status + odometer)
+      flush_alerts:  INSERT IOT_ALERTS
+    currency: marker of the rentals created (SIM = live simulator).
+    """
 
-    return states
+    def __init__(self, currency: str = SIM_MARK_CURRENCY):
+        self.currency = currency
+        self.new_rentals: list[dict] = []
+        self.closed_rentals: list[dict] = []
+        self.alerts: list[dict] = []
+
+    def __len__(self) -> int:
+        return len(self.new_rentals) + len(self.closed_rentals) + len(self.alerts)
+
+    def create_rental(self, **kw):
+        self.new_rentals.append({**rental_binds(**kw), "cur": self.currency})
+
+    def close_rental(self, *, rental_id: int, car_id: int, end_ts: datetime, end_odo: float):
+        self.closed_rentals.append({"rid": rental_id, "cid": car_id, "ret": end_ts, "odo": end_odo})
+
+    def add_alert(self, *, car_id: int, branch_id: int, rental_id: Optional[int],
+                  alert_type: str, severity: str, title: str, desc: str, event_ts: datetime):
+        self.alerts.append({
+            "carId": car_id,
+            "branchId": branch_id,
+            "rentalId": rental_id,
+            "atype": alert_type,
+            "sev": severity,
+            "title": title,
+            "desc": desc,
+            "eventTs": event_ts,
+        })
+
+    def flush_rentals(self, conn, cache: RentalStateCache, created_at_sql: str = "SYSTIMESTAMP",
+                      write_cars: bool = True):
+        """
+        Run the rental DML and update the cache (new RENTAL_IDs included).
+        write_cars=False: CARS is left alone (backfill on past days).
+        """
+        new_ids = create_rentals(conn, self.new_rentals, created_at_sql)
+        close_rentals(conn, [{k: c[k] for k in ("rid", "ret", "odo")} for c in self.closed_rentals])
+        if write_cars:
+            update_cars(
+                conn,
+                [{"cid": b["cid"], "status": "RENTED", "odo": b["odo"]} for b in self.new_rentals] +
+                [{"cid": c["cid"], "status": "AVAILABLE", "odo": c["odo"]} for c in self.closed_rentals],
+            )
+        self.apply_rentals(cache, new_ids)
+
+    def apply_rentals(self, cache: RentalStateCache, new_ids: list[int]):
+        for b, rid in zip(self.new_rentals, new_ids):
+            cache.on_created(b["cid"], rid)
+        for c in self.closed_rentals:
+            cache.on_closed(c["cid"], c["rid"])
+
+    def flush_alerts(self, conn):
+        insert_alerts(conn, self.alerts)
 
 # ==============================
-# TICK GENERATION
+# SHARD SIMULATOR
 # ==============================
 
-def tick_one_car(s: CarState, dt_s: int) -> dict:
+def merge_tick_batches(older: tuple, newer: tuple) -> tuple:
     """
-    Returns a telemetry row dict for RT_IOT_FEED.
+    "coalesce" policy: keep the latest row per car, but carry over the last
+    ENGINE_START / ENGINE_STOP of the skipped tick so rentals still open/close.
     """
-    event_ts = datetime.now()
+    _, old_cols, old_stages = older
+    now_ts, cols, stages = newer
+    transitions = (EVENT_TYPES[EV_ENGINE_START], EVENT_TYPES[EV_ENGINE_STOP])
+
+    old_ev, new_ev = old_cols["EVENT_TYPE"], cols["EVENT_TYPE"]
+    carry = np.isin(old_ev, transitions) & ~np.isin(new_ev, transitions)
+    if carry.any():
+        cols = dict(cols)
+        cols["EVENT_TYPE"] = np.where(carry, old_ev, new_ev)
+    for k, v in old_stages.items():  # the skipped tick's advance time is still spent
+        stages[k] += v
+    return now_ts, cols, stages
+
+def metrics_path(path: Optional[str], shard_id: int) -> Optional[str]:
+    if not path or SHARDS <= 1:
+        return path
+    p = Path(path)
+    return str(p.with_name(f"{p.stem}-shard{shard_id}{p.suffix}"))
+
+class ShardSimulator:
+    """
+    Everything one process needs to run its part of the fleet: fleet state,
+    rental/alert caches, writers, its own RNG stream and (via the module
+    engine) its own DB connection.
 
-    # engine start/stop transitions
-    if not s.engine_on and random.random() < P_START_ENGINE_IF_OFF:
-        s.engine_on = True
-        s.trip_type = pick_trip_type()
-        s.prev_speed_kmh = 0.0
-        s.speed_kmh = 0.0
-        s.engine_temp_c = simulate_engine_temp(s.engine_temp_c, 0.0, True)
-        return {
-            "DEVICE_ID": s.device_id,
-            "CAR_ID": s.car_id,
-            "EVENT_TS": event_ts,
-            "LATITUDE": s.lat,
-            "LONGITUDE": s.lng,
-            "SPEED_KMH": 0.0,
-            "ACCELERATION_MS2": 0.0,
-            "BRAKE_PRESSURE_BAR": 0.0,
-            "FUEL_LEVEL_PCT": float(s.fuel_pct),
-            "BATTERY_VOLTAGE": float(simulate_battery_voltage(True)),
-            "ENGINE_TEMP_C": float(s.engine_temp_c),
-            "ODOMETER_KM": float(s.odometer_km),
-            "EVENT_TYPE": "ENGINE_START",
-            "CREATED_AT": event_ts,
-        }
+    With PIPELINE on, tick() only generates and enqueues; persist() runs on
+    the writer thread, which is the only one touching the caches. The spool
+    drainer shares the writers, under sink_lock.
+    """
 
-    if s.engine_on and random.random() < P_STOP_ENGINE_IF_ON:
-        s.engine_on = False
-        s.prev_speed_kmh = s.speed_kmh
-        s.speed_kmh = 0.0
-        s.engine_temp_c = simulate_engine_temp(s.engine_temp_c, 0.0, False)
-        return {
-            "DEVICE_ID": s.device_id,
-            "CAR_ID": s.car_id,
-            "EVENT_TS": event_ts,
-            "LATITUDE": s.lat,
-            "LONGITUDE": s.lng,
-            "SPEED_KMH": 0.0,
-            "ACCELERATION_MS2": 0.0,
-            "BRAKE_PRESSURE_BAR": 0.0,
-            "FUEL_LEVEL_PCT": float(s.fuel_pct),
-            "BATTERY_VOLTAGE": float(simulate_battery_voltage(False)),
-            "ENGINE_TEMP_C": float(s.engine_temp_c),
-            "ODOMETER_KM": float(s.odometer_km),
-            "EVENT_TYPE": "ENGINE_STOP",
-            "CREATED_AT": event_ts,
-        }
+    def __init__(self, shard_id: int, cars_df: pd.DataFrame, customers: list[int], supervisor_id: int):
+        self.shard_id = shard_id
+        # per-car streams keyed by (seed, car_id): same telemetry whatever the sharding
+        self.rng = CarStreams(RANDOM_SEED, cars_df["CAR_ID"])
+        self.rental_rng = CarStreams(RANDOM_SEED + 1, cars_df["CAR_ID"])  # writer side
+        self.customers = np.asarray(customers, dtype=np.int64)
+        self.supervisor_id = supervisor_id
+
+        self.rentals = RentalStateCache()
+        self.alert_rules = make_alert_engine()
+        with engine.begin() as conn:
+            alter_schema(conn)
+            self.rentals.load(conn)
+            self.alert_rules.warm(load_alert_cooldown(conn, datetime.now()))
+
+        # Keep in-memory states (one array per field, whole fleet per tick)
+        self.fleet = FleetState.from_cars(cars_df, self.rng, load_city_assets(CITY_ASSETS))
+        self.rentals.bind_fleet(self.fleet.car_id)
+        self.alert_rules.bind_fleet(self.fleet.car_id)
+
+        sink_args = {"schema": SCHEMA, "writer": TELEMETRY_WRITER, "out_dir": SINK_DIR}
+        self.rt_writer = make_sinks(TELEMETRY_SINKS, "RT_IOT_FEED", RT_FEED_COLUMNS, **sink_args)
+        self.hist_writer = None
+        if WRITE_HISTORY_IOT_TELEMETRY:
+            self.hist_writer = make_sinks(TELEMETRY_SINKS, "IOT_TELEMETRY", TELEMETRY_COLUMNS, **sink_args)
+        self.last_state_writer = None
+        if WRITE_LAST_STATE and "oracle" in TELEMETRY_SINKS:
+            self.last_state_writer = LastStateWriter(schema=SCHEMA)
+
+        self.persisted = {"rows": 0, "opened": 0, "closed": 0, "alerts": 0}
+        self.rentals_stale = False
+
+        # device frames to the gateway instead of Oracle
+        self.emitter = None
+        if TELEMETRY_TRANSPORT != "db":
+            port = GATEWAY_UDP_PORT if TELEMETRY_TRANSPORT == "udp" else GATEWAY_TCP_PORT
+            self.emitter = FrameEmitter(TELEMETRY_TRANSPORT, GATEWAY_HOST, port, EMIT_FRAMES_PER_DATAGRAM)
+
+        # local write-ahead spool + background drainer (same sinks as the ticks, own connection);
+        # sink_lock: one DB write at a time, tick or drain (sinks are not thread-safe)
+        self.spool = None
+        self.drainer = None
+        self.sink_lock = threading.Lock()
+        if SPOOL_DIR and self.emitter is None:
+            self.spool = TelemetrySpool(Path(SPOOL_DIR) / f"shard-{shard_id}", fsync=SPOOL_FSYNC)
+            self.drainer = SpoolDrainer(self.spool, self.drain_write, max_rows=SPOOL_DRAIN_MAX_ROWS,
+                                        name=f"sim-spool-{shard_id}").start()
+
+        # per-stage timings / round-trips (writer thread + producer thread)
+        self.metrics = StageMetrics(METRICS_WINDOW_TICKS, labels={"shard": shard_id})
+        watch_round_trips(engine, self.metrics)
+        self.metrics_http = None
+        if METRICS_HTTP_PORT is not None:
+            self.metrics_http = MetricsHTTPServer(self.metrics, METRICS_HTTP_PORT + shard_id).start()
+
+        self.queue = None
+        self.writer = None
+        if PIPELINE:
+            self.queue = TickQueue(PIPELINE_QUEUE_MAX, PIPELINE_POLICY, merge=merge_tick_batches)
+            self.writer = WriterStage(self.queue, lambda item: self.persist(*item),
+                                      name=f"sim-writer-{shard_id}").start()
+
+    def produce(self, now_ts: datetime, stages: Optional[dict] = None) -> dict:
+        # generate one row per car per tick (columnar: one array per column)
+        with self.metrics.stage("advance", stages):
+            cols = self.fleet.advance(TICK_SEC, self.rng, now_ts)
+        cols["RECEIVED_AT"] = now_ts  # unify same tick timestamp
+        return cols
+
+    def persist(self, now_ts: datetime, cols: dict, stages: Optional[dict] = None):
+        """
+        With the spool on, the batch is on disk before the DB is touched; a DB
+        failure parks it for the drainer instead of killing the simulator.
+        stages: the tick's metrics accumulator (started by produce()).
+        """
+        try:
+            with self.metrics.recording(stages):
+                self.persist_tick(now_ts, cols)
+        finally:
+            self.end_tick_metrics(stages)
+
+    def persist_tick(self, now_ts: datetime, cols: dict):
+        if self.emitter is not None:
+            with self.metrics.stage("emit"):
+                self.persisted["rows"] += self.emitter.send(cols, len(cols["CAR_ID"]))
+            return
+
+        if self.spool is None:
+            self.persist_db(now_ts, cols)
+            return
+
+        cols["RENTAL_ID"] = self.rentals.rental_column()  # best known before this tick's DML
+        segment = self.spool.append(cols, len(cols["CAR_ID"]))
+        try:
+            self.persist_db(now_ts, cols)
+        except Exception as e:
+            self.spool.fail(segment)
+            self.rentals_stale = True  # rental DML of this tick was rolled back
+            self.alert_rules.discard()  # so were its alerts: no cooldown started
+            print(f"⚠️ DB write failed, tick spooled ({self.spool.summary()}): {e}")
+            return
+        self.spool.ack(segment)
+
+    def persist_db(self, now_ts: datetime, cols: dict):
+        fleet, rentals, m = self.fleet, self.rentals, self.metrics
+        n = len(cols["CAR_ID"])
+
+        # connect() + explicit commit (not begin()) so COMMIT gets its own timer;
+        # leaving the block without commit rolls back
+        with self.sink_lock, m.tracking(), engine.connect() as conn:
+            alter_schema(conn)
+
+            with m.stage("reconcile"):
+                if self.rentals_stale:
+                    rentals.load(conn)
+                    self.rentals_stale = False
+
+                # pick up rentals opened/closed through the API (full scan: throttled)
+                if rentals.reconcile_due():
+                    rentals.reconcile(conn)
+
+            # rentals: decisions are in-memory, DML is batched
+            with m.stage("rentals"):
+                batch = TickBatch()
+                plan_rentals(batch, rentals, fleet, cols, now_ts, self.customers, self.supervisor_id, self.rental_rng)
+                batch.flush_rentals(conn, rentals)
+                if batch.new_rentals:
+                    m.count("sql_round_trips")  # RETURNING insert runs on a raw cursor
+
+                # ✅ set RENTAL_ID column so reports can filter exactly
+                cols["RENTAL_ID"] = rentals.rental_column()
+
+            # alerts (use active rental at moment of event)
+            with m.stage("alerts"):
+                detect_alerts(batch, self.alert_rules, cols, fleet.branch_id, now_ts, commit=False)
+                batch.flush_alerts(conn)
+
+            # write RT_IOT_FEED
+            self.write_telemetry(conn, self.rt_writer, cols, n)
+
+            # latest state per car (same transaction as the feed rows)
+            if self.last_state_writer is not None:
+                self.write_telemetry(conn, self.last_state_writer, cols, n)
+
+            # optional history
+            if self.hist_writer is not None:
+                self.write_telemetry(conn, self.hist_writer, cols, n)
+
+            with m.stage("commit"):
+                conn.commit()
+            self.alert_rules.commit()  # cooldowns start only once the alerts are stored
+
+        # rentals: insert + close + car update binds
+        m.count("rows_bound", 2 * (len(batch.new_rentals) + len(batch.closed_rentals)) + len(batch.alerts))
+
+        self.persisted["rows"] += n
+        self.persisted["opened"] += len(batch.new_rentals)
+        self.persisted["closed"] += len(batch.closed_rentals)
+        self.persisted["alerts"] += len(batch.alerts)
+
+    def write_telemetry(self, conn, writer, cols: dict, n: int):
+        """
+        writer.write() split into serialize / db_execute from the writer's own stats.
+        """
+        st = writer.stats
+        sec, ser, execs = st.seconds, st.serialize_sec, st.executes
+        writer.write(conn, cols, n)
+        st = writer.stats
+        self.metrics.add("serialize", st.serialize_sec - ser)
+        self.metrics.add("db_execute", (st.seconds - sec) - (st.serialize_sec - ser))
+        self.metrics.count("sql_round_trips", st.executes - execs)
+        self.metrics.count("rows_bound", n)
+
+    def end_tick_metrics(self, stages: Optional[dict] = None):
+        self.metrics.end_tick(stages)
+        if self.metrics.ticks % METRICS_EVERY_TICKS == 0:
+            self.write_metrics()
+
+    def write_metrics(self):
+        try:
+            self.metrics.write_files(metrics_path(METRICS_PROM_FILE, self.shard_id),
+                                     metrics_path(METRICS_JSON_FILE, self.shard_id))
+        except OSError as e:
+            print(f"⚠️ Metrics export failed: {e}")
+
+    def drain_write(self, batch: dict, n: int):
+        """
+        Spooled ticks -> same tables as persist_db (last state included: the
+        MERGE never lets an older RECEIVED_AT overwrite a newer one).
+        """
+        with self.sink_lock, engine.begin() as conn:
+            alter_schema(conn)
+            self.rt_writer.write(conn, batch, n)
+            if self.last_state_writer is not None:
+                self.last_state_writer.write(conn, batch, n)
+            if self.hist_writer is not None:
+                self.hist_writer.write(conn, batch, n)
+
+    def tick(self, now_ts: datetime) -> dict:
+        t0 = time.perf_counter()
+        stages = self.metrics.new_tick()  # travels with the batch through the queue
+        cols = self.produce(now_ts, stages)
+        gen_sec = time.perf_counter() - t0
+
+        if self.writer is None:
+            self.persist(now_ts, cols, stages)
+        else:
+            self.writer.check()
+            self.queue.put((now_ts, cols, stages))
 
-    # if engine off => stopped idle point
-    if not s.engine_on:
         return {
-            "DEVICE_ID": s.device_id,
-            "CAR_ID": s.car_id,
-            "EVENT_TS": event_ts,
-            "LATITUDE": s.lat,
-            "LONGITUDE": s.lng,
-            "SPEED_KMH": 0.0,
-            "ACCELERATION_MS2": 0.0,
-            "BRAKE_PRESSURE_BAR": 0.0,
-            "FUEL_LEVEL_PCT": float(s.fuel_pct),
-            "BATTERY_VOLTAGE": float(simulate_battery_voltage(False)),
-            "ENGINE_TEMP_C": float(simulate_engine_temp(s.engine_temp_c, 0.0, False)),
-            "ODOMETER_KM": float(s.odometer_km),
-            "EVENT_TYPE": "STOPPED",
-            "CREATED_AT": event_ts,
+            "shard": self.shard_id,
+            "rows": len(self.fleet),
+            "gen_sec": gen_sec,
+            "sec": time.perf_counter() - t0,
+            "queue": len(self.queue) if self.queue is not None else 0,
+            **{f"persisted_{k}": v for k, v in self.persisted.items()},
         }
 
-    # engine on => choose DRIVING/IDLE/STOPPED
-    r = random.random()
-    if r < P_GO_DRIVING_IF_ON:
-        target = sample_speed_kmh(s.category, s.trip_type)
-        if s.prev_speed_kmh is None:
-            speed = target * random.uniform(0.6, 0.9)
-        else:
-            speed = s.speed_kmh + (target - s.speed_kmh) * random.uniform(0.15, 0.35)
-        speed = clamp(speed, 0.0, 160.0)
-        ev = "DRIVING"
-    elif r < P_GO_DRIVING_IF_ON + P_GO_IDLE_IF_ON:
-        speed = random.uniform(0.0, 7.0)
-        ev = "IDLE"
-    else:
-        speed = 0.0
-        ev = "STOPPED"
+    def queue_summary(self) -> str:
+        out = "pipeline off" if self.queue is None else self.queue.stats.summary(len(self.queue), self.queue.maxsize)
+        if self.spool is not None:
+            out += f" | {self.spool.summary()}"
+        if self.emitter is not None:
+            out += f" | {self.emitter.stats.summary()}"
+        return out
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.stop()
+            self.writer.check()
+        if self.drainer is not None:
+            self.drainer.stop()
+        self.rt_writer.close()
+        if self.hist_writer is not None:
+            self.hist_writer.close()
+        if self.last_state_writer is not None:
+            self.last_state_writer.close()
+        if self.emitter is not None:
+            self.emitter.close()
+        self.write_metrics()
+        if self.metrics_http is not None:
+            self.metrics_http.stop()
+
+# ==============================
+# RETENTION
+# ==============================
+
+def start_retention() -> Optional[RetentionThread]:
+    """
+    Off the hot path: own thread, own connection, short batched deletes.
+    """
+    if RT_KEEP_LAST_N_ROWS_PER_CAR is None and RT_MAX_AGE_MIN is None:
+        return None
+    retention = RtFeedRetention(
+        engine,
+        schema=SCHEMA,
+        keep_last_n=RT_KEEP_LAST_N_ROWS_PER_CAR,
+        max_age=timedelta(minutes=RT_MAX_AGE_MIN) if RT_MAX_AGE_MIN is not None else None,
+        batch_rows=RT_RETENTION_BATCH_ROWS,
+    )
+    return RetentionThread(retention, RT_RETENTION_INTERVAL_SEC).start()
+
+def stop_retention(thread: Optional[RetentionThread]):
+    if thread is not None:
+        thread.stop()
+        print(f"🧹 RT retention: {thread.retention.stats.summary()}")
 
-    acc = compute_acc_ms2(s.speed_kmh, speed, dt_s)
-    brake = brake_pressure_bar(acc)
+# ==============================
+# SCHEDULING
+# ==============================
 
-    # move
-    dist_km = speed * dt_s / 3600.0
-    bearing = random.uniform(0, 2 * math.pi)
-    dlat = (dist_km / 111.0) * math.cos(bearing)
-    dlon = (dist_km / (111.0 * max(0.2, math.cos(math.radians(s.lat))))) * math.sin(bearing)
+def make_scheduler() -> TickScheduler:
+    """
+    Fixed deadlines every TICK_SEC / SPEEDUP seconds, shared tick timestamp.
+    """
+    return TickScheduler(TICK_SEC / float(SPEEDUP), SCHEDULE_POLICY, burst_max=SCHEDULE_BURST_MAX)
 
-    city_lat, city_lon = city_center(s.city)
-    drift_lat = (city_lat - s.lat) * 0.02
-    drift_lon = (city_lon - s.lng) * 0.02
+# ==============================
+# SHARDING (multi-process)
+# ==============================
 
-    new_lat = s.lat + dlat + drift_lat
-    new_lng = s.lng + dlon + drift_lon
+def shard_cars(cars_df: pd.DataFrame, n_shards: int, by: str = SHARD_BY) -> list[pd.DataFrame]:
+    """
+    Disjoint split of the fleet: every car belongs to exactly one shard, so
+    two processes can never open a rental for the same car.
+      - "branch": whole branches, greedily balanced by car count
+      - "hash":   CAR_ID modulo n_shards
+    """
+    if n_shards <= 1:
+        return [cars_df]
+
+    if by == "hash":
+        key = cars_df["CAR_ID"].astype(np.int64) % n_shards
+    elif by == "branch":
+        sizes = cars_df.groupby("BRANCH_ID").size().sort_values(ascending=False)
+        load = [0] * n_shards
+        owner = {}
+        for branch_id, size in sizes.items():
+            k = load.index(min(load))
+            owner[branch_id] = k
+            load[k] += int(size)
+        key = cars_df["BRANCH_ID"].map(owner)
+    else:
+        raise ValueError(f"Unknown SHARD_BY: {by}")
+
+    shards = [cars_df[key == k].reset_index(drop=True) for k in range(n_shards)]
+    return [s for s in shards if not s.empty]
+
+def shard_worker(shard_id: int, cars_df: pd.DataFrame, customers: list[int], supervisor_id: int,
+                 inbox, outbox):
+    """
+    Process entry point: waits for (tick_no, now_ts) from the coordinator and
+    answers with the tick stats. None = stop.
+    """
+    try:
+        sim = ShardSimulator(shard_id, cars_df, customers, supervisor_id)
+        outbox.put(("ready", shard_id, len(sim.fleet)))
+        while True:
+            msg = inbox.get()
+            if msg is None:
+                break
+            tick_no, now_ts = msg
+            outbox.put(("tick", shard_id, tick_no, sim.tick(now_ts)))
+        sim.close()
+    except Exception as e:
+        outbox.put(("error", shard_id, repr(e)))
+
+def run_sharded(shards: list[pd.DataFrame], customers: list[int], supervisor_id: int):
+    """
+    Coordinator: one process per shard, one shared timestamp per tick, and the
+    next tick only starts once every shard has answered (aligned boundaries).
+    """
+    ctx = mp.get_context("spawn")
+    outbox = ctx.Queue()
+    inboxes = [ctx.Queue() for _ in shards]
+    procs = [
+        ctx.Process(target=shard_worker, args=(k, shard, customers, supervisor_id, inboxes[k], outbox),
+                    name=f"sim-shard-{k}", daemon=True)
+        for k, shard in enumerate(shards)
+    ]
+    for p in procs:
+        p.start()
+
+    def collect(kind: str) -> list[tuple]:
+        out = []
+        while len(out) < len(procs):
+            msg = outbox.get()
+            if msg[0] == "error":
+                raise RuntimeError(f"Shard {msg[1]} failed: {msg[2]}")
+            if msg[0] == kind:
+                out.append(msg)
+        return out
 
-    true_dist = haversine_km(s.lat, s.lng, new_lat, new_lng)
-    s.odometer_km += true_dist
+    try:
+        for _, shard_id, n in sorted(collect("ready")):
+            print(f"🧩 Shard {shard_id} ready ({n:,} cars)")
+
+        scheduler = make_scheduler()
+        for tick in scheduler:
+            tick_no, now_ts = tick.no, tick.ts
+
+            for q in inboxes:
+                q.put((tick_no, now_ts))
+            stats = [m[3] for m in collect("tick")]
+
+            rows = sum(s["rows"] for s in stats)
+            slowest = max(s["sec"] for s in stats)
+            print(
+                f"✅ Tick {tick_no} generated {rows:,} rows | {now_ts.strftime('%H:%M:%S')} | "
+                f"{len(stats)} shards, slowest {slowest:.2f}s | "
+                f"persisted {sum(s['persisted_rows'] for s in stats):,} rows, "
+                f"rentals +{sum(s['persisted_opened'] for s in stats)}/-{sum(s['persisted_closed'] for s in stats)}, "
+                f"alerts {sum(s['persisted_alerts'] for s in stats)} | "
+                f"queue max {max(s['queue'] for s in stats)} | {scheduler.summary()}"
+            )
+    finally:
+        for q in inboxes:
+            q.put(None)
+        for p in procs:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
 
-    # fuel/temp
-    s.fuel_pct = update_fuel_pct(s.fuel_pct, s.category, speed, dt_s)
-    s.engine_temp_c = simulate_engine_temp(s.engine_temp_c, speed, True)
+# ==============================
+# HEADLESS BENCHMARK
+# ==============================
 
-    # update last
-    s.prev_speed_kmh = s.speed_kmh
-    s.speed_kmh = speed
-    s.lat, s.lng = new_lat, new_lng
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # KB on Linux
 
+def run_benchmark(n_cars: int, n_ticks: int = BENCH_TICKS) -> dict:
+    """
+    Same per-tick stages as persist(), without Oracle:
+      generation, rental logic (fake RENTAL_IDs), alert detection,
+      serialization to executemany rows (then discarded),
+      BENCH_SINKS write (null by default).
+    """
+    cars_df = synthetic_cars(n_cars, RANDOM_SEED)
+    rng = CarStreams(RANDOM_SEED, cars_df["CAR_ID"])
+    rental_rng = CarStreams(RANDOM_SEED + 1, cars_df["CAR_ID"])
+    customers = np.arange(1, BENCH_CUSTOMERS + 1, dtype=np.int64)
+
+    fleet = FleetState.from_cars(cars_df, rng, load_city_assets(CITY_ASSETS))
+    rentals = RentalStateCache()
+    rentals.car_status = {int(c): "AVAILABLE" for c in fleet.car_id}
+    rentals.bind_fleet(fleet.car_id)
+    alert_rules = make_alert_engine()
+    alert_rules.bind_fleet(fleet.car_id)
+    sink = make_sinks(BENCH_SINKS, f"BENCH_{n_cars}", RT_FEED_COLUMNS, out_dir=SINK_DIR)
+
+    stages = defaultdict(float)
+    next_rental_id = 1
+    start_ts = datetime.now()
+    t_all = time.perf_counter()
+
+    for k in range(n_ticks):
+        now_ts = start_ts + timedelta(seconds=k * TICK_SEC)
+
+        t0 = time.perf_counter()
+        cols = fleet.advance(TICK_SEC, rng, now_ts)
+        cols["RECEIVED_AT"] = now_ts
+        t1 = time.perf_counter()
+
+        batch = TickBatch()
+        plan_rentals(batch, rentals, fleet, cols, now_ts, customers, SIM_TAG_MANAGER_ID, rental_rng)
+        new_ids = list(range(next_rental_id, next_rental_id + len(batch.new_rentals)))
+        next_rental_id += len(new_ids)
+        batch.apply_rentals(rentals, new_ids)
+        cols["RENTAL_ID"] = rentals.rental_column()
+        t2 = time.perf_counter()
+
+        detect_alerts(batch, alert_rules, cols, fleet.branch_id, now_ts)
+        t3 = time.perf_counter()
+
+        serialize_rows(RT_FEED_COLUMNS, cols, len(fleet))
+        t4 = time.perf_counter()
+
+        sink.write(None, cols, len(fleet))
+        t5 = time.perf_counter()
+
+        stages["generation"] += t1 - t0
+        stages["rentals"] += t2 - t1
+        stages["alerts"] += t3 - t2
+        stages["serialization"] += t4 - t3
+        stages["sink"] += t5 - t4
+
+    sink.close()
+    total = time.perf_counter() - t_all
+    rows = n_cars * n_ticks
     return {
-        "DEVICE_ID": s.device_id,
-        "CAR_ID": s.car_id,
-        "EVENT_TS": event_ts,
-        "LATITUDE": s.lat,
-        "LONGITUDE": s.lng,
-        "SPEED_KMH": float(speed),
-        "ACCELERATION_MS2": float(acc),
-        "BRAKE_PRESSURE_BAR": float(brake),
-        "FUEL_LEVEL_PCT": float(s.fuel_pct),
-        "BATTERY_VOLTAGE": float(simulate_battery_voltage(True)),
-        "ENGINE_TEMP_C": float(s.engine_temp_c),
-        "ODOMETER_KM": float(s.odometer_km),
-        "EVENT_TYPE": ev,
-        "CREATED_AT": event_ts,
+        "cars": n_cars,
+        "ticks": n_ticks,
+        "rows": rows,
+        "seconds": total,
+        "rows_per_sec": rows / total if total > 0 else 0.0,
+        "stages": dict(stages),
+        "peak_rss_mb": peak_rss_mb(),
     }
 
+def print_benchmark(res: dict):
+    stages = " | ".join(
+        f"{name} {sec / res['ticks'] * 1000:,.1f}ms" for name, sec in res["stages"].items()
+    )
+    rss = f"{res['peak_rss_mb']:,.0f} MB" if res["peak_rss_mb"] is not None else "n/a"
+    print(
+        f"🏁 {res['cars']:>9,} cars x {res['ticks']} ticks: {res['rows_per_sec']:>12,.0f} rows/s | "
+        f"per tick: {stages} | peak RSS {rss}"
+    )
 
 # ==============================
 # MAIN LOOP
 # ==============================
 
 def main():
-    random.seed(42)
+    if BENCH_MODE:
+        print(f"🧪 HEADLESS BENCHMARK (no DB, null sink) | ticks={BENCH_TICKS}")
+        for n_cars in BENCH_FLEET_SIZES:
+            print_benchmark(run_benchmark(n_cars))
+        return
+
     print("📡 LIVE IoT SIMULATOR STARTED")
-    print(f"⏱ Tick={TICK_SEC}s | SPEEDUP={SPEEDUP}x | history={WRITE_HISTORY_IOT_TELEMETRY}")
+    print(f"⏱ Tick={TICK_SEC}s | SPEEDUP={SPEEDUP}x | history={WRITE_HISTORY_IOT_TELEMETRY} | shards={SHARDS}")
+    if CITY_ASSETS and not Path(CITY_ASSETS).exists():
+        print(f"ℹ️ {CITY_ASSETS} not found (python city_assets.py), cars drift to city centers")
 
     with engine.begin() as conn:
         alter_schema(conn)
         ensure_rt_table_exists(conn)
+        if WRITE_LAST_STATE:
+            ensure_last_state_table_exists(conn)
         ensure_iot_alerts_table_exists(conn)
 
         supervisor_id = load_supervisor_id(conn)
@@ -731,130 +1332,34 @@ def main():
             reset_tables(conn)
             print("🧹 Reset done (RT_IOT_FEED, IOT_ALERTS, optional rentals/history)")
 
-    # Keep in-memory states
-    states = init_state_from_cars(cars_df)
-
-    while True:
-        tick_start = time.time()
-
-        rows = []
-        now_ts = datetime.now()
-
-        # generate one row per car per tick
-        for car_id, st in states.items():
-            row = tick_one_car(st, TICK_SEC)
-            row["RECEIVED_AT"] = now_ts  # unify same tick timestamp
-            rows.append(row)
-
-        df = pd.DataFrame(rows)
-        to_upper_cols(df)
+    retention = start_retention()
+    try:
+        run_simulator(cars_df, customers, supervisor_id)
+    finally:
+        stop_retention(retention)
+
+def run_simulator(cars_df: pd.DataFrame, customers: list[int], supervisor_id: int):
+    shards = shard_cars(cars_df, SHARDS)
+    if len(shards) > 1:
+        run_sharded(shards, customers, supervisor_id)
+        return
 
-        with engine.begin() as conn:
-            alter_schema(conn)
+    sim = ShardSimulator(0, cars_df, customers, supervisor_id)
+    print(f"🔑 Rental cache loaded ({len(sim.rentals.active):,} active rentals)")
 
-            # For each car, manage rentals + alerts, and set RENTAL_ID in telemetry
-            rental_ids_for_rows = []
-
-            for _, r in df.iterrows():
-                car_id = int(r["CAR_ID"])
-                ev = str(r["EVENT_TYPE"] or "").upper()
-                ts = r["EVENT_TS"]
-                odo = float(r["ODOMETER_KM"])
-
-                speed = safe_num(r.get("SPEED_KMH"))
-                temp = safe_num(r.get("ENGINE_TEMP_C"))
-                fuel = safe_num(r.get("FUEL_LEVEL_PCT"))
-                brake = safe_num(r.get("BRAKE_PRESSURE_BAR"))
-
-                st = states.get(car_id)
-                if not st:
-                    rental_ids_for_rows.append(None)
-                    continue
-
-                # current active rental for this car (ACTIVE or IN_PROGRESS)
-                active_rental = get_active_rental(conn, car_id)
-
-                # CREATE (only if car is truly free: AVAILABLE + no active rental)
-                if ev == "ENGINE_START" and not active_rental:
-                    if is_car_available_for_rental(conn, car_id):
-                        rid = create_rental(
-                            conn,
-                            car_id=car_id,
-                            branch_id=st.branch_id,
-                            customer_id=random.choice(customers),
-                            manager_id=supervisor_id,
-                            start_ts=ts,
-                            start_odo=odo,
-                            category=st.category,
-                        )
-                        active_rental = rid
-                    else:
-                        # car is already rented (manual or simulator) -> do NOT create a new rental
-                        active_rental = get_active_rental(conn, car_id)
-
-                # CLOSE
-                if ev == "ENGINE_STOP" and active_rental:
-                    close_rental(
-                        conn,
-                        rental_id=active_rental,
-                        car_id=car_id,
-                        end_ts=ts,
-                        end_odo=odo,
-                    )
-                    active_rental = None
-
-                # alerts (use active rental at moment of event)
-                detect_alerts(
-                    conn,
-                    car_id=car_id,
-                    branch_id=st.branch_id,
-                    rental_id=active_rental,
-                    speed=speed, temp=temp, fuel=fuel, brake=brake,
-                    event_ts=ts,
-                )
-
-                rental_ids_for_rows.append(active_rental)
-
-            # ✅ set RENTAL_ID column so reports can filter exactly
-            df["RENTAL_ID"] = rental_ids_for_rows
-
-            # choose columns for RT
-            df_to_insert = df[[
-                "DEVICE_ID", "CAR_ID", "RENTAL_ID", "EVENT_TS",
-                "LATITUDE", "LONGITUDE",
-                "SPEED_KMH", "ACCELERATION_MS2", "BRAKE_PRESSURE_BAR",
-                "FUEL_LEVEL_PCT", "BATTERY_VOLTAGE", "ENGINE_TEMP_C",
-                "ODOMETER_KM", "EVENT_TYPE", "CREATED_AT", "RECEIVED_AT"
-            ]].copy()
+    scheduler = make_scheduler()
+    try:
+        for tick in scheduler:
+            now_ts = tick.ts
 
-            # write RT_IOT_FEED
-            df_to_insert.to_sql(
-                "RT_IOT_FEED",
-                conn,
-                schema=SCHEMA,
-                if_exists="append",
-                index=False,
-                chunksize=2000,
+            stats = sim.tick(now_ts)
+            print(
+                f"✅ Tick generated {stats['rows']:,} rows in {stats['gen_sec']:.3f}s | {now_ts.strftime('%H:%M:%S')} | "
+                f"{scheduler.summary()} | {sim.queue_summary()} | RT {sim.rt_writer.stats.summary()}"
             )
-
-            # optional history
-            if WRITE_HISTORY_IOT_TELEMETRY:
-                hist = df_to_insert.drop(columns=["RECEIVED_AT"]).copy()
-                hist.to_sql(
-                    "IOT_TELEMETRY",
-                    conn,
-                    schema=SCHEMA,
-                    if_exists="append",
-                    index=False,
-                    chunksize=2000,
-                )
-
-        print(f"✅ Tick wrote {len(df):,} rows | {now_ts.strftime('%H:%M:%S')}")
-
-        elapsed = time.time() - tick_start
-        sleep_s = max(0.1, (TICK_SEC / float(SPEEDUP)) - elapsed)
-        time.sleep(sleep_s)
+            print(f"   ⏱ last persisted tick: {sim.metrics.short_summary()}")
+    finally:
+        sim.close()
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,272 @@
+# ============================================================
+# 03_backfill_history.py
+# ============================================================
+# Historical backfill (months of fleet activity, no sleeping)
+#
+# GOALS:
+# - Same car model (fleet_engine) and rental / alert rules as
+#   02_live_iot_simulator.py, on a virtual clock
+# - Fill IOT_TELEMETRY + RENTALS (+ IOT_ALERTS) day by day, in
+#   date order, for a configurable range (e.g. 12 months x 5k cars)
+# - One transaction per day; the day's telemetry goes in as ONE
+#   direct-path (APPEND_VALUES) array insert, then COMMIT
+# - Starts from an empty rental cache (every car AVAILABLE): only
+#   rentals created by the backfill (BACKFILL_MARK_CURRENCY) are
+#   inserted / closed, CARS is never written
+#
+# Use it to get gold-layer volumes (PKG_GOLD_LOAD, KPI views).
+# ============================================================
+
+from __future__ import annotations
+
+import importlib
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import text
+
+from city_assets import load_city_assets
+from fleet_engine import EV_ENGINE_STOP, CarStreams, FleetState
+from telemetry_sinks import make_sinks
+from telemetry_spool import merge_batches
+from telemetry_writer import TELEMETRY_COLUMNS
+
+# live simulator: config (SCHEMA, engine, pricing) + rental / alert rules
+sim = importlib.import_module("02_live_iot_simulator")
+
+# ==============================
+# CONFIG
+# ==============================
+
+BACKFILL_DAYS = 365
+BACKFILL_END = None          # datetime; None = today 00:00 (backfill stops where live starts)
+BACKFILL_TICK_SEC = 300      # history resolution (live = 15s)
+BACKFILL_MAX_CARS = None     # e.g. 5_000 to cap the fleet, None = all cars with a device
+
+# parked cars produce one identical row per tick: keep only engine-on rows + ENGINE_STOP
+BACKFILL_SKIP_PARKED = True
+BACKFILL_ALERTS = True
+
+# the car model never refuels; over months every tank would sit at 0% (and raise
+# fuel alerts forever), so parked cars below this level are refilled
+BACKFILL_REFUEL_BELOW_PCT = 25.0
+
+# APPEND_VALUES is silently ignored by Oracle while IOT_TELEMETRY FKs are enabled
+BACKFILL_DIRECT_PATH = True
+BACKFILL_SINKS = ("oracle",)  # same kinds as TELEMETRY_SINKS, e.g. ("parquet",)
+
+# delete what a previous run left in the range before loading: backfill rentals
+# started in it + the IOT_TELEMETRY / IOT_ALERTS rows tied to them (RENTAL_ID),
+# never live-simulator data. IOT_TELEMETRY only when "oracle" is a sink.
+# Parked-car alerts (no rental) are not matched and stay.
+BACKFILL_RESET_RANGE = False
+BACKFILL_RESET_BATCH_ROWS = 10_000  # DELETE ... AND ROWNUM <= batch, commit per batch
+
+# marks backfill rentals (CURRENCY), distinct from the live simulator's "SIM":
+# XTS = ISO 4217 code reserved for testing
+BACKFILL_MARK_CURRENCY = "XTS"
+
+# cars start the range this many km/day below today's CARS.ODOMETER_KM
+BACKFILL_KM_PER_DAY = 40.0
+
+# ==============================
+# HELPERS
+# ==============================
+
+def backfill_window() -> tuple[datetime, datetime]:
+    end = BACKFILL_END or datetime.combine(datetime.now().date(), datetime.min.time())
+    return end - timedelta(days=BACKFILL_DAYS), end
+
+def day_ticks(day_start: datetime) -> list[datetime]:
+    n = int(86400 // BACKFILL_TICK_SEC)
+    return [day_start + timedelta(seconds=k * BACKFILL_TICK_SEC) for k in range(n)]
+
+def keep_rows(cols: dict, fleet: FleetState) -> tuple[dict, int]:
+    """
+    Rows to store for this tick (all of them, or engine-on + ENGINE_STOP only).
+    """
+    n = len(fleet)
+    if not BACKFILL_SKIP_PARKED:
+        return cols, n
+
+    mask = fleet.engine_on | (fleet.event_code == EV_ENGINE_STOP)
+    out = {k: (v[mask] if isinstance(v, np.ndarray) and len(v) == n else v) for k, v in cols.items()}
+    return out, int(mask.sum())
+
+def refuel(fleet: FleetState):
+    low = ~fleet.engine_on & (fleet.fuel_pct < BACKFILL_REFUEL_BELOW_PCT)
+    if low.any():
+        fleet.fuel_pct = np.where(low, 100.0, fleet.fuel_pct)
+
+def delete_batched(conn, sql: str, binds: dict) -> int:
+    """
+    sql: a DELETE whose WHERE ends with "AND ROWNUM <= :batch"; one commit per batch.
+    """
+    deleted = 0
+    while True:
+        n = conn.execute(text(sql), {**binds, "batch": BACKFILL_RESET_BATCH_ROWS}).rowcount or 0
+        conn.commit()
+        deleted += n
+        if n < BACKFILL_RESET_BATCH_ROWS:
+            return deleted
+
+def reset_range(conn, start: datetime, end: datetime, telemetry: bool = True):
+    """
+    Only rows tied to backfill rentals (CURRENCY = BACKFILL_MARK_CURRENCY)
+    started in the range. Children first (FK_IOT_TELE_RENTAL / FK_ALERT_RENTAL
+    have no cascade); telemetry=False keeps IOT_TELEMETRY, and with it the
+    rentals it still references.
+    """
+    binds = {"start_ts": start, "end_ts": end, "cur": BACKFILL_MARK_CURRENCY}
+    rentals = f"""
+        SELECT RENTAL_ID FROM {sim.SCHEMA}.RENTALS
+         WHERE CURRENCY = :cur AND START_AT >= :start_ts AND START_AT < :end_ts
+    """
+    deleted = {}
+    for table in ("IOT_TELEMETRY", "IOT_ALERTS") if telemetry else ("IOT_ALERTS",):
+        deleted[table] = delete_batched(conn, f"""
+            DELETE FROM {sim.SCHEMA}.{table}
+             WHERE RENTAL_ID IN ({rentals})
+               AND ROWNUM <= :batch
+        """, binds)
+    referenced = "" if telemetry else f"""
+               AND NOT EXISTS (SELECT 1 FROM {sim.SCHEMA}.IOT_TELEMETRY t WHERE t.RENTAL_ID = r.RENTAL_ID)"""
+    deleted["RENTALS"] = delete_batched(conn, f"""
+        DELETE FROM {sim.SCHEMA}.RENTALS r
+         WHERE CURRENCY = :cur AND START_AT >= :start_ts AND START_AT < :end_ts{referenced}
+           AND ROWNUM <= :batch
+    """, binds)
+    print(f"🧹 {start:%Y-%m-%d} -> {end:%Y-%m-%d}: " + " | ".join(f"{t} -{n:,}" for t, n in deleted.items()))
+
+# ==============================
+# BACKFILL
+# ==============================
+
+class Backfill:
+    def __init__(self, conn):
+        cars_df = sim.load_cars(conn)
+        if cars_df.empty:
+            raise RuntimeError("No cars with DEVICE_ID found")
+        if BACKFILL_MAX_CARS:
+            cars_df = cars_df.head(BACKFILL_MAX_CARS)
+        # today's reading is where the range should end, not where it starts
+        cars_df = cars_df.assign(ODOMETER_KM=np.maximum(
+            0.0, cars_df["ODOMETER_KM"].fillna(0.0).astype(float) - BACKFILL_DAYS * BACKFILL_KM_PER_DAY))
+
+        self.customers = np.asarray(sim.load_customers(conn), dtype=np.int64)
+        self.supervisor_id = sim.load_supervisor_id(conn)
+
+        self.rng = CarStreams(sim.RANDOM_SEED, cars_df["CAR_ID"])
+        self.rental_rng = CarStreams(sim.RANDOM_SEED + 1, cars_df["CAR_ID"])
+        self.fleet = FleetState.from_cars(cars_df, self.rng, load_city_assets(sim.CITY_ASSETS))
+
+        # past days: today's rentals / car statuses don't apply (same as run_benchmark)
+        self.rentals = sim.RentalStateCache()
+        self.rentals.car_status = {int(c): "AVAILABLE" for c in self.fleet.car_id}
+        self.rentals.bind_fleet(self.fleet.car_id)
+        self.alert_rules = sim.make_alert_engine()
+        self.alert_rules.bind_fleet(self.fleet.car_id)
+
+        self.writer = make_sinks(BACKFILL_SINKS, "IOT_TELEMETRY", TELEMETRY_COLUMNS, schema=sim.SCHEMA,
+                                 writer=sim.TELEMETRY_WRITER, direct_path=BACKFILL_DIRECT_PATH,
+                                 out_dir=sim.SINK_DIR)
+        self.totals = {"rows": 0, "opened": 0, "closed": 0, "alerts": 0}
+
+    def run_day(self, conn, day_start: datetime) -> int:
+        """
+        All ticks of one day; rental/alert DML per tick, telemetry once at the end.
+        """
+        fleet, rentals = self.fleet, self.rentals
+        batches = []
+
+        for ts in day_ticks(day_start):
+            cols = fleet.advance(BACKFILL_TICK_SEC, self.rng, ts)
+            refuel(fleet)
+
+            batch = sim.TickBatch(BACKFILL_MARK_CURRENCY)
+            ending = rentals.rental_column()
+            sim.plan_rentals(batch, rentals, fleet, cols, ts, self.customers, self.supervisor_id, self.rental_rng)
+            batch.flush_rentals(conn, rentals, created_at_sql=":start_at", write_cars=False)
+            # ENGINE_STOP rows keep the rental they end (so reset_range finds them)
+            stop = fleet.event_code == EV_ENGINE_STOP
+            cols["RENTAL_ID"] = np.where(stop, ending, rentals.rental_column())
+
+            if BACKFILL_ALERTS:
+                sim.detect_alerts(batch, self.alert_rules, cols, fleet.branch_id, ts)
+                batch.flush_alerts(conn)
+
+            kept, n = keep_rows(cols, fleet)
+            if n:
+                batches.append((kept, n))
+
+            self.totals["opened"] += len(batch.new_rentals)
+            self.totals["closed"] += len(batch.closed_rentals)
+            self.totals["alerts"] += len(batch.alerts)
+
+        if not batches:
+            return 0
+        merged, n = merge_batches(batches)
+        self.writer.write(conn, merged, n)
+        self.totals["rows"] += n
+        return n
+
+    def close_open_rentals(self, conn, end: datetime) -> int:
+        """
+        Backfill rentals still running at the end of the range are returned
+        there (the cache only ever holds the backfill's own rentals).
+        """
+        batch = sim.TickBatch(BACKFILL_MARK_CURRENCY)
+        pos = self.rentals.fleet_pos
+        for car_id, (rental_id, _) in list(self.rentals.active.items()):
+            batch.close_rental(rental_id=rental_id, car_id=car_id, end_ts=end,
+                               end_odo=float(self.fleet.odometer_km[pos[car_id]]))
+        batch.flush_rentals(conn, self.rentals, write_cars=False)
+        self.totals["closed"] += len(batch.closed_rentals)
+        return len(batch.closed_rentals)
+
+# ==============================
+# MAIN
+# ==============================
+
+def main():
+    start, end = backfill_window()
+    print("⏪ HISTORY BACKFILL STARTED")
+    print(f"📅 {start:%Y-%m-%d} -> {end:%Y-%m-%d} | tick={BACKFILL_TICK_SEC}s | "
+          f"direct_path={BACKFILL_DIRECT_PATH} | sinks={BACKFILL_SINKS}")
+
+    t_all = time.perf_counter()
+    with sim.engine.connect() as conn:
+        sim.alter_schema(conn)
+        if BACKFILL_RESET_RANGE:  # rentals / alerts go to Oracle whatever the telemetry sinks
+            reset_range(conn, start, end, telemetry="oracle" in BACKFILL_SINKS)
+
+        bf = Backfill(conn)
+        print(f"🚗 {len(bf.fleet):,} cars | {len(bf.customers):,} customers")
+
+        day = start
+        while day < end:
+            t0 = time.perf_counter()
+            n = bf.run_day(conn, day)
+            conn.commit()  # per-day commit (also required between direct-path inserts, ORA-12838)
+
+            print(f"✅ {day:%Y-%m-%d} | {n:,} rows in {time.perf_counter() - t0:.1f}s | "
+                  f"rentals +{bf.totals['opened']:,}/-{bf.totals['closed']:,} | alerts {bf.totals['alerts']:,}")
+            day += timedelta(days=1)
+
+        n = bf.close_open_rentals(conn, end)
+        conn.commit()
+        print(f"🧾 {n:,} rentals still open at {end:%Y-%m-%d} returned")
+
+    bf.writer.close()
+    total = time.perf_counter() - t_all
+
+    print("=============================================================")
+    print("🎉 Backfill done.")
+    print(f"📈 Telemetry rows: {bf.totals['rows']:,} ({bf.totals['rows'] / max(total, 1e-9):,.0f} rows/s)")
+    print(f"🧾 Rentals opened/closed: {bf.totals['opened']:,} / {bf.totals['closed']:,}")
+    print(f"✍️ IOT_TELEMETRY writer: {bf.writer.stats.summary()}")
+    print("=============================================================")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+# ============================================================
+# 04_iot_gateway.py
+# ============================================================
+# Local ingestion gateway for simulated devices (load testing)
+#
+# GOALS:
+# - asyncio UDP + TCP listeners, binary frames (device_protocol.py)
+# - resolve DEVICE_ID / DEVICE_IMEI -> CAR_ID (in-memory directory)
+# - micro-batch by size (BATCH_MAX_ROWS) or age (BATCH_MAX_MS),
+#   then ONE array insert into RT_IOT_FEED per batch (+ optional
+#   RT_CAR_LAST_STATE MERGE), on a worker thread
+# - report frames/s and device-to-row latency (sent_us -> commit)
+#
+# Run it, then start 02_live_iot_simulator.py with
+# TELEMETRY_TRANSPORT = "udp" (or "tcp").
+# ============================================================
+
+from __future__ import annotations
+
+import asyncio
+import importlib
+import socket
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import text
+
+from device_protocol import FRAME_SIZE, KEY_IMEI, decode_frames, frames_to_batch, now_us
+from telemetry_writer import RT_FEED_COLUMNS, LastStateWriter, TelemetryWriter
+
+# live simulator: SCHEMA, engine, gateway address
+sim = importlib.import_module("02_live_iot_simulator")
+
+# ==============================
+# CONFIG
+# ==============================
+
+HOST = sim.GATEWAY_HOST
+UDP_PORT = sim.GATEWAY_UDP_PORT  # None = no UDP listener
+TCP_PORT = sim.GATEWAY_TCP_PORT  # None = no TCP listener
+
+BATCH_MAX_ROWS = 20_000
+BATCH_MAX_MS = 200
+MAX_PENDING_ROWS = 500_000  # UDP frames beyond this are dropped, TCP readers wait
+
+UDP_RCVBUF_BYTES = 8 * 1024 * 1024
+WRITE_LAST_STATE = True
+REPORT_EVERY_SEC = 5
+LATENCY_WINDOW_FRAMES = 200_000
+
+# ==============================
+# DEVICE DIRECTORY
+# ==============================
+
+class DeviceDirectory:
+    """
+    Sorted key arrays -> vectorized searchsorted lookups per batch.
+    """
+
+    def __init__(self, device_id, imei, car_id):
+        device_id = np.asarray(device_id, dtype=np.int64)
+        car_id = np.asarray(car_id, dtype=np.int64)
+
+        order = np.argsort(device_id)
+        self.by_device = (device_id[order], car_id[order], device_id[order])
+
+        numeric = np.array([str(i).isdigit() for i in imei], dtype=bool)
+        imei_num = np.array([int(i) if ok else 0 for i, ok in zip(imei, numeric)], dtype=np.uint64)
+        order = np.argsort(imei_num[numeric])
+        self.by_imei = (imei_num[numeric][order], car_id[numeric][order], device_id[numeric][order])
+
+    @classmethod
+    def load(cls, conn) -> "DeviceDirectory":
+        rows = conn.execute(text(f"""
+            SELECT d.DEVICE_ID, d.DEVICE_IMEI, c.CAR_ID
+              FROM {sim.SCHEMA}.IOT_DEVICES d
+              JOIN {sim.SCHEMA}.CARS c ON c.DEVICE_ID = d.DEVICE_ID
+        """)).fetchall()
+        return cls([r[0] for r in rows], [r[1] or "" for r in rows], [r[2] for r in rows])
+
+    def __len__(self) -> int:
+        return len(self.by_device[0])
+
+    @staticmethod
+    def _lookup(table, keys: np.ndarray):
+        sorted_keys, car_id, device_id = table
+        pos = np.clip(np.searchsorted(sorted_keys, keys), 0, max(len(sorted_keys) - 1, 0))
+        if not len(sorted_keys):
+            return np.zeros(len(keys), bool), pos, car_id, device_id
+        return sorted_keys[pos] == keys, pos, car_id, device_id
+
+    def resolve(self, frames: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        -> (known mask, car_id, device_id) aligned with frames.
+        """
+        n = len(frames)
+        known = np.zeros(n, dtype=bool)
+        car = np.zeros(n, dtype=np.int64)
+        dev = np.zeros(n, dtype=np.int64)
+        by_imei = frames["key_kind"] == KEY_IMEI
+        for mask, table, keys in (
+            (~by_imei, self.by_device, frames["key"].astype(np.int64)),
+            (by_imei, self.by_imei, frames["key"]),
+        ):
+            idx = np.flatnonzero(mask)
+            if not len(idx):
+                continue
+            ok, pos, car_id, device_id = self._lookup(table, keys[idx])
+            known[idx] = ok
+            car[idx[ok]] = car_id[pos[ok]]
+            dev[idx[ok]] = device_id[pos[ok]]
+        return known, car, dev
+
+# ==============================
+# STATS
+# ==============================
+
+@dataclass
+class GatewayStats:
+    frames: int = 0
+    unknown: int = 0
+    dropped: int = 0
+    batches: int = 0
+    rows: int = 0
+    write_sec: float = 0.0
+    latency_ms: deque = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW_FRAMES))
+
+    def summary(self, elapsed: float, pending: int) -> str:
+        lat = np.fromiter(self.latency_ms, dtype=float)
+        pct = (" | latency p50/p95/p99 " + "/".join(f"{v:,.0f}" for v in np.percentile(lat, (50, 95, 99))) + " ms"
+               if len(lat) else "")
+        return (f"{self.frames / max(elapsed, 1e-9):,.0f} frames/s | rows {self.rows:,} in {self.batches:,} batches | "
+                f"pending {pending:,} | unknown {self.unknown:,} | dropped {self.dropped:,}{pct}")
+
+# ==============================
+# MICRO-BATCHER
+# ==============================
+
+class MicroBatcher:
+    """
+    Frames from all connections are appended here; run() flushes one batch
+    at a time (size or age trigger) while the event loop keeps receiving.
+    """
+
+    def __init__(self, write, stats: GatewayStats):
+        self.write = write  # blocking write(frames, received_us) -> rows, runs in a thread
+        self.stats = stats
+        self.parts: list[tuple[np.ndarray, np.ndarray]] = []
+        self.rows = 0
+        self.first_at = 0.0
+        self.room = asyncio.Event()
+        self.room.set()
+        self.wakeup = asyncio.Event()
+
+    def add(self, frames: np.ndarray, received_us: int) -> bool:
+        if not len(frames):
+            return True
+        if self.rows + len(frames) > MAX_PENDING_ROWS:
+            self.stats.dropped += len(frames)
+            return False
+        if not self.rows:
+            self.first_at = time.perf_counter()
+        self.parts.append((frames, np.full(len(frames), received_us, dtype=np.int64)))
+        self.rows += len(frames)
+        self.stats.frames += len(frames)
+        if self.rows >= BATCH_MAX_ROWS:
+            self.wakeup.set()
+        if self.rows >= MAX_PENDING_ROWS // 2:
+            self.room.clear()
+        return True
+
+    def take(self) -> tuple[np.ndarray, np.ndarray]:
+        frames = np.concatenate([f for f, _ in self.parts])
+        received = np.concatenate([r for _, r in self.parts])
+        self.parts, self.rows = [], 0
+        self.room.set()
+        return frames, received
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), BATCH_MAX_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            age_ms = (time.perf_counter() - self.first_at) * 1000
+            if self.rows >= BATCH_MAX_ROWS or (self.rows and age_ms >= BATCH_MAX_MS):
+                frames, received = self.take()
+                await asyncio.to_thread(self.write, frames, received)
+
+# ==============================
+# LISTENERS
+# ==============================
+
+class UdpFrames(asyncio.DatagramProtocol):
+    def __init__(self, batcher: MicroBatcher):
+        self.batcher = batcher
+
+    def connection_made(self, transport):
+        sock = transport.get_extra_info("socket")
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RCVBUF_BYTES)
+        except OSError:
+            pass
+
+    def datagram_received(self, data, addr):
+        frames, _ = decode_frames(data)
+        self.batcher.add(frames.copy(), now_us())
+
+def tcp_handler(batcher: MicroBatcher):
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        buf = b""
+        try:
+            while True:
+                data = await reader.read(256 * FRAME_SIZE)
+                if not data:
+                    break
+                buf += data
+                frames, used = decode_frames(buf)
+                if used:
+                    batcher.add(frames.copy(), now_us())
+                    buf = buf[used:]
+                await batcher.room.wait()  # backpressure: stop reading while the DB is behind
+        finally:
+            writer.close()
+    return handle
+
+# ==============================
+# GATEWAY
+# ==============================
+
+class Gateway:
+    def __init__(self, directory: DeviceDirectory):
+        self.directory = directory
+        self.stats = GatewayStats()
+        self.rt_writer = TelemetryWriter("RT_IOT_FEED", RT_FEED_COLUMNS, schema=sim.SCHEMA,
+                                         batch_rows=BATCH_MAX_ROWS)
+        self.last_state = LastStateWriter(schema=sim.SCHEMA) if WRITE_LAST_STATE else None
+
+    def write(self, frames: np.ndarray, received_us: np.ndarray) -> int:
+        """
+        Worker thread: resolve, one array insert (+ MERGE), commit, latency.
+        """
+        t0 = time.perf_counter()
+        known, car_id, device_id = self.directory.resolve(frames)
+        self.stats.unknown += int((~known).sum())
+        if not known.all():
+            frames, received_us = frames[known], received_us[known]
+            car_id, device_id = car_id[known], device_id[known]
+        n = len(frames)
+        if n == 0:
+            return 0
+
+        batch = frames_to_batch(frames, car_id, device_id, received_us, datetime.now())
+        with sim.engine.begin() as conn:
+            self.rt_writer.write(conn, batch, n)
+            if self.last_state is not None:
+                self.last_state.write(conn, batch, n)
+
+        lat_ms = (now_us() - frames["sent_us"]) / 1000.0
+        self.stats.latency_ms.extend(lat_ms.tolist())
+        self.stats.batches += 1
+        self.stats.rows += n
+        self.stats.write_sec += time.perf_counter() - t0
+        return n
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        batcher = MicroBatcher(self.write, self.stats)
+        servers = []
+
+        if UDP_PORT is not None:
+            transport, _ = await loop.create_datagram_endpoint(lambda: UdpFrames(batcher), local_addr=(HOST, UDP_PORT))
+            servers.append(transport)
+            print(f"📥 UDP {HOST}:{UDP_PORT}")
+        if TCP_PORT is not None:
+            server = await asyncio.start_server(tcp_handler(batcher), HOST, TCP_PORT)
+            servers.append(server)
+            print(f"📥 TCP {HOST}:{TCP_PORT}")
+
+        flusher = asyncio.create_task(batcher.run())
+        t_start = time.perf_counter()
+        try:
+            while True:
+                await asyncio.sleep(REPORT_EVERY_SEC)
+                if flusher.done():
+                    flusher.result()  # re-raise DB errors
+                print(f"📊 {self.stats.summary(time.perf_counter() - t_start, batcher.rows)}")
+        finally:
+            flusher.cancel()
+            for s in servers:
+                s.close()
+            self.rt_writer.close()
+            if self.last_state is not None:
+                self.last_state.close()
+
+# ==============================
+# MAIN
+# ==============================
+
+def main():
+    print("🛰️ IoT GATEWAY STARTED")
+    print(f"⚙️ frame={FRAME_SIZE}B | batch<= {BATCH_MAX_ROWS:,} rows or {BATCH_MAX_MS}ms | last_state={WRITE_LAST_STATE}")
+
+    with sim.engine.begin() as conn:
+        sim.alter_schema(conn)
+        sim.ensure_rt_table_exists(conn)
+        if WRITE_LAST_STATE:
+            sim.ensure_last_state_table_exists(conn)
+        directory = DeviceDirectory.load(conn)
+    print(f"📟 {len(directory):,} devices mapped to cars")
+
+    try:
+        asyncio.run(Gateway(directory).serve())
+    except KeyboardInterrupt:
+        print("🛑 Gateway stopped")
+
+if __name__ == "__main__":
+    main()
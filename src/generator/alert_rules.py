@@ -0,0 +1,219 @@
+# ============================================================
+# alert_rules.py
+# ============================================================
+# Declarative alert rules, compiled once into vectorized
+# predicates over the tick's columnar batch
+#
+# Rule spec (one entry of ALERT_RULES):
+#   {"severity": "HIGH",
+#    "when": ("SPEED_KMH", ">=", 120),      # condition, see below
+#    "for_ticks": 3,                         # optional duration
+#    "title": "...", "desc": "Speed {SPEED_KMH:.0f} km/h ..."}
+#
+# desc placeholders may name any column of the batch (not only
+# the ones in "when"); unknown ones fail in compile_rules.
+#
+# Conditions:
+#   (column, op, value)        op: > >= < <= == !=
+#   {"all": [cond, ...]}       AND
+#   {"any": [cond, ...]}       OR
+#   {"not": cond}
+#
+# Duration rules keep a per-car streak counter; cooldown is a
+# [rule, car] matrix of last alert timestamps (vectorized check).
+# evaluate(..., commit=False) leaves both untouched until commit(),
+# so a tick whose DB write fails does not start a cooldown.
+# ============================================================
+
+from __future__ import annotations
+
+import string
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+OPS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+# ==============================
+# COMPILER
+# ==============================
+
+Predicate = Callable[[dict], np.ndarray]
+
+def compile_condition(spec) -> tuple[Predicate, tuple[str, ...]]:
+    """
+    Condition spec -> (predicate(cols) -> bool mask, referenced columns).
+    """
+    if isinstance(spec, tuple) and len(spec) == 3:
+        col, op, value = spec
+        if op not in OPS:
+            raise ValueError(f"Unknown operator {op!r} in alert rule")
+        fn = OPS[op]
+        return (lambda cols: fn(cols[col], value)), (col,)
+
+    if isinstance(spec, dict) and len(spec) == 1:
+        (kind, arg), = spec.items()
+        if kind == "not":
+            inner, columns = compile_condition(arg)
+            return (lambda cols: ~inner(cols)), columns
+        if kind in ("all", "any"):
+            parts = [compile_condition(s) for s in arg]
+            preds = [p for p, _ in parts]
+            columns = tuple(dict.fromkeys(c for _, cs in parts for c in cs))
+            combine = np.logical_and.reduce if kind == "all" else np.logical_or.reduce
+            return (lambda cols: combine([p(cols) for p in preds])), columns
+
+    raise ValueError(f"Invalid alert condition: {spec!r}")
+
+@dataclass
+class CompiledRule:
+    name: str
+    severity: str
+    title: str
+    desc: str
+    columns: tuple[str, ...]
+    predicate: Predicate
+    for_ticks: int = 1
+    fields: tuple[str, ...] = ()  # columns named in desc
+
+    def describe(self, cols: dict, i: int) -> str:
+        return self.desc.format(**{c: _row_value(cols[c], i) for c in self.fields})
+
+def _row_value(values, i: int):
+    return values[i] if isinstance(values, np.ndarray) else values  # scalars are per tick
+
+def desc_fields(desc: str) -> tuple[str, ...]:
+    """
+    Column names of the {placeholders} in a desc template.
+    """
+    fields = []
+    for _, field, _, _ in string.Formatter().parse(desc):
+        if field is None:
+            continue
+        if not field.isidentifier():
+            raise ValueError(f"Alert desc placeholders must be column names, got {{{field}}} in {desc!r}")
+        fields.append(field)
+    return tuple(dict.fromkeys(fields))
+
+def compile_rules(rules: dict, columns: Optional[Iterable[str]] = None) -> list[CompiledRule]:
+    """
+    columns: names available in the batch; when given, conditions and desc
+    placeholders are checked against them here instead of failing in a tick.
+    """
+    known = None if columns is None else set(columns)
+    out = []
+    for name, r in rules.items():
+        predicate, used = compile_condition(r["when"])
+        desc = r.get("desc", name)
+        fields = desc_fields(desc)
+        if known is not None:
+            missing = [c for c in used + fields if c not in known]
+            if missing:
+                raise ValueError(f"Alert rule {name!r} uses unknown column(s): {', '.join(missing)}")
+        out.append(CompiledRule(
+            name=name,
+            severity=r["severity"],
+            title=r.get("title", name),
+            desc=desc,
+            columns=used,
+            predicate=predicate,
+            for_ticks=int(r.get("for_ticks", 1)),
+            fields=fields,
+        ))
+    return out
+
+# ==============================
+# ENGINE
+# ==============================
+
+_NAT = np.datetime64("NaT", "us")
+
+class AlertRuleEngine:
+    """
+    evaluate(cols, ts) -> [(rule, fleet positions)] after duration + cooldown.
+
+    State is aligned with the fleet arrays (bind_fleet): streak[rule, car]
+    and last_alert[rule, car]. warm() can be called before bind_fleet().
+
+    commit=False: the new state is kept aside and only applied by commit()
+    (after the alerts are in the database); the next evaluate() drops it.
+    """
+
+    def __init__(self, rules: dict, cooldown_sec: int, columns: Optional[Iterable[str]] = None):
+        self.rules = compile_rules(rules, columns)
+        self.cooldown = np.timedelta64(timedelta(seconds=cooldown_sec), "us")
+        self._warm: dict[tuple[int, str], datetime] = {}
+        self.car_ids = np.zeros(0, dtype=np.int64)
+        self.streak = np.zeros((len(self.rules), 0), dtype=np.int32)
+        self.last_alert = np.full((len(self.rules), 0), _NAT)
+        self._pending = None  # (ts, {rule: new streak}, [(rule, fired rows)])
+
+    def warm(self, last: dict[tuple[int, str], datetime]):
+        """
+        last alert ts per (car_id, alert_type), e.g. from IOT_ALERTS.
+        """
+        self._warm = dict(last)
+        if len(self.car_ids):
+            self.bind_fleet(self.car_ids)
+
+    def bind_fleet(self, car_ids: np.ndarray):
+        self.car_ids = np.asarray(car_ids, dtype=np.int64)
+        n = len(self.car_ids)
+        self.streak = np.zeros((len(self.rules), n), dtype=np.int32)
+        self.last_alert = np.full((len(self.rules), n), _NAT)
+        self._pending = None
+
+        pos = {int(c): i for i, c in enumerate(self.car_ids)}
+        row = {r.name: k for k, r in enumerate(self.rules)}
+        for (cid, atype), ts in self._warm.items():
+            if cid in pos and atype in row:
+                self.last_alert[row[atype], pos[cid]] = np.datetime64(ts, "us")
+
+    def evaluate(self, cols: dict, event_ts: datetime,
+                 commit: bool = True) -> list[tuple[CompiledRule, np.ndarray]]:
+        ts = np.datetime64(event_ts, "us")
+        fired, streaks, hits = [], {}, []
+        for k, rule in enumerate(self.rules):
+            mask = rule.predicate(cols)
+
+            if rule.for_ticks > 1:
+                streaks[k] = np.where(mask, self.streak[k] + 1, 0)
+                mask = streaks[k] >= rule.for_ticks
+
+            last = self.last_alert[k]
+            mask &= np.isnat(last) | (last < ts - self.cooldown)
+
+            rows = np.flatnonzero(mask)
+            if len(rows):
+                fired.append((rule, rows))
+                hits.append((k, rows))
+
+        self._pending = (ts, streaks, hits)
+        if commit:
+            self.commit()
+        return fired
+
+    def commit(self):
+        """
+        Apply the state of the last evaluate() (streaks + cooldown start).
+        """
+        if self._pending is None:
+            return
+        ts, streaks, hits = self._pending
+        for k, streak in streaks.items():
+            self.streak[k] = streak
+        for k, rows in hits:
+            self.last_alert[k, rows] = ts
+        self._pending = None
+
+    def discard(self):
+        self._pending = None
@@ -0,0 +1,339 @@
+# ============================================================
+# city_assets.py
+# ============================================================
+# Precomputed city boundaries for the fleet model
+#
+# BUILD (python city_assets.py):
+# - reads the Nominatim results cached in cache/*.json
+#   (GeoJSON boundary polygons, thousands of vertices)
+# - per city: Douglas-Peucker simplified rings, bounding box,
+#   inside/outside grid mask (scanline, even-odd rule)
+# - writes everything to one small binary file (CITY_ASSETS_PATH)
+#
+# RUNTIME:
+# - load_city_assets() -> CityAssets in milliseconds
+# - CityAssets.grid(city_names) -> CityGrid aligned with the fleet
+#   city codes: inside(codes, lat, lng) is one vectorized mask
+#   lookup per car (no point-in-polygon per tick)
+#
+# File: MAGIC + uint32 header length + JSON header, then the
+# float32 ring vertices (lat, lng) and the bit-packed masks.
+# ============================================================
+
+from __future__ import annotations
+
+import json
+import struct
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+# ==============================
+# CONFIG
+# ==============================
+
+CACHE_DIR = "cache"
+CITY_ASSETS_PATH = "city_assets.bin"
+
+SIMPLIFY_TOL_DEG = 0.0005  # ~50 m
+GRID_CELLS = 512           # cells along the longest bbox side (~50-70 m cells)
+
+# Nominatim name -> fleet CITY value (CARS / BRANCHES)
+CITY_ALIASES = {
+    "MARRAKESH": "MARRAKECH",
+    "TANGIER": "TANGER",
+}
+
+MAGIC = b"CITYGEO1"
+_HEADER_LEN = struct.Struct("<I")
+
+# ==============================
+# GEOMETRY
+# ==============================
+
+def geojson_rings(geojson: dict) -> list[np.ndarray]:
+    """
+    Polygon / MultiPolygon -> list of closed rings as (lat, lng) arrays
+    (outer rings and holes alike: the even-odd rule sorts them out).
+    """
+    kind, coords = geojson["type"], geojson["coordinates"]
+    polygons = [coords] if kind == "Polygon" else coords if kind == "MultiPolygon" else []
+    rings = []
+    for poly in polygons:
+        for ring in poly:
+            pts = np.asarray(ring, dtype=np.float64)[:, ::-1]  # GeoJSON is (lng, lat)
+            if len(pts) >= 4:
+                rings.append(pts)
+    return rings
+
+def simplify_ring(pts: np.ndarray, tol: float) -> np.ndarray:
+    """
+    Douglas-Peucker on a closed ring (planar degrees). Rings that would
+    collapse below a triangle are returned unchanged.
+    """
+    n = len(pts)
+    if n <= 4:
+        return pts
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        a, b = pts[i], pts[j]
+        seg = pts[i + 1:j]
+        ab = b - a
+        norm = np.hypot(*ab)
+        if norm == 0.0:  # closed ring: first split is around the start point
+            d = np.hypot(*(seg - a).T)
+        else:
+            d = np.abs(ab[0] * (seg[:, 1] - a[1]) - ab[1] * (seg[:, 0] - a[0])) / norm
+        k = int(np.argmax(d))
+        if d[k] > tol:
+            keep[i + 1 + k] = True
+            stack += [(i, i + 1 + k), (i + 1 + k, j)]
+    out = pts[keep]
+    return out if len(out) >= 4 else pts
+
+def rasterize(rings: list[np.ndarray], bbox: tuple, shape: tuple[int, int]) -> np.ndarray:
+    """
+    Inside/outside mask of cell centers, one scanline per grid row:
+    crossings of all edges sorted, inside = odd number of crossings to the left.
+    """
+    lat_min, lat_max, lng_min, lng_max = bbox
+    h, w = shape
+    ys = lat_min + (np.arange(h) + 0.5) * (lat_max - lat_min) / h
+    xs = lng_min + (np.arange(w) + 0.5) * (lng_max - lng_min) / w
+
+    edges = np.concatenate([np.column_stack([r[:-1], r[1:]]) for r in rings])
+    y0, x0, y1, x1 = edges.T
+
+    mask = np.zeros((h, w), dtype=bool)
+    for row, y in enumerate(ys):
+        cross = (y0 <= y) != (y1 <= y)
+        xi = np.sort(x0[cross] + (y - y0[cross]) * (x1[cross] - x0[cross]) / (y1[cross] - y0[cross]))
+        mask[row] = np.searchsorted(xi, xs) % 2 == 1
+    return mask
+
+# ==============================
+# ASSETS
+# ==============================
+
+@dataclass
+class CityGeo:
+    name: str
+    center: tuple[float, float]  # Nominatim (lat, lng)
+    bbox: tuple[float, float, float, float]  # lat_min, lat_max, lng_min, lng_max
+    rings: list[np.ndarray]      # simplified (lat, lng) rings
+    mask: np.ndarray             # bool [rows, cols], row 0 = lat_min
+
+    @property
+    def cell(self) -> tuple[float, float]:
+        h, w = self.mask.shape
+        return (self.bbox[1] - self.bbox[0]) / h, (self.bbox[3] - self.bbox[2]) / w
+
+class CityAssets:
+    def __init__(self, cities: dict[str, CityGeo]):
+        self.cities = cities
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.cities
+
+    def grid(self, city_names) -> "CityGrid":
+        return CityGrid([self.cities.get(str(c).upper()) for c in city_names])
+
+    # ---------- file ----------
+
+    def save(self, path: str | Path) -> int:
+        header, vertices, masks = {"cities": []}, [], []
+        v_off, m_off = 0, 0
+        for geo in self.cities.values():
+            rings = []
+            for r in geo.rings:
+                rings.append([v_off, len(r)])
+                vertices.append(r.astype(np.float32))
+                v_off += len(r)
+            packed = np.packbits(geo.mask, axis=None)
+            masks.append(packed)
+            header["cities"].append({
+                "name": geo.name, "center": list(geo.center), "bbox": list(geo.bbox),
+                "shape": list(geo.mask.shape), "rings": rings,
+                "mask": [m_off, len(packed)],
+            })
+            m_off += len(packed)
+        header["n_vertices"] = v_off
+
+        head = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        body = (np.concatenate(vertices) if vertices else np.zeros((0, 2), np.float32)).tobytes()
+        path = Path(path)
+        with open(path, "wb") as fh:
+            fh.write(MAGIC)
+            fh.write(_HEADER_LEN.pack(len(head)))
+            fh.write(head)
+            fh.write(body)
+            fh.write(b"".join(m.tobytes() for m in masks))
+        return path.stat().st_size
+
+    @classmethod
+    def load(cls, path: str | Path) -> "CityAssets":
+        data = Path(path).read_bytes()
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a city assets file: {path}")
+        pos = len(MAGIC)
+        (head_len,) = _HEADER_LEN.unpack_from(data, pos)
+        pos += _HEADER_LEN.size
+        header = json.loads(data[pos:pos + head_len])
+        pos += head_len
+
+        n_vert = header["n_vertices"]
+        vertices = np.frombuffer(data, dtype=np.float32, count=n_vert * 2, offset=pos).reshape(-1, 2)
+        pos += vertices.nbytes
+
+        cities = {}
+        for c in header["cities"]:
+            h, w = c["shape"]
+            m_off, m_len = c["mask"]
+            packed = np.frombuffer(data, dtype=np.uint8, count=m_len, offset=pos + m_off)
+            cities[c["name"]] = CityGeo(
+                name=c["name"],
+                center=tuple(c["center"]),
+                bbox=tuple(c["bbox"]),
+                rings=[vertices[o:o + k].astype(np.float64) for o, k in c["rings"]],
+                mask=np.unpackbits(packed, count=h * w).reshape(h, w).astype(bool),
+            )
+        return cls(cities)
+
+class CityGrid:
+    """
+    Masks of the fleet's cities stacked into one [city_code, row, col]
+    array. Cities without assets are unconstrained (always inside).
+    """
+
+    def __init__(self, geos: list[Optional[CityGeo]]):
+        k = len(geos)
+        shapes = [g.mask.shape if g else (1, 1) for g in geos]
+        hmax = max((s[0] for s in shapes), default=1)
+        wmax = max((s[1] for s in shapes), default=1)
+
+        self.known = np.array([g is not None for g in geos], dtype=bool)
+        self.masks = np.zeros((k, hmax, wmax), dtype=bool)
+        self.lat0 = np.zeros(k)
+        self.lng0 = np.zeros(k)
+        self.dlat = np.ones(k)
+        self.dlng = np.ones(k)
+        self.rows = np.array([s[0] for s in shapes], dtype=np.int64)
+        self.cols = np.array([s[1] for s in shapes], dtype=np.int64)
+        self.cells = []  # flat indices of inside cells, per city (for sampling)
+
+        for i, g in enumerate(geos):
+            if g is None:
+                self.cells.append(np.zeros(0, dtype=np.int64))
+                continue
+            h, w = g.mask.shape
+            self.masks[i, :h, :w] = g.mask
+            self.lat0[i], self.lng0[i] = g.bbox[0], g.bbox[2]
+            self.dlat[i], self.dlng[i] = g.cell
+            self.cells.append(np.flatnonzero(g.mask))
+
+    def inside(self, codes: np.ndarray, lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+        row = np.floor((lat - self.lat0[codes]) / self.dlat[codes]).astype(np.int64)
+        col = np.floor((lng - self.lng0[codes]) / self.dlng[codes]).astype(np.int64)
+        ok = (row >= 0) & (row < self.rows[codes]) & (col >= 0) & (col < self.cols[codes])
+        out = ~self.known[codes]
+        idx = np.flatnonzero(ok & self.known[codes])
+        out[idx] = self.masks[codes[idx], row[idx], col[idx]]
+        return out
+
+    def sample(self, codes: np.ndarray, u_cell: np.ndarray, u_lat: np.ndarray, u_lng: np.ndarray):
+        """
+        Uniform point inside each car's city (uniforms in [0, 1)), NaN where the city is unknown.
+        """
+        lat = np.full(len(codes), np.nan)
+        lng = np.full(len(codes), np.nan)
+        for c in np.unique(codes):
+            cells = self.cells[c]
+            if not len(cells):
+                continue
+            sel = np.flatnonzero(codes == c)
+            cell = cells[(u_cell[sel] * len(cells)).astype(np.int64)]
+            row, col = np.divmod(cell, self.cols[c])
+            lat[sel] = self.lat0[c] + (row + u_lat[sel]) * self.dlat[c]
+            lng[sel] = self.lng0[c] + (col + u_lng[sel]) * self.dlng[c]
+        return lat, lng
+
+def load_city_assets(path: Optional[str] = CITY_ASSETS_PATH) -> Optional[CityAssets]:
+    """
+    None when the file was not built (callers fall back to the point drift).
+    """
+    if not path or not Path(path).exists():
+        return None
+    return CityAssets.load(path)
+
+# ==============================
+# BUILD
+# ==============================
+
+def pick_boundary(results: list[dict]) -> Optional[dict]:
+    """
+    One cached Nominatim answer can hold several places (city, prefecture...):
+    keep the first city-level polygon, administrative boundaries first.
+    """
+    polys = [r for r in results
+             if isinstance(r.get("geojson"), dict) and r["geojson"].get("type") in ("Polygon", "MultiPolygon")]
+    cities = [r for r in polys if r.get("addresstype") == "city"] or polys
+    cities.sort(key=lambda r: r.get("class") != "boundary")
+    return cities[0] if cities else None
+
+def compile_city(result: dict) -> CityGeo:
+    raw = geojson_rings(result["geojson"])
+    name = str(result["name"]).upper()
+    name = CITY_ALIASES.get(name, name)
+
+    lat_min, lat_max, lng_min, lng_max = (float(v) for v in result["boundingbox"])
+    span = max(lat_max - lat_min, lng_max - lng_min)
+    shape = (max(1, round(GRID_CELLS * (lat_max - lat_min) / span)),
+             max(1, round(GRID_CELLS * (lng_max - lng_min) / span)))
+    bbox = (lat_min, lat_max, lng_min, lng_max)
+
+    return CityGeo(
+        name=name,
+        center=(float(result["lat"]), float(result["lon"])),
+        bbox=bbox,
+        rings=[simplify_ring(r, SIMPLIFY_TOL_DEG) for r in raw],
+        mask=rasterize(raw, bbox, shape),  # exact boundaries, once, at build time
+    )
+
+def build(cache_dir: str = CACHE_DIR) -> CityAssets:
+    cities = {}
+    for path in sorted(Path(cache_dir).glob("*.json")):
+        result = pick_boundary(json.loads(path.read_text(encoding="utf-8")))
+        if result is None:
+            continue
+        geo = compile_city(result)
+        cities.setdefault(geo.name, geo)
+    return CityAssets(cities)
+
+def main():
+    print(f"🗺️ Compiling city assets from {CACHE_DIR}/*.json")
+    t0 = time.perf_counter()
+    assets = build(CACHE_DIR)
+    if not assets.cities:
+        raise RuntimeError(f"No city boundary found in {CACHE_DIR}")
+
+    size = assets.save(CITY_ASSETS_PATH)
+    for geo in assets.cities.values():
+        h, w = geo.mask.shape
+        print(f"   {geo.name:<12} {sum(len(r) for r in geo.rings):>5} vertices | "
+              f"grid {h}x{w} | {geo.mask.mean():.0%} inside")
+
+    t1 = time.perf_counter()
+    CityAssets.load(CITY_ASSETS_PATH)
+    print(f"✅ {CITY_ASSETS_PATH}: {len(assets.cities)} cities, {size / 1024:,.0f} KB "
+          f"(build {t1 - t0:.2f}s, load {(time.perf_counter() - t1) * 1000:.1f}ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# ============================================================
+# device_protocol.py
+# ============================================================
+# Binary telemetry frames between simulated devices and the
+# ingestion gateway (04_iot_gateway.py)
+#
+# - one fixed-size little-endian frame per reading (FRAME_SIZE)
+# - keyed by DEVICE_ID or by numeric DEVICE_IMEI (key_kind)
+# - sent_us = device clock at send time -> device-to-row latency
+# - UDP: many frames per datagram | TCP: frames back to back
+#
+# Frames are encoded / decoded as NumPy structured arrays
+# (same bytes as FRAME_STRUCT), no per-frame Python work.
+# ============================================================
+
+from __future__ import annotations
+
+import socket
+import struct
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from fleet_engine import EVENT_TYPES
+
+PROTOCOL_VERSION = 1
+
+KEY_DEVICE_ID = 0
+KEY_IMEI = 1
+
+# version, key_kind, event_code, pad, seq, key, sent_us, event_us,
+# lat, lng, odometer_km, speed, accel, brake, fuel, battery, temp
+FRAME_STRUCT = struct.Struct("<BBBxIQqqdddffffff")
+FRAME_DTYPE = np.dtype([
+    ("version", "<u1"),
+    ("key_kind", "<u1"),
+    ("event_code", "<u1"),
+    ("_pad", "<u1"),
+    ("seq", "<u4"),
+    ("key", "<u8"),
+    ("sent_us", "<i8"),
+    ("event_us", "<i8"),
+    ("lat", "<f8"),
+    ("lng", "<f8"),
+    ("odometer_km", "<f8"),
+    ("speed_kmh", "<f4"),
+    ("accel_ms2", "<f4"),
+    ("brake_bar", "<f4"),
+    ("fuel_pct", "<f4"),
+    ("battery_v", "<f4"),
+    ("engine_temp_c", "<f4"),
+])
+FRAME_SIZE = FRAME_DTYPE.itemsize
+assert FRAME_SIZE == FRAME_STRUCT.size
+
+UDP_MAX_PAYLOAD = 65_507
+
+_EVENT_NAMES = np.array(EVENT_TYPES, dtype=object)
+
+def now_us() -> int:
+    return time.time_ns() // 1000
+
+# ==============================
+# ENCODE / DECODE
+# ==============================
+
+def encode_frames(cols: dict, n: int, seq0: int = 0, key_kind: int = KEY_DEVICE_ID) -> np.ndarray:
+    """
+    Columnar tick batch (RT_IOT_FEED names) -> structured frame array.
+    sent_us is left at 0: the emitter stamps it right before sending.
+    """
+    frames = np.zeros(n, dtype=FRAME_DTYPE)
+    frames["version"] = PROTOCOL_VERSION
+    frames["key_kind"] = key_kind
+    frames["seq"] = (seq0 + np.arange(n)) & 0xFFFFFFFF
+    frames["key"] = cols["DEVICE_ID"]
+    frames["event_us"] = np.asarray(cols["EVENT_TS"]).astype("datetime64[us]").astype(np.int64)
+    frames["lat"] = cols["LATITUDE"]
+    frames["lng"] = cols["LONGITUDE"]
+    frames["odometer_km"] = cols["ODOMETER_KM"]
+    frames["speed_kmh"] = cols["SPEED_KMH"]
+    frames["accel_ms2"] = cols["ACCELERATION_MS2"]
+    frames["brake_bar"] = cols["BRAKE_PRESSURE_BAR"]
+    frames["fuel_pct"] = cols["FUEL_LEVEL_PCT"]
+    frames["battery_v"] = cols["BATTERY_VOLTAGE"]
+    frames["engine_temp_c"] = cols["ENGINE_TEMP_C"]
+
+    events = cols["EVENT_TYPE"]
+    for code, name in enumerate(EVENT_TYPES):
+        frames["event_code"][events == name] = code
+    return frames
+
+def decode_frames(buf: bytes | memoryview) -> tuple[np.ndarray, int]:
+    """
+    -> (frames, bytes consumed); a trailing partial frame is left for the next read.
+    """
+    n = len(buf) // FRAME_SIZE
+    frames = np.frombuffer(buf, dtype=FRAME_DTYPE, count=n)
+    return frames, n * FRAME_SIZE
+
+def frames_to_batch(frames: np.ndarray, car_id: np.ndarray, device_id: np.ndarray,
+                    received_us: np.ndarray, created_at) -> dict:
+    """
+    Decoded frames (already resolved to cars) -> RT_IOT_FEED columnar batch.
+    """
+    event_ts = frames["event_us"].astype("datetime64[us]")
+    return {
+        "DEVICE_ID": device_id,
+        "CAR_ID": car_id,
+        "RENTAL_ID": None,  # devices don't know rentals
+        "EVENT_TS": event_ts,
+        "LATITUDE": frames["lat"],
+        "LONGITUDE": frames["lng"],
+        "SPEED_KMH": frames["speed_kmh"].astype(np.float64),
+        "ACCELERATION_MS2": frames["accel_ms2"].astype(np.float64),
+        "BRAKE_PRESSURE_BAR": frames["brake_bar"].astype(np.float64),
+        "FUEL_LEVEL_PCT": frames["fuel_pct"].astype(np.float64),
+        "BATTERY_VOLTAGE": frames["battery_v"].astype(np.float64),
+        "ENGINE_TEMP_C": frames["engine_temp_c"].astype(np.float64),
+        "ODOMETER_KM": frames["odometer_km"],
+        "EVENT_TYPE": _EVENT_NAMES[np.minimum(frames["event_code"], len(EVENT_TYPES) - 1)],
+        "CREATED_AT": created_at,
+        "RECEIVED_AT": received_us.astype("datetime64[us]"),
+    }
+
+# ==============================
+# EMITTER (simulated devices)
+# ==============================
+
+@dataclass
+class EmitterStats:
+    frames: int = 0
+    bytes: int = 0
+    sends: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        rate = self.frames / self.seconds if self.seconds > 0 else 0.0
+        return f"emitted {self.frames:,} frames in {self.sends:,} sends ({rate:,.0f} frames/s)"
+
+class FrameEmitter:
+    """
+    Sends each tick batch to the gateway: UDP datagrams of up to
+    frames_per_datagram frames, or one TCP stream write.
+    """
+
+    def __init__(self, transport: str, host: str, port: int, frames_per_datagram: int = 512):
+        if transport not in ("udp", "tcp"):
+            raise ValueError(f"Unknown transport: {transport}")
+        self.transport = transport
+        self.addr = (host, port)
+        self.per_datagram = max(1, min(frames_per_datagram, UDP_MAX_PAYLOAD // FRAME_SIZE))
+        self.seq = 0
+        self.stats = EmitterStats()
+
+        if transport == "udp":
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        else:
+            self.sock = socket.create_connection(self.addr)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def send(self, cols: dict, n: int) -> int:
+        if n == 0:
+            return 0
+        t0 = time.perf_counter()
+        frames = encode_frames(cols, n, self.seq)
+        self.seq += n
+
+        if self.transport == "tcp":
+            frames["sent_us"] = now_us()
+            self.sock.sendall(frames.tobytes())
+            self.stats.sends += 1
+        else:
+            for i in range(0, n, self.per_datagram):
+                chunk = frames[i:i + self.per_datagram]
+                chunk["sent_us"] = now_us()
+                self.sock.sendto(chunk.tobytes(), self.addr)
+                self.stats.sends += 1
+
+        self.stats.frames += n
+        self.stats.bytes += n * FRAME_SIZE
+        self.stats.seconds += time.perf_counter() - t0
+        return n
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
@@ -0,0 +1,422 @@
+# ============================================================
+# fleet_engine.py
+# ============================================================
+# Vectorized fleet model for the live IoT simulator
+#
+# - Struct-of-arrays state: one NumPy array per car field
+# - The whole fleet is advanced per tick with vectorized RNG
+#   draws (no per-car Python loop)
+# - CarStreams: one counter-based random stream per car, keyed
+#   by (seed, car_id), so a car's telemetry does not depend on
+#   which other cars share its process
+# - Same driving model as the original per-car tick:
+#   engine start/stop, DRIVING/IDLE/STOPPED, drift to city
+#   center, haversine odometer, fuel burn, engine temp
+# - With city assets (city_assets.py): cars start anywhere inside
+#   their city boundary and moves that would leave it bounce back
+#   (grid mask lookup, replaces the drift for those cities)
+#
+# advance() returns a columnar batch (dict of arrays) whose
+# keys are the RT_IOT_FEED column names.
+# ============================================================
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# ==============================
+# CONFIG (car model)
+# ==============================
+
+# basic driving activity probabilities (per car per tick of MODEL_TICK_SEC)
+MODEL_TICK_SEC = 15
+P_START_ENGINE_IF_OFF = 0.03
+P_STOP_ENGINE_IF_ON = 0.02
+P_GO_IDLE_IF_ON = 0.10
+P_GO_DRIVING_IF_ON = 0.70
+# remaining = STOPPED
+
+# speed profiles by category
+CATEGORY_SPEED_PROFILE = {
+    "ECONOMY":  {"city": (18, 55), "mixed": (25, 80), "highway": (75, 110)},
+    "SUV":      {"city": (18, 60), "mixed": (30, 90), "highway": (85, 130)},
+    "LUXURY":   {"city": (18, 60), "mixed": (35, 105), "highway": (95, 145)},
+    "VAN":      {"city": (15, 50), "mixed": (25, 80), "highway": (75, 120)},
+    "ELECTRIC": {"city": (18, 55), "mixed": (25, 80), "highway": (75, 120)},
+}
+CATEGORY_FUEL_CONS = {"ECONOMY": 6.2, "SUV": 8.7, "LUXURY": 9.8, "VAN": 9.3, "ELECTRIC": 0.0}
+CATEGORY_TANK_SIZE = {"ECONOMY": 45,  "SUV": 60,  "LUXURY": 65,  "VAN": 75,  "ELECTRIC": 0}
+
+CITY_COORDS = {
+    "CASABLANCA": (33.5731, -7.5898),
+    "RABAT":      (34.0209, -6.8416),
+    "MARRAKECH":  (31.6295, -7.9811),
+    "TANGER":     (35.7595, -5.8340),
+    "AGADIR":     (30.4278, -9.5981),
+}
+
+TRIP_TYPES = ("city", "mixed", "highway")
+TRIP_TYPE_CUM_P = (0.55, 0.85)  # city < 0.55 <= mixed < 0.85 <= highway
+
+MAX_SPEED_KMH = 160.0
+CITY_DRIFT = 0.02
+INIT_SPREAD_DEG = 0.02
+
+# event type codes (index into EVENT_TYPES)
+EVENT_TYPES = ("ENGINE_START", "ENGINE_STOP", "STOPPED", "DRIVING", "IDLE")
+EV_ENGINE_START, EV_ENGINE_STOP, EV_STOPPED, EV_DRIVING, EV_IDLE = range(len(EVENT_TYPES))
+_EVENT_TYPE_NAMES = np.array(EVENT_TYPES, dtype=object)
+
+# ==============================
+# VECTORIZED HELPERS
+# ==============================
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    R = 6371.0
+    lat1r = np.radians(lat1)
+    lat2r = np.radians(lat2)
+    dlat = lat2r - lat1r
+    dlon = np.radians(np.asarray(lon2) - np.asarray(lon1))
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1r) * np.cos(lat2r) * np.sin(dlon / 2) ** 2
+    return 2 * R * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+# ==============================
+# PER-CAR RANDOM STREAMS
+# ==============================
+
+_GOLDEN = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """
+    SplitMix64 finalizer (bijective 64-bit mix), element-wise, wrapping uint64.
+    """
+    x = x.astype(np.uint64, copy=True)
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return x
+
+class CarStreams:
+    """
+    Counter-based generator: draw number j of car c is mix(key_c + j * golden),
+    with key_c derived from (seed, car_id) through SeedSequence + SplitMix64.
+
+    Drop-in for the np.random.Generator calls the fleet uses (random, uniform),
+    but every call must draw for the whole fleet (size == number of cars) so
+    all cars advance their counter together; select the subset afterwards.
+    """
+
+    def __init__(self, seed: int, car_ids):
+        base = np.random.SeedSequence(seed).generate_state(1, dtype=np.uint64)[0]
+        ids = np.asarray(car_ids, dtype=np.int64).astype(np.uint64)
+        self.keys = _splitmix64(_splitmix64(ids ^ base))
+        self.counter = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def random(self, size: int | None = None) -> np.ndarray:
+        n = len(self.keys)
+        if size is not None and size != n:
+            raise ValueError(f"CarStreams draws one value per car ({n}), got size={size}")
+        self.counter += 1
+        bits = _splitmix64(self.keys + np.uint64((self.counter * _GOLDEN) & _MASK64))
+        return (bits >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+    def uniform(self, low: float = 0.0, high: float = 1.0, size: int | None = None) -> np.ndarray:
+        return low + (high - low) * self.random(size)
+
+def transition_probs(dt_s: float) -> tuple[float, float]:
+    """
+    Engine start/stop probabilities for a tick of dt_s seconds, so trips keep
+    the same average duration whatever the tick size (backfills use long ticks).
+    """
+    if dt_s == MODEL_TICK_SEC:
+        return P_START_ENGINE_IF_OFF, P_STOP_ENGINE_IF_ON
+    k = dt_s / MODEL_TICK_SEC
+    return 1.0 - (1.0 - P_START_ENGINE_IF_OFF) ** k, 1.0 - (1.0 - P_STOP_ENGINE_IF_ON) ** k
+
+def pick_trip_type(rng: np.random.Generator, n: int) -> np.ndarray:
+    return np.searchsorted(TRIP_TYPE_CUM_P, rng.random(n), side="right").astype(np.int8)
+
+def brake_pressure_bar(acc_ms2: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    u = rng.random(len(acc_ms2))
+    return np.where(acc_ms2 < -2.5, 35 + 45 * u,
+           np.where(acc_ms2 < -1.0, 10 + 25 * u, 4 * u))
+
+def simulate_battery_voltage(engine_on: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    u = rng.random(len(engine_on))
+    return np.where(engine_on, 13.5 + 0.9 * u, 12.2 + 0.7 * u)
+
+def simulate_engine_temp(prev: np.ndarray, speed_kmh: np.ndarray, engine_on: np.ndarray,
+                         rng: np.random.Generator) -> np.ndarray:
+    """
+    prev = NaN means "no previous reading" (25°C when off, 45°C when on).
+    """
+    n = len(prev)
+    u_cool = rng.uniform(0.2, 0.6, n)
+    u_gain = rng.uniform(0.08, 0.12, n)
+    u_noise = rng.uniform(-0.8, 0.8, n)
+
+    cooled = np.where(np.isnan(prev), 25.0, np.maximum(25.0, prev - u_cool))
+
+    warm = np.where(np.isnan(prev), 45.0, prev)
+    target = np.where(speed_kmh > 30, 92.0, 75.0)
+    heated = warm + (target - warm) * u_gain + u_noise
+
+    return np.where(engine_on, heated, cooled)
+
+def update_fuel_pct(fuel_pct: np.ndarray, fuel_pct_per_km: np.ndarray,
+                    speed_kmh: np.ndarray, dt_s: float) -> np.ndarray:
+    dist_km = speed_kmh * dt_s / 3600.0
+    return np.maximum(0.0, fuel_pct - fuel_pct_per_km * dist_km)
+
+def fuel_pct_per_km(category: str) -> float:
+    cat = (category or "").upper()
+    cons = CATEGORY_FUEL_CONS.get(cat, 0.0)
+    tank = CATEGORY_TANK_SIZE.get(cat, 0)
+    if cons <= 0 or tank <= 0:
+        return 0.0
+    return (cons / 100.0) / tank * 100.0
+
+# ==============================
+# SYNTHETIC FLEET (benchmarks)
+# ==============================
+
+BRANCHES_PER_CITY = 3
+
+def synthetic_cars(n: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Same columns as load_cars(), spread over CITY_COORDS cities and
+    CATEGORY_SPEED_PROFILE categories, no database needed.
+    """
+    rng = np.random.default_rng(seed)
+    cities = np.array(list(CITY_COORDS), dtype=object)
+    categories = np.array(list(CATEGORY_SPEED_PROFILE), dtype=object)
+
+    city_idx = rng.integers(0, len(cities), n)
+    ids = np.arange(1, n + 1, dtype=np.int64)
+    return pd.DataFrame({
+        "CAR_ID": ids,
+        "BRANCH_ID": city_idx * BRANCHES_PER_CITY + rng.integers(0, BRANCHES_PER_CITY, n) + 1,
+        "CITY": cities[city_idx],
+        "DEVICE_ID": ids,
+        "ODOMETER_KM": np.round(rng.uniform(5_000, 120_000, n), 1),
+        "CATEGORY_NAME": categories[rng.integers(0, len(categories), n)],
+    })
+
+# ==============================
+# FLEET STATE
+# ==============================
+
+@dataclass
+class FleetState:
+    # identity
+    car_id: np.ndarray
+    branch_id: np.ndarray
+    device_id: np.ndarray
+    city_code: np.ndarray
+    category_code: np.ndarray
+
+    # dynamic state
+    engine_on: np.ndarray
+    trip_type: np.ndarray
+    lat: np.ndarray
+    lng: np.ndarray
+    speed_kmh: np.ndarray
+    prev_speed_kmh: np.ndarray   # NaN = never moved
+    fuel_pct: np.ndarray
+    engine_temp_c: np.ndarray
+    odometer_km: np.ndarray
+    event_code: np.ndarray       # last tick's EVENT_TYPE (index into EVENT_TYPES)
+
+    # lookup tables (indexed by city_code / category_code)
+    city_names: tuple
+    category_names: tuple
+    city_lat: np.ndarray
+    city_lng: np.ndarray
+    speed_lo: np.ndarray         # [category, trip_type]
+    speed_hi: np.ndarray
+    fuel_pct_per_km: np.ndarray  # [category]
+    geo: Optional[object] = None # city_assets.CityGrid (by city_code), None = drift only
+
+    def __len__(self) -> int:
+        return len(self.car_id)
+
+    def category(self, i: int) -> str:
+        return self.category_names[self.category_code[i]]
+
+    def city(self, i: int) -> str:
+        return self.city_names[self.city_code[i]]
+
+    @classmethod
+    def from_cars(cls, cars_df: pd.DataFrame, rng: np.random.Generator, assets=None) -> "FleetState":
+        """
+        cars_df: CAR_ID, BRANCH_ID, CITY, DEVICE_ID, ODOMETER_KM, CATEGORY_NAME
+        assets: city_assets.CityAssets (optional city boundaries)
+        """
+        n = len(cars_df)
+
+        cities = cars_df["CITY"].fillna("CASABLANCA").astype(str).str.upper()
+        city_code, city_names = pd.factorize(cities)
+        centers = [CITY_COORDS.get(c, CITY_COORDS["CASABLANCA"]) for c in city_names]
+        city_lat = np.array([c[0] for c in centers], dtype=np.float64)
+        city_lng = np.array([c[1] for c in centers], dtype=np.float64)
+
+        cats = cars_df["CATEGORY_NAME"].fillna("ECONOMY").astype(str)
+        category_code, category_names = pd.factorize(cats)
+        speed_lo = np.empty((len(category_names), len(TRIP_TYPES)))
+        speed_hi = np.empty_like(speed_lo)
+        for k, cat in enumerate(category_names):
+            prof = CATEGORY_SPEED_PROFILE.get(cat.upper(), CATEGORY_SPEED_PROFILE["ECONOMY"])
+            for t, trip in enumerate(TRIP_TYPES):
+                speed_lo[k, t], speed_hi[k, t] = prof[trip]
+
+        city_code = city_code.astype(np.int16)
+        trip_type = pick_trip_type(rng, n)
+        lat = city_lat[city_code] + rng.uniform(-INIT_SPREAD_DEG, INIT_SPREAD_DEG, n)
+        lng = city_lng[city_code] + rng.uniform(-INIT_SPREAD_DEG, INIT_SPREAD_DEG, n)
+
+        geo = assets.grid(city_names) if assets is not None else None
+        if geo is not None and geo.known.any():
+            in_lat, in_lng = geo.sample(city_code, rng.random(n), rng.random(n), rng.random(n))
+            lat = np.where(np.isnan(in_lat), lat, in_lat)
+            lng = np.where(np.isnan(in_lng), lng, in_lng)
+
+        return cls(
+            car_id=cars_df["CAR_ID"].to_numpy(dtype=np.int64),
+            branch_id=cars_df["BRANCH_ID"].to_numpy(dtype=np.int64),
+            device_id=cars_df["DEVICE_ID"].to_numpy(dtype=np.int64),
+            city_code=city_code,
+            category_code=category_code.astype(np.int16),
+            engine_on=np.zeros(n, dtype=bool),
+            trip_type=trip_type,
+            lat=lat,
+            lng=lng,
+            speed_kmh=np.zeros(n),
+            prev_speed_kmh=np.full(n, np.nan),
+            fuel_pct=np.full(n, 100.0),
+            engine_temp_c=np.full(n, 25.0),
+            odometer_km=cars_df["ODOMETER_KM"].fillna(0.0).to_numpy(dtype=np.float64),
+            event_code=np.full(n, EV_STOPPED, dtype=np.int8),
+            city_names=tuple(city_names),
+            category_names=tuple(category_names),
+            city_lat=city_lat,
+            city_lng=city_lng,
+            speed_lo=speed_lo,
+            speed_hi=speed_hi,
+            fuel_pct_per_km=np.array([fuel_pct_per_km(c) for c in category_names]),
+            geo=geo,
+        )
+
+    # ==============================
+    # TICK
+    # ==============================
+
+    def advance(self, dt_s: float, rng: np.random.Generator, event_ts: datetime) -> dict:
+        """
+        Advance every car by one tick and return the telemetry batch.
+        """
+        n = len(self)
+        was_on = self.engine_on
+
+        # engine start/stop transitions
+        p_start, p_stop = transition_probs(dt_s)
+        u_engine = rng.random(n)
+        start = ~was_on & (u_engine < p_start)
+        stop = was_on & (u_engine < p_stop)
+        running = was_on & ~stop
+
+        # engine on => choose DRIVING/IDLE/STOPPED
+        u_mode = rng.random(n)
+        driving = running & (u_mode < P_GO_DRIVING_IF_ON)
+        idle = running & ~driving & (u_mode < P_GO_DRIVING_IF_ON + P_GO_IDLE_IF_ON)
+
+        ev = np.full(n, EV_STOPPED, dtype=np.int8)
+        ev[start] = EV_ENGINE_START
+        ev[stop] = EV_ENGINE_STOP
+        ev[driving] = EV_DRIVING
+        ev[idle] = EV_IDLE
+
+        # speed
+        lo = self.speed_lo[self.category_code, self.trip_type]
+        hi = self.speed_hi[self.category_code, self.trip_type]
+        target = lo + (hi - lo) * rng.random(n)
+        smoothed = np.where(
+            np.isnan(self.prev_speed_kmh),
+            target * rng.uniform(0.6, 0.9, n),
+            self.speed_kmh + (target - self.speed_kmh) * rng.uniform(0.15, 0.35, n),
+        )
+        speed = np.where(driving, np.clip(smoothed, 0.0, MAX_SPEED_KMH), 0.0)
+        speed = np.where(idle, rng.uniform(0.0, 7.0, n), speed)
+
+        acc = np.where(running, (speed - self.speed_kmh) / 3.6 / dt_s, 0.0)
+        brake = np.where(running, brake_pressure_bar(acc, rng), 0.0)
+
+        # move (running cars only, drift pulls back to city center / boundary bounce)
+        dist_km = speed * dt_s / 3600.0
+        bearing = rng.uniform(0.0, 2 * np.pi, n)
+        dlat = (dist_km / 111.0) * np.cos(bearing)
+        dlon = (dist_km / (111.0 * np.maximum(0.2, np.cos(np.radians(self.lat))))) * np.sin(bearing)
+        drift_lat = (self.city_lat[self.city_code] - self.lat) * CITY_DRIFT
+        drift_lng = (self.city_lng[self.city_code] - self.lng) * CITY_DRIFT
+
+        if self.geo is not None:
+            # bounded cities: keep the step if it stays inside, else mirror it, else wait
+            code = self.city_code
+            fwd = self.geo.inside(code, self.lat + dlat, self.lng + dlon)
+            back = self.geo.inside(code, self.lat - dlat, self.lng - dlon)
+            sign = np.where(fwd, 1.0, np.where(back, -1.0, 0.0))
+            dlat, dlon = dlat * sign, dlon * sign
+            bounded = self.geo.known[code]
+            drift_lat = np.where(bounded, 0.0, drift_lat)
+            drift_lng = np.where(bounded, 0.0, drift_lng)
+
+        new_lat = np.where(running, self.lat + dlat + drift_lat, self.lat)
+        new_lng = np.where(running, self.lng + dlon + drift_lng, self.lng)
+        self.odometer_km = self.odometer_km + np.where(
+            running, haversine_km(self.lat, self.lng, new_lat, new_lng), 0.0)
+
+        # fuel/temp (parked cars report a cooling temp but keep their state)
+        self.fuel_pct = np.where(
+            running,
+            update_fuel_pct(self.fuel_pct, self.fuel_pct_per_km[self.category_code], speed, dt_s),
+            self.fuel_pct,
+        )
+        heating = start | running
+        temp = simulate_engine_temp(self.engine_temp_c, speed, heating, rng)
+        self.engine_temp_c = np.where(heating | stop, temp, self.engine_temp_c)
+
+        # update last
+        self.trip_type[start] = pick_trip_type(rng, n)[start]
+        self.prev_speed_kmh = np.where(start, 0.0, np.where(was_on, self.speed_kmh, self.prev_speed_kmh))
+        self.speed_kmh = speed
+        self.engine_on = heating
+        self.lat, self.lng = new_lat, new_lng
+        self.event_code = ev
+
+        ts = np.full(n, np.datetime64(event_ts, "us"))
+        return {
+            "DEVICE_ID": self.device_id,
+            "CAR_ID": self.car_id,
+            "EVENT_TS": ts,
+            "LATITUDE": self.lat,
+            "LONGITUDE": self.lng,
+            "SPEED_KMH": speed,
+            "ACCELERATION_MS2": acc,
+            "BRAKE_PRESSURE_BAR": brake,
+            "FUEL_LEVEL_PCT": self.fuel_pct,
+            "BATTERY_VOLTAGE": simulate_battery_voltage(heating, rng),
+            "ENGINE_TEMP_C": temp,
+            "ODOMETER_KM": self.odometer_km,
+            "EVENT_TYPE": _EVENT_TYPE_NAMES[ev],
+            "CREATED_AT": ts,
+        }
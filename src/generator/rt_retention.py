@@ -0,0 +1,220 @@
+# ============================================================
+# rt_retention.py
+# ============================================================
+# Keeps RT_IOT_FEED a bounded live buffer
+#
+# - time window: rows with RECEIVED_AT older than max_age go
+#     partitioned table -> DROP PARTITION (whole days at once)
+#     otherwise         -> DELETE ... AND ROWNUM <= batch, commit
+#                          per batch (short transactions)
+# - last N per car: only cars with rows since the previous pass;
+#   per-car cutoff (N-th newest RECEIVED_AT) read from the
+#   (CAR_ID, RECEIVED_AT) index, then one array-bound DELETE per
+#   chunk of cars
+# - runs on its own thread + connection, never inside a tick
+# ============================================================
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import text
+
+# ==============================
+# STATS
+# ==============================
+
+@dataclass
+class RetentionStats:
+    passes: int = 0
+    deleted_age: int = 0
+    deleted_last_n: int = 0
+    dropped_partitions: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        return (f"{self.passes} passes | age -{self.deleted_age:,} | last-N -{self.deleted_last_n:,} | "
+                f"partitions -{self.dropped_partitions} | {self.seconds:.1f}s")
+
+# ==============================
+# RETENTION
+# ==============================
+
+_HIGH_VALUE_TS = re.compile(r"(\d{4}-\d{2}-\d{2}(?: \d{2}:\d{2}:\d{2})?)")
+
+class RtFeedRetention:
+    """
+    keep_last_n / max_age: either or both (None = that rule is off).
+    """
+
+    def __init__(self, engine, table: str = "RT_IOT_FEED", schema: Optional[str] = None,
+                 keep_last_n: Optional[int] = 300, max_age: Optional[timedelta] = None,
+                 batch_rows: int = 10_000, car_chunk: int = 1_000):
+        self.engine = engine
+        self.table = table
+        self.qualified = f"{schema}.{table}" if schema else table
+        self.owner = schema.upper() if schema else None
+        self.keep_last_n = keep_last_n
+        self.max_age = max_age
+        self.batch_rows = batch_rows
+        self.car_chunk = car_chunk
+        self.stats = RetentionStats()
+        self.last_n_since: Optional[datetime] = None  # newest RECEIVED_AT at the previous last-N pass
+
+    # ---------- time window ----------
+
+    def _partitions(self, conn) -> list[tuple[str, str]]:
+        owner = "USER" if self.owner is None else ":owner"
+        rows = conn.execute(text(f"""
+            SELECT PARTITION_NAME, HIGH_VALUE
+              FROM ALL_TAB_PARTITIONS
+             WHERE TABLE_OWNER = {owner}
+               AND TABLE_NAME = :tname
+             ORDER BY PARTITION_POSITION
+        """), {"tname": self.table, **({"owner": self.owner} if self.owner else {})}).fetchall()
+        return [(str(name), str(high or "")) for name, high in rows]
+
+    def _partition_key(self, conn) -> list[str]:
+        owner = "USER" if self.owner is None else ":owner"
+        rows = conn.execute(text(f"""
+            SELECT COLUMN_NAME
+              FROM ALL_PART_KEY_COLUMNS
+             WHERE OWNER = {owner}
+               AND NAME = :tname
+               AND OBJECT_TYPE = 'TABLE'
+             ORDER BY COLUMN_POSITION
+        """), {"tname": self.table, **({"owner": self.owner} if self.owner else {})}).fetchall()
+        return [str(r[0]).upper() for r in rows]
+
+    def _drop_old_partitions(self, conn, partitions: list[tuple[str, str]], cutoff: datetime) -> int:
+        """
+        Range/interval partitions on RECEIVED_AT whose upper bound is <= cutoff
+        hold only expired rows. The last range partition of an interval table
+        can't be dropped: Oracle refuses and we leave it to the DELETE path.
+        """
+        dropped = 0
+        for name, high in partitions:
+            m = _HIGH_VALUE_TS.search(high)
+            if not m or datetime.fromisoformat(m.group(1)) > cutoff:
+                continue
+            try:
+                conn.execute(text(f"ALTER TABLE {self.qualified} DROP PARTITION {name} UPDATE INDEXES"))
+                dropped += 1
+            except Exception:
+                break
+        return dropped
+
+    def prune_age(self, now: datetime) -> int:
+        cutoff = now - self.max_age
+        with self.engine.connect() as conn:
+            partitions = self._partitions(conn)
+            # HIGH_VALUE only says something about RECEIVED_AT if that is the partition key
+            if partitions and self._partition_key(conn) == ["RECEIVED_AT"]:
+                self.stats.dropped_partitions += self._drop_old_partitions(conn, partitions, cutoff)
+
+            deleted = 0
+            while True:
+                res = conn.execute(text(f"""
+                    DELETE FROM {self.qualified}
+                     WHERE RECEIVED_AT < :cutoff
+                       AND ROWNUM <= :batch
+                """), {"cutoff": cutoff, "batch": self.batch_rows})
+                conn.commit()
+                deleted += res.rowcount or 0
+                if (res.rowcount or 0) < self.batch_rows:
+                    break
+
+        self.stats.deleted_age += deleted
+        return deleted
+
+    # ---------- last N per car ----------
+
+    def prune_last_n(self) -> int:
+        """
+        A car can only go over N by receiving rows, so only cars with rows
+        since the previous pass are looked at (RECEIVED_AT index range). For
+        each, the N-th newest RECEIVED_AT is one descending walk of N entries
+        of the (CAR_ID, RECEIVED_AT) index: cost ~ active cars x N, not the
+        table size. Spool replays with old RECEIVED_AT are caught once the
+        car sends again (and by the time window).
+        """
+        with self.engine.connect() as conn:
+            since = self.last_n_since
+            newest = conn.execute(text(f"SELECT MAX(RECEIVED_AT) FROM {self.qualified}")).scalar()
+            if newest is None:
+                return 0
+            cutoffs = conn.execute(text(f"""
+                SELECT c.CAR_ID, x.RECEIVED_AT
+                  FROM (
+                    SELECT DISTINCT CAR_ID
+                      FROM {self.qualified}
+                     WHERE RECEIVED_AT >= :since
+                  ) c
+                 CROSS APPLY (
+                    SELECT r.RECEIVED_AT
+                      FROM {self.qualified} r
+                     WHERE r.CAR_ID = c.CAR_ID
+                     ORDER BY r.RECEIVED_AT DESC
+                    OFFSET :skip ROWS FETCH NEXT 1 ROWS ONLY
+                 ) x
+            """), {"since": since or datetime.min, "skip": self.keep_last_n - 1}).fetchall()
+
+            deleted = 0
+            binds = [{"cid": int(cid), "cutoff": ts} for cid, ts in cutoffs]
+            for i in range(0, len(binds), self.car_chunk):
+                res = conn.execute(text(f"""
+                    DELETE FROM {self.qualified}
+                     WHERE CAR_ID = :cid
+                       AND RECEIVED_AT < :cutoff
+                """), binds[i:i + self.car_chunk])
+                conn.commit()
+                deleted += max(res.rowcount or 0, 0)
+            self.last_n_since = newest
+
+        self.stats.deleted_last_n += deleted
+        return deleted
+
+    # ---------- pass ----------
+
+    def run_once(self, now: Optional[datetime] = None) -> int:
+        t0 = time.perf_counter()
+        deleted = 0
+        if self.max_age is not None:
+            deleted += self.prune_age(now or datetime.now())
+        if self.keep_last_n:
+            deleted += self.prune_last_n()
+        self.stats.passes += 1
+        self.stats.seconds += time.perf_counter() - t0
+        return deleted
+
+class RetentionThread:
+    """
+    Background loop: one retention pass every interval_sec. Errors are
+    printed and retried next pass (retention must never stop the simulator).
+    """
+
+    def __init__(self, retention: RtFeedRetention, interval_sec: float = 60.0):
+        self.retention = retention
+        self.interval = interval_sec
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rt-retention", daemon=True)
+
+    def start(self) -> "RetentionThread":
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.retention.run_once()
+            except Exception as e:
+                print(f"⚠️ RT retention pass failed: {e}")
+
+    def stop(self, timeout: float = 30.0):
+        self._stop.set()
+        self._thread.join(timeout=timeout)
@@ -0,0 +1,247 @@
+# ============================================================
+# sim_metrics.py
+# ============================================================
+# Per-tick hot-path instrumentation for the live simulator
+#
+# - stage timers: advance, reconcile, rentals, alerts,
+#   serialize, db_execute, commit, emit (seconds per tick)
+# - counters: SQL round-trips and bound rows per tick
+# - one accumulator per tick (new_tick / recording / end_tick):
+#   with the pipeline on, the producer's advance time travels
+#   with its batch instead of landing in whichever tick the
+#   writer finishes next
+# - rolling window -> p50 / p95 / p99 per stage
+# - exports: Prometheus text (file and/or local HTTP endpoint)
+#            and a JSON summary file
+# ============================================================
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import event
+
+STAGES = ("advance", "reconcile", "rentals", "alerts", "serialize", "db_execute", "commit", "emit")
+COUNTERS = ("sql_round_trips", "rows_bound")
+QUANTILES = (0.5, 0.95, 0.99)
+
+# ==============================
+# REGISTRY
+# ==============================
+
+class StageMetrics:
+    """
+    Stages / counters accumulate into a tick until end_tick(tick).
+    Target: the explicit tick=, else the one recording() set on this
+    thread, else a shared default tick. Thread-safe (producer and writer
+    threads both report).
+    """
+
+    def __init__(self, window: int = 1000, labels: Optional[dict] = None):
+        self.labels = dict(labels or {})
+        self.ticks = 0
+        self.totals: dict[str, float] = defaultdict(float)
+        self.history: dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+        self.last_tick: dict[str, float] = {}
+
+        self._current: dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # ---------- recording ----------
+
+    def new_tick(self) -> dict[str, float]:
+        return defaultdict(float)
+
+    def add(self, name: str, value: float, tick: Optional[dict] = None):
+        if tick is None:
+            tick = getattr(self._local, "tick", None)
+        with self._lock:
+            (self._current if tick is None else tick)[name] += value
+
+    def count(self, name: str, k: int = 1, tick: Optional[dict] = None):
+        self.add(name, k, tick)
+
+    @contextmanager
+    def stage(self, name: str, tick: Optional[dict] = None):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0, tick)
+
+    @contextmanager
+    def recording(self, tick: Optional[dict]):
+        """
+        Everything this thread reports inside the block goes to `tick`
+        (None = the shared default tick).
+        """
+        prev = getattr(self._local, "tick", None)
+        self._local.tick = tick
+        try:
+            yield
+        finally:
+            self._local.tick = prev
+
+    @contextmanager
+    def tracking(self):
+        """
+        SQL round-trips are only counted inside this block, on this thread
+        (drainer / retention threads share the engine but not the flag).
+        """
+        self._local.active = True
+        try:
+            yield
+        finally:
+            self._local.active = False
+
+    def is_tracking(self) -> bool:
+        return getattr(self._local, "active", False)
+
+    def end_tick(self, current: Optional[dict] = None) -> dict[str, float]:
+        with self._lock:
+            if current is None:
+                current, self._current = self._current, defaultdict(float)
+            tick = {k: current.get(k, 0.0) for k in STAGES}
+            tick.update({k: int(current.get(k, 0)) for k in COUNTERS})
+            tick["total"] = sum(tick[s] for s in STAGES)
+            self.ticks += 1
+            for k, v in tick.items():
+                self.totals[k] += v
+                self.history[k].append(v)
+            self.last_tick = tick
+        return tick
+
+    # ---------- summaries ----------
+
+    def percentiles(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            hist = {k: np.fromiter(v, dtype=float) for k, v in self.history.items() if v}
+        out = {}
+        for k, arr in hist.items():
+            qs = np.quantile(arr, QUANTILES)
+            out[k] = {f"p{int(q * 100)}": float(v) for q, v in zip(QUANTILES, qs)}
+        return out
+
+    def json_summary(self) -> dict:
+        return {
+            "labels": self.labels,
+            "ticks": self.ticks,
+            "last_tick": self.last_tick,
+            "totals": dict(self.totals),
+            "percentiles": self.percentiles(),
+        }
+
+    def prometheus_text(self) -> str:
+        base = "".join(f',{k}="{v}"' for k, v in self.labels.items())
+        plain = "{" + base[1:] + "}" if base else ""
+        pct = self.percentiles()
+        lines = [
+            "# HELP sim_stage_seconds Time per tick spent in each simulator stage",
+            "# TYPE sim_stage_seconds summary",
+        ]
+        for s in STAGES + ("total",):
+            for q in QUANTILES:
+                v = pct.get(s, {}).get(f"p{int(q * 100)}", 0.0)
+                lines.append(f'sim_stage_seconds{{stage="{s}",quantile="{q}"{base}}} {v:.6f}')
+            lines.append(f'sim_stage_seconds_sum{{stage="{s}"{base}}} {self.totals.get(s, 0.0):.6f}')
+            lines.append(f'sim_stage_seconds_count{{stage="{s}"{base}}} {self.ticks}')
+        for c in COUNTERS:
+            lines += [
+                f"# TYPE sim_{c}_total counter",
+                f"sim_{c}_total{plain} {int(self.totals.get(c, 0))}",
+                f"# TYPE sim_{c}_last_tick gauge",
+                f"sim_{c}_last_tick{plain} {int(self.last_tick.get(c, 0))}",
+            ]
+        lines += ["# TYPE sim_ticks_total counter", f"sim_ticks_total{plain} {self.ticks}"]
+        return "\n".join(lines) + "\n"
+
+    def short_summary(self) -> str:
+        t = self.last_tick
+        if not t:
+            return "no tick yet"
+        stages = " ".join(f"{s} {t[s] * 1000:.0f}ms" for s in STAGES if t[s] > 0)
+        return f"{stages} | sql {int(t['sql_round_trips'])} | bound {int(t['rows_bound']):,}"
+
+    # ---------- export ----------
+
+    def write_files(self, prom_path: Optional[str] = None, json_path: Optional[str] = None):
+        """
+        Atomic rewrite (tmp + rename) so scrapers never read half a file.
+        """
+        for path, body in ((prom_path, self.prometheus_text), (json_path, self._json_text)):
+            if not path:
+                continue
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + ".tmp")
+            tmp.write_text(body(), encoding="utf-8")
+            os.replace(tmp, path)
+
+    def _json_text(self) -> str:
+        return json.dumps(self.json_summary(), indent=2)
+
+# ==============================
+# SQL ROUND-TRIPS
+# ==============================
+
+def watch_round_trips(engine, metrics: StageMetrics):
+    """
+    Count every statement SQLAlchemy sends while metrics.tracking() is on.
+    Raw-cursor calls (array writers, RETURNING inserts) are counted by the caller.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        if metrics.is_tracking():
+            metrics.count("sql_round_trips")
+
+# ==============================
+# HTTP ENDPOINT
+# ==============================
+
+class MetricsHTTPServer:
+    """
+    GET /metrics -> Prometheus text, GET /summary -> JSON (localhost only).
+    """
+
+    def __init__(self, metrics: StageMetrics, port: int, host: str = "127.0.0.1"):
+        outer = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics"):
+                    body, ctype = outer.prometheus_text(), "text/plain; version=0.0.4"
+                elif self.path.startswith("/summary"):
+                    body, ctype = outer._json_text(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+
+    def start(self) -> "MetricsHTTPServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,323 @@
+# ============================================================
+# telemetry_reader.py
+# ============================================================
+# Window reader for telemetry replay (IOT_TELEMETRY -> stream)
+#
+# - explicit column list (no SELECT *), no pandas
+# - raw driver cursor with explicit arraysize / prefetchrows
+# - keyset pagination inside a window: (EVENT_TS, TELEMETRY_ID)
+#   > last key, FETCH FIRST page_rows (no OFFSET rescans)
+# - WindowPrefetcher: a background thread reads window N+1
+#   while the caller processes window N (bounded queue)
+# - AdaptiveWindowPrefetcher: event-time paced replay; empty
+#   stretches are found with one MIN(EVENT_TS) index probe
+#   instead of empty window queries, and windows are merged
+#   (up to max_rows) while the replay is behind wall-clock
+#
+# Output is columnar (dict of arrays), same shape as the
+# simulator batches, so TelemetryWriter can write it as is.
+# ============================================================
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+import numpy as np
+
+from telemetry_writer import TELEMETRY_COLUMNS
+
+# ==============================
+# STATS
+# ==============================
+
+@dataclass
+class ReaderStats:
+    windows: int = 0
+    pages: int = 0
+    rows: int = 0
+    read_sec: float = 0.0   # reader thread, DB + conversion
+    wait_sec: float = 0.0   # consumer blocked on the next window
+    probes: int = 0         # next EVENT_TS lookups
+    merged: int = 0         # extra windows folded into a batch (catch-up)
+    skipped_sec: float = 0.0  # empty event time jumped over
+
+    def summary(self) -> str:
+        rate = self.rows / self.read_sec if self.read_sec > 0 else 0.0
+        out = (f"{self.rows:,} rows in {self.windows:,} windows / {self.pages:,} pages "
+               f"({rate:,.0f} rows/s read, consumer waited {self.wait_sec:.2f}s)")
+        if self.probes:
+            out += (f" | {self.probes:,} probes, {self.merged:,} windows merged, "
+                    f"{self.skipped_sec / 3600:,.1f}h skipped")
+        return out
+
+# ==============================
+# CONVERSION
+# ==============================
+
+def rows_to_columns(rows: list[tuple], columns) -> dict:
+    """
+    Fetched tuples -> {column: numpy array}; NULL -> NaN / NaT / None.
+    """
+    if not rows:
+        return {c: np.zeros(0) for c, _ in columns}
+    out = {}
+    for (name, kind), values in zip(columns, zip(*rows)):
+        if kind == "ts":
+            out[name] = np.array(values, dtype="datetime64[us]")
+        elif kind in ("int", "float"):
+            arr = np.array(values, dtype=np.float64)  # None -> nan
+            out[name] = arr.astype(np.int64) if kind == "int" and not np.isnan(arr).any() else arr
+        else:
+            out[name] = np.array(values, dtype=object)
+    return out
+
+# ==============================
+# READER
+# ==============================
+
+class WindowReader:
+    """
+    read_window(start, end) -> (batch, n): rows with start <= ts < end,
+    ordered by (ts, key), in pages of page_rows (keyset).
+    max_rows caps one read; last_key then resumes it (after=...).
+
+    Owns one DBAPI connection, opened lazily by the thread that reads.
+    """
+
+    def __init__(self, engine, table: str = "IOT_TELEMETRY", columns=TELEMETRY_COLUMNS,
+                 schema: Optional[str] = None, key: str = "TELEMETRY_ID", ts: str = "EVENT_TS",
+                 page_rows: int = 20_000, arraysize: int = 5_000, prefetchrows: Optional[int] = None):
+        self.engine = engine
+        self.key = key
+        self.ts = ts
+        self.columns = ((key, "int"),) + tuple(c for c in columns if c[0] != key)
+        self.page_rows = page_rows
+        self.arraysize = arraysize
+        self.prefetchrows = prefetchrows if prefetchrows is not None else arraysize + 1
+        self.stats = ReaderStats()
+
+        qualified = f"{schema}.{table}" if schema else table
+        names = ", ".join(c for c, _ in self.columns)
+        base = f"SELECT {names} FROM {qualified} WHERE {ts} >= :s AND {ts} < :e"
+        tail = f" ORDER BY {ts}, {key} FETCH FIRST :lim ROWS ONLY"
+        self.sql_first = base + tail
+        self.sql_next = base + f" AND ({ts} > :k_ts OR ({ts} = :k_ts AND {key} > :k_id))" + tail
+        # MIN over the EVENT_TS index range: one probe, no rows scanned
+        self.sql_next_ts = f"SELECT MIN({ts}) FROM {qualified} WHERE {ts} >= :s"
+        self.last_key: Optional[tuple] = None
+
+        self._conn = None
+        self._key_pos = 0
+        self._ts_pos = [c for c, _ in self.columns].index(ts)
+
+    def _cursor(self):
+        if self._conn is None:
+            self._conn = self.engine.raw_connection()
+        cur = self._conn.cursor()
+        cur.arraysize = self.arraysize
+        cur.prefetchrows = self.prefetchrows  # first round-trip already brings rows back
+        return cur
+
+    def read_window(self, start: datetime, end: datetime, max_rows: Optional[int] = None,
+                    after: Optional[tuple] = None) -> tuple[dict, int]:
+        t0 = time.perf_counter()
+        rows: list[tuple] = []
+        key = after
+        cur = self._cursor()
+        try:
+            while max_rows is None or len(rows) < max_rows:
+                lim = self.page_rows if max_rows is None else min(self.page_rows, max_rows - len(rows))
+                binds = {"s": start, "e": end, "lim": lim}
+                if key is None:
+                    sql = self.sql_first
+                else:
+                    sql = self.sql_next
+                    binds.update(k_ts=key[0], k_id=key[1])
+                cur.execute(sql, binds)
+                page = 0
+                while True:
+                    chunk = cur.fetchmany()
+                    if not chunk:
+                        break
+                    rows.extend(chunk)
+                    page += len(chunk)
+                self.stats.pages += 1
+                if page < lim:
+                    break
+                key = (rows[-1][self._ts_pos], rows[-1][self._key_pos])
+        finally:
+            cur.close()
+
+        self.last_key = (rows[-1][self._ts_pos], rows[-1][self._key_pos]) if rows else after
+        batch = rows_to_columns(rows, self.columns)
+        self.stats.windows += 1
+        self.stats.rows += len(rows)
+        self.stats.read_sec += time.perf_counter() - t0
+        return batch, len(rows)
+
+    def next_event_ts(self, after: datetime) -> Optional[datetime]:
+        """
+        First EVENT_TS >= after, None when there is nothing yet.
+        """
+        cur = self._cursor()
+        try:
+            cur.execute(self.sql_next_ts, {"s": after})
+            row = cur.fetchone()
+        finally:
+            cur.close()
+        self.stats.probes += 1
+        return row[0] if row else None
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+# ==============================
+# PREFETCH
+# ==============================
+
+_DONE = object()
+
+class WindowPrefetcher:
+    """
+    Iterates (window_start, window_end, batch, n) from start, step by step,
+    with up to `depth` windows read ahead on a background thread.
+    stop_at=None = endless (replay keeps polling new data).
+    """
+
+    def __init__(self, reader: WindowReader, start: datetime, step: timedelta,
+                 depth: int = 1, stop_at: Optional[datetime] = None):
+        self.reader = reader
+        self.start = start
+        self.step = step
+        self.stop_at = stop_at
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, depth))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="window-prefetch", daemon=True)
+        self._thread.start()
+
+    def windows(self) -> Iterator[tuple[datetime, datetime, dict, int]]:
+        """
+        Runs on the background thread; subclasses change the schedule.
+        """
+        w = self.start
+        while not self._stop.is_set() and (self.stop_at is None or w < self.stop_at):
+            end = w + self.step
+            batch, n = self.reader.read_window(w, end)
+            yield w, end, batch, n
+            w = end
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        try:
+            for item in self.windows():
+                if not self._put(item):
+                    return
+            self._put(_DONE)
+        except Exception as e:
+            self._put(e)
+        finally:
+            self.reader.close()
+
+    def __iter__(self) -> Iterator[tuple[datetime, datetime, dict, int]]:
+        while True:
+            t0 = time.perf_counter()
+            item = self._queue.get()
+            self.reader.stats.wait_sec += time.perf_counter() - t0
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=10)
+
+class AdaptiveWindowPrefetcher(WindowPrefetcher):
+    """
+    Event-time replay: a window is read once wall-clock reaches its end
+    (start + (event time - start) / speedup).
+
+    - the next EVENT_TS is known before reading, so windows without rows
+      are never queried; skip_empty=True also re-anchors the clock there
+      (a quiet night replays instantly)
+    - when behind (slow consumer, high speedup) all due windows are read
+      as one batch, capped at max_rows, resumed by keyset
+    """
+
+    def __init__(self, reader: WindowReader, start: datetime, step: timedelta, speedup: float = 1.0,
+                 max_rows: int = 20_000, skip_empty: bool = True, idle_poll_sec: float = 5.0,
+                 depth: int = 1, stop_at: Optional[datetime] = None):
+        self.speedup = speedup
+        self.max_rows = max_rows
+        self.skip_empty = skip_empty
+        self.idle_poll_sec = idle_poll_sec
+        super().__init__(reader, start, step, depth=depth, stop_at=stop_at)
+
+    def windows(self) -> Iterator[tuple[datetime, datetime, dict, int]]:
+        reader, step, stats = self.reader, self.step, self.reader.stats
+        pos, after = self.start, None
+        next_ts: Optional[datetime] = self.start
+        event0, wall0 = pos, time.perf_counter()
+
+        def due() -> datetime:
+            return event0 + timedelta(seconds=(time.perf_counter() - wall0) * self.speedup)
+
+        while not self._stop.is_set():
+            if self.stop_at is not None and pos >= self.stop_at:
+                return
+            if next_ts is None:
+                if self.stop_at is not None:
+                    return
+                self._stop.wait(self.idle_poll_sec)  # caught up with the source, wait for new rows
+                next_ts = reader.next_event_ts(pos)
+                continue
+
+            # no rows before next_ts: jump there (window aligned)
+            if after is None and next_ts >= pos + step:
+                jump = pos + step * ((next_ts - pos) // step)
+                if self.skip_empty and jump > due():
+                    stats.skipped_sec += (jump - max(pos, due())).total_seconds()
+                    event0, wall0 = jump, time.perf_counter()
+                pos = jump
+
+            now = due()
+            if now < pos + step:
+                delay = (pos + step - event0).total_seconds() / self.speedup - (time.perf_counter() - wall0)
+                self._stop.wait(max(0.0, delay))
+                continue
+
+            end = pos + step * ((now - pos) // step)
+            if self.stop_at is not None:
+                end = min(end, self.stop_at)
+            batch, n = reader.read_window(pos, end, max_rows=self.max_rows, after=after)
+            lo = pos if after is None else after[0]
+
+            if n >= self.max_rows:
+                # more rows may be due in [pos, end): resume from the last key
+                after = reader.last_key
+                yield lo, after[0], batch, n
+                continue
+
+            stats.merged += max(0, (end - pos) // step - 1)
+            yield lo, end, batch, n
+            pos, after = end, None
+            next_ts = reader.next_event_ts(end)
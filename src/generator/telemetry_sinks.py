@@ -0,0 +1,295 @@
+# ============================================================
+# telemetry_sinks.py
+# ============================================================
+# Where telemetry batches go
+#
+# Every sink takes the same columnar batch as telemetry_writer
+# (column name -> array / list / scalar) through
+#     write(conn, batch, n) / close() / stats
+# so the live simulator and the weekly generator don't care
+# whether rows end up in Oracle or on disk.
+#
+#   oracle   RT_IOT_FEED / IOT_TELEMETRY (telemetry_writer)
+#   parquet  <dir>/parquet/<TABLE>/EVENT_DATE=YYYY-MM-DD/part-*.parquet
+#   arrow    <dir>/arrow/<TABLE>/part-*.arrows (Arrow IPC stream)
+#   ndjson   <dir>/ndjson/<TABLE>/part-*.ndjson
+#
+# part-<start time>-<pid>-<seq>: one file set per sink instance
+# (shards, or two sinks on the same table, never share a file).
+#   null     counts rows, writes nothing
+#
+# Several kinds at once = FanOutSink. parquet / arrow need pyarrow.
+# ============================================================
+
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from telemetry_writer import TELEMETRY_COLUMNS, WriterStats, make_writer, serialize_rows
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only the file sinks need it
+    pa = None
+
+SINK_KINDS = ("oracle", "parquet", "arrow", "ndjson", "null")
+
+# ==============================
+# ARROW CONVERSION
+# ==============================
+
+def _require_pyarrow(kind: str):
+    if pa is None:
+        raise RuntimeError(f"The {kind} sink needs pyarrow (pip install pyarrow)")
+
+def _arrow_type(kind: str):
+    if kind == "int":
+        return pa.int64()
+    if kind == "float":
+        return pa.float64()
+    if kind == "ts":
+        return pa.timestamp("us")
+    return pa.string()
+
+def arrow_schema(columns) -> "pa.Schema":
+    return pa.schema([(c, _arrow_type(k)) for c, k in columns])
+
+def _arrow_column(values, n: int, kind: str) -> "pa.Array":
+    """
+    Vectorized version of telemetry_writer.column_values (NaN/NaT -> null).
+    """
+    typ = _arrow_type(kind)
+    if values is None:
+        return pa.nulls(n, typ)
+
+    if np.isscalar(values) or isinstance(values, datetime):
+        if kind == "ts":
+            return pa.array(np.full(n, np.datetime64(values, "us")), type=typ)
+        if kind == "str":
+            return pa.array([values] * n, type=typ)
+        values = np.full(n, values)
+
+    arr = np.asarray(values)
+    if kind == "ts":
+        if arr.dtype.kind != "M":
+            arr = arr.astype("datetime64[us]")
+        return pa.array(arr.astype("datetime64[us]"), type=typ)  # NaT -> null
+    if kind == "str":
+        return pa.array([None if (v is None or v != v) else str(v) for v in arr.tolist()], type=typ)
+
+    if arr.dtype.kind == "f":
+        nan = np.isnan(arr)
+        if kind == "int":
+            arr = np.where(nan, 0, arr).astype(np.int64)
+        return pa.array(arr, type=typ, mask=nan if nan.any() else None)
+    return pa.array(arr.astype(np.int64 if kind == "int" else np.float64), type=typ)
+
+def arrow_table(columns, batch: dict, n: int) -> "pa.Table":
+    return pa.Table.from_arrays(
+        [_arrow_column(batch.get(c), n, k) for c, k in columns],
+        schema=arrow_schema(columns),
+    )
+
+# ==============================
+# SINKS
+# ==============================
+
+_part_seq = itertools.count(1)
+
+def part_name() -> str:
+    # seq: the timestamp is per second, several sinks of one process may open in the same second
+    return f"part-{datetime.now():%Y%m%d%H%M%S}-{os.getpid()}-{next(_part_seq):04d}"
+
+class TelemetrySink:
+    """
+    Base class: subclasses implement _write(batch, n) and return bytes written.
+    """
+
+    kind = "base"
+
+    def __init__(self, table: str, columns=TELEMETRY_COLUMNS):
+        self.table = table
+        self.columns = tuple(columns)
+        self.stats = WriterStats()
+
+    def write(self, conn, batch: dict, n: int | None = None) -> int:
+        if n is None:
+            n = len(batch["CAR_ID"])
+        if n == 0:
+            return 0
+
+        t0 = time.perf_counter()
+        nbytes = self._write(batch, n)
+
+        self.stats.calls += 1
+        self.stats.rows += n
+        self.stats.bytes_bound += nbytes
+        self.stats.seconds += time.perf_counter() - t0
+        return n
+
+    def _write(self, batch: dict, n: int) -> int:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class NullSink(TelemetrySink):
+    kind = "null"
+
+    def _write(self, batch: dict, n: int) -> int:
+        return 0
+
+class NDJSONSink(TelemetrySink):
+    kind = "ndjson"
+
+    def __init__(self, table: str, columns=TELEMETRY_COLUMNS, out_dir: str = "output"):
+        super().__init__(table, columns)
+        self.path = Path(out_dir) / "ndjson" / table / f"{part_name()}.ndjson"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.path, "w", encoding="utf-8")
+        self._names = [c for c, _ in self.columns]
+
+    def _write(self, batch: dict, n: int) -> int:
+        names = self._names
+        lines = "".join(
+            json.dumps(dict(zip(names, row)), default=_json_default) + "\n"
+            for row in serialize_rows(self.columns, batch, n)
+        )
+        self._fh.write(lines)
+        return len(lines)
+
+    def close(self):
+        self._fh.close()
+
+def _json_default(v):
+    if isinstance(v, datetime):
+        return v.isoformat()
+    raise TypeError(f"not JSON serializable: {type(v).__name__}")
+
+class ArrowStreamSink(TelemetrySink):
+    kind = "arrow"
+
+    def __init__(self, table: str, columns=TELEMETRY_COLUMNS, out_dir: str = "output"):
+        _require_pyarrow(self.kind)
+        super().__init__(table, columns)
+        self.path = Path(out_dir) / "arrow" / table / f"{part_name()}.arrows"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._sink = pa.OSFile(str(self.path), "wb")
+        self._writer = pa_ipc.new_stream(self._sink, arrow_schema(self.columns))
+
+    def _write(self, batch: dict, n: int) -> int:
+        before = self._sink.tell()
+        self._writer.write_table(arrow_table(self.columns, batch, n))
+        return self._sink.tell() - before
+
+    def close(self):
+        self._writer.close()
+        self._sink.close()
+
+class ParquetSink(TelemetrySink):
+    """
+    Hive-style partitions by EVENT_TS date. One open file per partition,
+    one row group per write; files are finalized on close().
+    """
+
+    kind = "parquet"
+
+    def __init__(self, table: str, columns=TELEMETRY_COLUMNS, out_dir: str = "output",
+                 partition_col: str = "EVENT_TS"):
+        _require_pyarrow(self.kind)
+        super().__init__(table, columns)
+        self.root = Path(out_dir) / "parquet" / table
+        self.partition_col = partition_col
+        self.schema = arrow_schema(self.columns)
+        self._writers: dict[str, "pq.ParquetWriter"] = {}
+        self._part = part_name()
+
+    def _writer_for(self, day: str) -> "pq.ParquetWriter":
+        w = self._writers.get(day)
+        if w is None:
+            path = self.root / f"EVENT_DATE={day}" / f"{self._part}.parquet"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            w = self._writers[day] = pq.ParquetWriter(str(path), self.schema, compression="zstd")
+        return w
+
+    def _write(self, batch: dict, n: int) -> int:
+        table = arrow_table(self.columns, batch, n)
+        days = table.column(self.partition_col).to_numpy(zero_copy_only=False).astype("datetime64[D]")
+        uniq = np.unique(days)
+        for day in uniq:
+            part = table if len(uniq) == 1 else table.filter(pa.array(days == day))
+            self._writer_for(str(day)).write_table(part)
+        return table.nbytes
+
+    def close(self):
+        for w in self._writers.values():
+            w.close()
+        self._writers.clear()
+
+class FanOutSink:
+    """
+    Same batch to several sinks, in order (Oracle first, so a DB error
+    stops the tick before files get ahead of the database).
+    """
+
+    def __init__(self, sinks: list):
+        self.sinks = list(sinks)
+
+    @property
+    def stats(self) -> WriterStats:
+        out = WriterStats()
+        for s in self.sinks:
+            out.calls = max(out.calls, s.stats.calls)
+            out.rows = max(out.rows, s.stats.rows)
+            out.bytes_bound += s.stats.bytes_bound
+            out.seconds += s.stats.seconds
+            out.serialize_sec += s.stats.serialize_sec
+            out.executes += s.stats.executes
+        return out
+
+    def write(self, conn, batch: dict, n: int | None = None) -> int:
+        for s in self.sinks:
+            n = s.write(conn, batch, n)
+        return n or 0
+
+    def close(self):
+        for s in self.sinks:
+            s.close()
+
+# ==============================
+# FACTORY
+# ==============================
+
+def make_sink(kind: str, table: str, columns=TELEMETRY_COLUMNS, schema: str | None = None,
+              writer: str = "array", direct_path: bool = False, out_dir: str = "output"):
+    if kind == "oracle":
+        return make_writer(writer, table, columns, schema=schema, direct_path=direct_path)
+    if kind == "parquet":
+        return ParquetSink(table, columns, out_dir=out_dir)
+    if kind == "arrow":
+        return ArrowStreamSink(table, columns, out_dir=out_dir)
+    if kind == "ndjson":
+        return NDJSONSink(table, columns, out_dir=out_dir)
+    if kind == "null":
+        return NullSink(table, columns)
+    raise ValueError(f"Unknown telemetry sink: {kind}")
+
+def make_sinks(kinds, table: str, columns=TELEMETRY_COLUMNS, **kw):
+    """
+    One sink, or a FanOutSink when several kinds are configured.
+    """
+    kinds = [kinds] if isinstance(kinds, str) else list(kinds)
+    if not kinds:
+        raise ValueError("At least one telemetry sink is required")
+    kinds.sort(key=lambda k: k != "oracle")
+    sinks = [make_sink(k, table, columns, **kw) for k in kinds]
+    return sinks[0] if len(sinks) == 1 else FanOutSink(sinks)
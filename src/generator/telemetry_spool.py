@@ -0,0 +1,266 @@
+# ============================================================
+# telemetry_spool.py
+# ============================================================
+# Local write-ahead spool for telemetry batches
+#
+# - every tick batch is written to its own segment file (fsync +
+#   atomic rename) BEFORE the database write
+# - DB write OK   -> segment deleted (acknowledged)
+# - DB write KO   -> segment renamed pending-*, the tick goes on
+# - SpoolDrainer (background thread) replays pending segments in
+#   large merged batches once the database answers again
+# - a segment that can't be read, or that the database keeps
+#   rejecting while other writes go through, is renamed bad-*
+#   (kept for inspection, no longer replayed)
+#
+# Segment = MAGIC + pickle of {column: numpy array | scalar} + n.
+# Delivery is at-least-once: an in-flight segment left by a crash
+# is replayed on the next start.
+# ============================================================
+
+from __future__ import annotations
+
+import os
+import pickle
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+MAGIC = b"TSPOOL1\n"
+
+INFLIGHT = "inflight-"
+PENDING = "pending-"
+BAD = "bad-"
+SUFFIX = ".seg"
+
+# ==============================
+# STATS
+# ==============================
+
+@dataclass
+class SpoolStats:
+    appended: int = 0
+    acked: int = 0
+    failed: int = 0
+    bad: int = 0
+    drained_segments: int = 0
+    drained_rows: int = 0
+    drain_sec: float = 0.0
+
+    def summary(self, backlog: int) -> str:
+        rate = self.drained_rows / self.drain_sec if self.drain_sec > 0 else 0.0
+        return (f"spool backlog {backlog} | failed {self.failed} | bad {self.bad} | "
+                f"drained {self.drained_rows:,} rows ({rate:,.0f} rows/s)")
+
+# ==============================
+# SPOOL
+# ==============================
+
+class TelemetrySpool:
+    def __init__(self, root: str | Path, fsync: bool = True):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        self.stats = SpoolStats()
+        self._seq = 0
+        self._lock = threading.Lock()
+
+        # a crash between append() and ack() leaves in-flight segments: replay them
+        for path in self.root.glob(f"{INFLIGHT}*{SUFFIX}"):
+            os.replace(path, path.with_name(PENDING + path.name[len(INFLIGHT):]))
+
+    def _next_name(self) -> str:
+        with self._lock:
+            self._seq += 1
+            return f"{datetime.now():%Y%m%d%H%M%S%f}-{os.getpid()}-{self._seq:08d}{SUFFIX}"
+
+    def append(self, batch: dict, n: int) -> Path:
+        """
+        Durable copy of one batch; returns the in-flight segment path.
+        """
+        name = self._next_name()
+        path = self.root / (INFLIGHT + name)
+        tmp = self.root / (name + ".tmp")
+
+        payload = {k: (np.asarray(v) if isinstance(v, (list, np.ndarray)) else v) for k, v in batch.items()}
+        with open(tmp, "wb") as fh:
+            fh.write(MAGIC)
+            pickle.dump((n, payload), fh, protocol=pickle.HIGHEST_PROTOCOL)
+            if self.fsync:
+                fh.flush()
+                os.fsync(fh.fileno())
+        os.replace(tmp, path)
+        self.stats.appended += 1
+        return path
+
+    def ack(self, path: Path):
+        path.unlink(missing_ok=True)
+        self.stats.acked += 1
+
+    def fail(self, path: Path):
+        os.replace(path, path.with_name(PENDING + path.name[len(INFLIGHT):]))
+        self.stats.failed += 1
+
+    def quarantine(self, path: Path):
+        name = path.name[len(PENDING):] if path.name.startswith(PENDING) else path.name
+        os.replace(path, path.with_name(BAD + name))
+        self.stats.bad += 1
+
+    def pending(self) -> list[Path]:
+        return sorted(self.root.glob(f"{PENDING}*{SUFFIX}"))
+
+    @staticmethod
+    def read(path: Path) -> tuple[dict, int]:
+        with open(path, "rb") as fh:
+            if fh.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a spool segment: {path}")
+            n, batch = pickle.load(fh)
+        return batch, n
+
+    def summary(self) -> str:
+        return self.stats.summary(len(self.pending()))
+
+def merge_batches(batches: list[tuple[dict, int]]) -> tuple[dict, int]:
+    """
+    Concatenate columnar batches (scalars are broadcast per batch).
+    """
+    total = sum(n for _, n in batches)
+    keys = {k for b, _ in batches for k in b}
+    merged = {}
+    for k in keys:
+        parts = []
+        for b, n in batches:
+            v = b.get(k)
+            if isinstance(v, np.ndarray):
+                parts.append(v)
+            else:
+                parts.append(np.full(n, v if v is not None else np.nan,
+                                     dtype="datetime64[us]" if isinstance(v, datetime) else object))
+        merged[k] = np.concatenate(parts) if len(parts) > 1 else parts[0]
+    return merged, total
+
+# ==============================
+# DRAINER
+# ==============================
+
+class SpoolDrainer:
+    """
+    Replays pending segments through write(batch, n) (which must commit),
+    up to max_rows per call. Retries every interval_sec while the DB is down.
+
+    When a merged write fails, the segments are retried one by one. A
+    segment that fails while the database is up (another segment went
+    through, or the simulator acked live ticks since the last attempt)
+    gets a strike; after max_strikes it is moved to bad-*.
+    """
+
+    def __init__(self, spool: TelemetrySpool, write: Callable[[dict, int], None],
+                 max_rows: int = 200_000, interval_sec: float = 2.0, max_strikes: int = 3,
+                 name: str = "spool-drainer"):
+        self.spool = spool
+        self.write = write
+        self.max_rows = max_rows
+        self.interval = interval_sec
+        self.max_strikes = max_strikes
+        self.last_error: Optional[BaseException] = None
+        self._strikes: dict[Path, int] = {}
+        self._acked_seen = spool.stats.acked
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self) -> "SpoolDrainer":
+        self._thread.start()
+        return self
+
+    def drain_once(self) -> int:
+        """
+        One bulk write of the oldest pending segments. Returns rows drained.
+        """
+        segments, rows = [], 0
+        for path in self.spool.pending():
+            try:
+                batch, n = self.spool.read(path)
+            except Exception as e:  # truncated / foreign file: retrying won't fix it
+                self.last_error = e
+                self.spool.quarantine(path)
+                print(f"⚠️ Unreadable spool segment moved to {BAD}*: {path.name} ({e})")
+                continue
+            segments.append((path, batch, n))
+            rows += n
+            if rows >= self.max_rows:
+                break
+        if not segments:
+            return 0
+
+        try:
+            return self._write(segments)
+        except Exception as e:
+            self.last_error = e
+            if len(segments) == 1:
+                self._strike([segments[0][0]], drained=0)
+                return 0
+            return self._isolate(segments)
+
+    def _write(self, segments: list[tuple[Path, dict, int]]) -> int:
+        t0 = time.perf_counter()
+        merged, n = merge_batches([(b, k) for _, b, k in segments])
+        self.write(merged, n)
+        for path, _, _ in segments:
+            path.unlink(missing_ok=True)
+            self._strikes.pop(path, None)
+
+        st = self.spool.stats
+        st.drained_segments += len(segments)
+        st.drained_rows += n
+        st.drain_sec += time.perf_counter() - t0
+        return n
+
+    def _isolate(self, segments: list[tuple[Path, dict, int]]) -> int:
+        """
+        One write per segment, so a rejected segment doesn't hold back the others.
+        """
+        drained, failed = 0, []
+        for seg in segments:
+            try:
+                drained += self._write([seg])
+            except Exception as e:
+                self.last_error = e
+                failed.append(seg[0])
+        self._strike(failed, drained)
+        return drained
+
+    def _strike(self, failed: list[Path], drained: int):
+        acked, self._acked_seen = self._acked_seen, self.spool.stats.acked
+        if not failed or not (drained or self.spool.stats.acked != acked):
+            return  # nothing went through: outage, not bad rows
+        for path in failed:
+            self._strikes[path] = self._strikes.get(path, 0) + 1
+            if self._strikes[path] >= self.max_strikes:
+                del self._strikes[path]
+                self.spool.quarantine(path)
+                print(f"⚠️ Spool segment rejected {self.max_strikes}x, moved to {BAD}*: "
+                      f"{path.name} ({self.last_error})")
+
+    def _run(self):
+        reported = None
+        while not self._stop.is_set():
+            try:
+                if self.drain_once():
+                    self.last_error = None
+                    continue  # more backlog? keep going without waiting
+            except Exception as e:
+                self.last_error = e
+            # one line per distinct error, not one every interval
+            if self.last_error is not None and str(self.last_error) != reported:
+                reported = str(self.last_error)
+                print(f"⚠️ Spool drain failed ({self.spool.summary()}): {self.last_error}")
+            self._stop.wait(self.interval)
+
+    def stop(self, timeout: float = 30.0):
+        self._stop.set()
+        self._thread.join(timeout=timeout)
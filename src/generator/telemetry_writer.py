@@ -0,0 +1,288 @@
+# ============================================================
+# telemetry_writer.py
+# ============================================================
+# Array-bind writer for RT_IOT_FEED / IOT_TELEMETRY
+#
+# - cursor.executemany with pre-declared setinputsizes
+# - same SQL text + same cursor across ticks (statement stays
+#   prepared in the driver's statement cache)
+# - columnar input (dict of arrays / lists), no DataFrame
+# - optional APPEND_VALUES direct-path mode for history loads
+# - rows/s + bytes bound, to compare against pandas to_sql
+# ============================================================
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Essayez d'abord python-oracledb (recommandé). Tombe sur cx_Oracle si non dispo.
+try:
+    import oracledb  # python-oracledb
+except ImportError:  # fallback
+    import cx_Oracle as oracledb  # type: ignore
+
+# ==============================
+# COLUMNS
+# ==============================
+
+# (column, kind) kind: int | float | ts | str
+TELEMETRY_COLUMNS = (
+    ("DEVICE_ID", "int"),
+    ("CAR_ID", "int"),
+    ("RENTAL_ID", "int"),
+    ("EVENT_TS", "ts"),
+    ("LATITUDE", "float"),
+    ("LONGITUDE", "float"),
+    ("SPEED_KMH", "float"),
+    ("ACCELERATION_MS2", "float"),
+    ("BRAKE_PRESSURE_BAR", "float"),
+    ("FUEL_LEVEL_PCT", "float"),
+    ("BATTERY_VOLTAGE", "float"),
+    ("ENGINE_TEMP_C", "float"),
+    ("ODOMETER_KM", "float"),
+    ("EVENT_TYPE", "str"),
+    ("CREATED_AT", "ts"),
+)
+RT_FEED_COLUMNS = TELEMETRY_COLUMNS + (("RECEIVED_AT", "ts"),)
+
+# RT_CAR_LAST_STATE (one row per car, CAR_ID first = MERGE key)
+LAST_STATE_COLUMNS = (
+    ("CAR_ID", "int"),
+    ("DEVICE_ID", "int"),
+    ("RENTAL_ID", "int"),
+    ("EVENT_TS", "ts"),
+    ("LATITUDE", "float"),
+    ("LONGITUDE", "float"),
+    ("SPEED_KMH", "float"),
+    ("FUEL_LEVEL_PCT", "float"),
+    ("ENGINE_TEMP_C", "float"),
+    ("ODOMETER_KM", "float"),
+    ("EVENT_TYPE", "str"),
+    ("RECEIVED_AT", "ts"),
+)
+
+EVENT_TYPE_MAX_LEN = 50
+
+def _input_size(kind: str):
+    if kind == "int":
+        return oracledb.DB_TYPE_NUMBER
+    if kind == "float":
+        return oracledb.DB_TYPE_BINARY_DOUBLE  # raw 8 bytes, converted server side
+    if kind == "ts":
+        return oracledb.DB_TYPE_TIMESTAMP
+    return EVENT_TYPE_MAX_LEN
+
+def column_values(values, n: int, kind: str) -> list:
+    """
+    One column as a plain Python list (what executemany binds fastest).
+    Scalars are broadcast, NaN/NaT become NULL.
+    """
+    if values is None or np.isscalar(values) or isinstance(values, datetime):
+        if kind == "float" and values is not None and values != values:
+            values = None
+        return [values] * n
+
+    if isinstance(values, list):
+        return values
+
+    arr = np.asarray(values)
+    if kind == "ts":
+        if arr.dtype.kind == "M":
+            return arr.astype("datetime64[us]").tolist()  # NaT -> None
+        return [None if pd.isna(v) else pd.Timestamp(v).to_pydatetime() for v in arr]
+
+    if arr.dtype.kind == "f":
+        nan = np.isnan(arr)
+        if nan.any():
+            out = (np.where(nan, 0, arr).astype(np.int64) if kind == "int" else arr).astype(object)
+            out[nan] = None
+            return out.tolist()
+        if kind == "int":
+            return arr.astype(np.int64).tolist()
+        return arr.tolist()
+
+    if arr.dtype == object:
+        return [None if (v is None or v != v) else v for v in arr.tolist()]
+
+    return arr.tolist()
+
+def serialize_rows(columns, batch: dict, n: int) -> list[tuple]:
+    """
+    Columnar batch -> list of row tuples in `columns` order (executemany input).
+    """
+    cols = [column_values(batch.get(c), n, k) for c, k in columns]
+    return list(zip(*cols))
+
+# ==============================
+# STATS
+# ==============================
+
+@dataclass
+class WriterStats:
+    calls: int = 0
+    rows: int = 0
+    bytes_bound: int = 0
+    seconds: float = 0.0
+    serialize_sec: float = 0.0  # part of seconds spent building bind rows
+    executes: int = 0           # raw-cursor round-trips (to_sql goes through SQLAlchemy)
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.rows:,} rows in {self.seconds:.2f}s "
+                f"({self.rows_per_sec:,.0f} rows/s, {self.bytes_bound / 1e6:,.1f} MB bound)")
+
+# ==============================
+# WRITERS
+# ==============================
+
+def _dbapi_connection(conn):
+    """
+    Accepts a SQLAlchemy Connection or a raw python-oracledb connection.
+    """
+    raw = getattr(conn, "connection", conn)
+    return getattr(raw, "dbapi_connection", raw)
+
+class TelemetryWriter:
+    """
+    executemany-based writer for one telemetry table.
+
+    direct_path=True adds the APPEND_VALUES hint (history loads):
+    - each write() is sent as ONE executemany, and the caller must commit
+      before writing to the same table again (ORA-12838)
+    - Oracle silently falls back to conventional inserts while FK
+      constraints are enabled on the table (IOT_TELEMETRY has some)
+    """
+
+    def __init__(self, table: str, columns=TELEMETRY_COLUMNS, schema: str | None = None,
+                 direct_path: bool = False, batch_rows: int = 5000):
+        self.table = f"{schema}.{table}" if schema else table
+        self.columns = tuple(columns)
+        self.direct_path = direct_path
+        self.batch_rows = batch_rows
+        self.stats = WriterStats()
+
+        hint = "/*+ APPEND_VALUES */ " if direct_path else ""
+        names = ", ".join(c for c, _ in self.columns)
+        binds = ", ".join(f":{i + 1}" for i in range(len(self.columns)))
+        self.sql = f"INSERT {hint}INTO {self.table} ({names}) VALUES ({binds})"
+
+        self._conn = None
+        self._cursor = None
+        self._sizes = []
+
+    def _get_cursor(self, conn):
+        raw = _dbapi_connection(conn)
+        if self._cursor is None or self._conn is not raw:
+            self.close()
+            self._conn = raw
+            self._cursor = raw.cursor()
+            self._cursor.prepare(self.sql)
+            self._sizes = [_input_size(k) for _, k in self.columns]
+        return self._cursor
+
+    def close(self):
+        if self._cursor is not None:
+            try:
+                self._cursor.close()
+            except Exception:
+                pass
+        self._conn = None
+        self._cursor = None
+
+    def write(self, conn, batch: dict, n: int | None = None) -> int:
+        """
+        batch: column name -> array / list / scalar (missing columns = NULL).
+        """
+        if n is None:
+            n = len(batch["CAR_ID"])
+        if n == 0:
+            return 0
+
+        t0 = time.perf_counter()
+        rows = serialize_rows(self.columns, batch, n)
+        self.stats.serialize_sec += time.perf_counter() - t0
+
+        cur = self._get_cursor(conn)
+        step = n if self.direct_path else self.batch_rows
+        for i in range(0, n, step):
+            cur.setinputsizes(*self._sizes)
+            cur.executemany(None, rows[i:i + step])
+            self.stats.executes += 1
+
+        self.stats.calls += 1
+        self.stats.rows += n
+        self.stats.bytes_bound += n * sum(getattr(v, "buffer_size", 0) for v in (cur.bindvars or []))
+        self.stats.seconds += time.perf_counter() - t0
+        return n
+
+class LastStateWriter(TelemetryWriter):
+    """
+    Upsert of the latest row per car: the whole tick goes in as ONE
+    array-bound MERGE (one execution per car, one round-trip per call).
+    Older rows (e.g. a replayed batch) never overwrite newer state.
+    """
+
+    def __init__(self, table: str = "RT_CAR_LAST_STATE", columns=LAST_STATE_COLUMNS,
+                 schema: str | None = None, batch_rows: int = 100_000):
+        super().__init__(table, columns, schema=schema, batch_rows=batch_rows)
+
+        key = self.columns[0][0]
+        names = [c for c, _ in self.columns]
+        src = ", ".join(f":{i + 1} AS {c}" for i, c in enumerate(names))
+        self.sql = (
+            f"MERGE INTO {self.table} t USING (SELECT {src} FROM dual) s ON (t.{key} = s.{key}) "
+            f"WHEN MATCHED THEN UPDATE SET {', '.join(f't.{c} = s.{c}' for c in names[1:])} "
+            f"WHERE t.RECEIVED_AT IS NULL OR s.RECEIVED_AT >= t.RECEIVED_AT "
+            f"WHEN NOT MATCHED THEN INSERT ({', '.join(names)}) VALUES ({', '.join(f's.{c}' for c in names)})"
+        )
+
+class ToSqlWriter:
+    """
+    The old pandas to_sql path, kept with the same interface so both can
+    be timed against each other.
+    """
+
+    def __init__(self, table: str, columns=TELEMETRY_COLUMNS, schema: str | None = None,
+                 chunksize: int = 2000):
+        self.table = table
+        self.schema = schema
+        self.columns = tuple(columns)
+        self.chunksize = chunksize
+        self.stats = WriterStats()
+
+    def close(self):
+        pass
+
+    def write(self, conn, batch: dict, n: int | None = None) -> int:
+        if n is None:
+            n = len(batch["CAR_ID"])
+        if n == 0:
+            return 0
+
+        t0 = time.perf_counter()
+        df = pd.DataFrame({c: column_values(batch.get(c), n, k) for c, k in self.columns})
+        self.stats.serialize_sec += time.perf_counter() - t0
+        df.to_sql(self.table, conn, schema=self.schema, if_exists="append",
+                  index=False, chunksize=self.chunksize)
+
+        self.stats.calls += 1
+        self.stats.rows += n
+        self.stats.bytes_bound += int(df.memory_usage(deep=True).sum())
+        self.stats.seconds += time.perf_counter() - t0
+        return n
+
+def make_writer(kind: str, table: str, columns=TELEMETRY_COLUMNS, schema: str | None = None,
+                direct_path: bool = False):
+    if kind == "to_sql":
+        return ToSqlWriter(table, columns, schema=schema)
+    if kind == "array":
+        return TelemetryWriter(table, columns, schema=schema, direct_path=direct_path)
+    raise ValueError(f"Unknown telemetry writer: {kind}")
@@ -0,0 +1,160 @@
+# ============================================================
+# tick_pipeline.py
+# ============================================================
+# Producer / writer decoupling for the live simulator
+#
+# - the producer (fleet tick) puts one batch per tick in a
+#   bounded queue, one writer thread drains it to Oracle
+# - backpressure policy when the queue is full:
+#     block       producer waits for the writer (nothing lost)
+#     coalesce    newest batch is merged into the last queued one
+#     drop_oldest oldest queued batch is discarded
+# - queue depth / drops / blocked time exposed as metrics
+# ============================================================
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+POLICIES = ("block", "coalesce", "drop_oldest")
+
+# ==============================
+# METRICS
+# ==============================
+
+@dataclass
+class QueueStats:
+    put: int = 0
+    done: int = 0
+    dropped: int = 0
+    coalesced: int = 0
+    max_depth: int = 0
+    blocked_sec: float = 0.0
+    write_sec: float = 0.0
+
+    def summary(self, depth: int, maxsize: int) -> str:
+        return (f"queue {depth}/{maxsize} (max {self.max_depth}) | "
+                f"done {self.done}/{self.put} | dropped {self.dropped} | coalesced {self.coalesced} | "
+                f"blocked {self.blocked_sec:.2f}s")
+
+# ==============================
+# QUEUE
+# ==============================
+
+class TickQueue:
+    """
+    Bounded FIFO with an explicit overflow policy.
+    merge(older, newer) is required for the "coalesce" policy.
+    """
+
+    def __init__(self, maxsize: int = 8, policy: str = "block",
+                 merge: Optional[Callable[[object, object], object]] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        if policy == "coalesce" and merge is None:
+            raise ValueError("coalesce policy needs a merge function")
+
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.merge = merge
+        self.stats = QueueStats()
+
+        self._items: deque = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._items)
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                if self.policy == "block":
+                    t0 = time.perf_counter()
+                    while len(self._items) >= self.maxsize and not self._closed:
+                        self._cond.wait()
+                    self.stats.blocked_sec += time.perf_counter() - t0
+                elif self.policy == "drop_oldest":
+                    self._items.popleft()
+                    self.stats.dropped += 1
+                else:
+                    self._items[-1] = self.merge(self._items[-1], item)
+                    self.stats.put += 1
+                    self.stats.coalesced += 1
+                    self._cond.notify_all()
+                    return
+
+            self._items.append(item)
+            self.stats.put += 1
+            self.stats.max_depth = max(self.stats.max_depth, len(self._items))
+            self._cond.notify_all()
+
+    def get(self):
+        """
+        Next item, or None once the queue is closed and empty.
+        """
+        with self._cond:
+            while not self._items and not self._closed:
+                self._cond.wait()
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+# ==============================
+# WRITER STAGE
+# ==============================
+
+class WriterStage:
+    """
+    One background thread applying handler(item) to every queued item, in
+    order. The first exception stops the stage and is re-raised to the
+    producer by check().
+    """
+
+    def __init__(self, queue: TickQueue, handler: Callable[[object], None], name: str = "writer"):
+        self.queue = queue
+        self.handler = handler
+        self.error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self) -> "WriterStage":
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            t0 = time.perf_counter()
+            try:
+                self.handler(item)
+            except BaseException as e:
+                self.error = e
+                self.queue.close()
+                return
+            self.queue.stats.write_sec += time.perf_counter() - t0
+            self.queue.stats.done += 1
+
+    def check(self):
+        if self.error is not None:
+            raise RuntimeError(f"Writer stage {self._thread.name} failed") from self.error
+
+    def stop(self, timeout: float = 30.0):
+        """
+        Drain what is queued, then stop.
+        """
+        self.queue.close()
+        self._thread.join(timeout=timeout)
@@ -0,0 +1,110 @@
+# ============================================================
+# tick_scheduler.py
+# ============================================================
+# Drift-free tick scheduler for the live simulator
+#
+# - fixed deadlines on the monotonic clock: tick k is due at
+#   start + k * period, whatever the previous tick cost
+# - one shared timestamp per tick (the deadline, as wall time)
+# - policy when a tick overran past the next deadline(s):
+#     skip     jump to the next future deadline (missed ticks lost)
+#     burst    run missed ticks back to back (up to burst_max)
+#     stretch  shift the whole schedule, ticks stay evenly spaced
+# - scheduling lag (actual start - deadline) p50 / p99
+# ============================================================
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import numpy as np
+
+POLICIES = ("skip", "burst", "stretch")
+
+@dataclass
+class ScheduledTick:
+    no: int
+    ts: datetime
+    lag_s: float
+
+class TickScheduler:
+    """
+    for tick in TickScheduler(period_s): ... runs forever on schedule.
+    """
+
+    def __init__(self, period_s: float, policy: str = "skip", burst_max: int = 10, window: int = 1000):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown schedule policy: {policy}")
+        self.period = float(period_s)
+        self.policy = policy
+        self.burst_max = burst_max
+
+        self.skipped = 0
+        self.stretched_s = 0.0
+        self.lags: deque = deque(maxlen=window)
+
+        self._mono0 = None
+        self._wall0 = None
+        self._shift = 0.0  # total stretch applied to the schedule
+        self._k = 0
+
+    def _deadline(self, k: int) -> float:
+        return self._mono0 + self._shift + k * self.period
+
+    def wait(self) -> ScheduledTick:
+        now = time.monotonic()
+        if self._mono0 is None:
+            self._mono0 = now
+            self._wall0 = datetime.now()
+
+        deadline = self._deadline(self._k)
+        if now < deadline:
+            time.sleep(deadline - now)
+            now = time.monotonic()
+        else:
+            behind = int((now - deadline) // self.period)  # deadlines fully missed
+            if behind > 0:
+                if self.policy == "skip":
+                    self._k += behind
+                    self.skipped += behind
+                elif self.policy == "stretch":
+                    self._shift += now - deadline
+                    self.stretched_s += now - deadline
+                elif behind > self.burst_max:
+                    # burst: catch up at most burst_max ticks, skip the rest
+                    self._k += behind - self.burst_max
+                    self.skipped += behind - self.burst_max
+                deadline = self._deadline(self._k)
+
+        lag = max(0.0, now - deadline)
+        self.lags.append(lag)
+
+        tick = ScheduledTick(
+            no=self._k,
+            ts=self._wall0 + timedelta(seconds=deadline - self._mono0),
+            lag_s=lag,
+        )
+        self._k += 1
+        return tick
+
+    def __iter__(self):
+        while True:
+            yield self.wait()
+
+    def lag_percentiles(self) -> tuple[float, float]:
+        if not self.lags:
+            return 0.0, 0.0
+        p50, p99 = np.percentile(np.fromiter(self.lags, dtype=float), [50, 99])
+        return float(p50), float(p99)
+
+    def summary(self) -> str:
+        p50, p99 = self.lag_percentiles()
+        out = f"lag p50 {p50 * 1000:.0f}ms p99 {p99 * 1000:.0f}ms"
+        if self.skipped:
+            out += f" | skipped {self.skipped}"
+        if self.stretched_s:
+            out += f" | stretched {self.stretched_s:.1f}s"
+        return out